@@ -5,7 +5,7 @@ from tenacity import retry, stop_after_attempt
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain.chat_models import init_chat_model
-from utils.image import image_path_to_b64
+from utils.image import aimage_path_to_payload
 
 
 
@@ -110,7 +110,7 @@ class BestImageSelector:
             })
             human_content.append({
                 "type": "image_url",
-                "image_url": {"url": image_path_to_b64(ref_image_path, mime=True)}
+                "image_url": {"url": await aimage_path_to_payload(ref_image_path, tier="llm")}
             })
 
         for idx, candidate_image_path in enumerate(candidate_image_paths):
@@ -120,7 +120,7 @@ class BestImageSelector:
             })
             human_content.append({
                 "type": "image_url",
-                "image_url": {"url": image_path_to_b64(candidate_image_path, mime=True)}
+                "image_url": {"url": await aimage_path_to_payload(candidate_image_path, tier="llm")}
             })
         human_content.append({
             "type": "text",
@@ -6,16 +6,20 @@ from pydantic import BaseModel, Field
 from tenacity import retry, stop_after_attempt
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.output_parsers import PydanticOutputParser
-from scenedetect import open_video, SceneManager, split_video_ffmpeg
+from scenedetect import open_video, SceneManager
 from scenedetect.detectors import ContentDetector
 
 from interfaces import ShotDescription, ShotBriefDescription, Camera, ImageOutput, VideoOutput
+from tools.task_ledger import TaskLedger, generate_single_video_resumable
 
 
-from moviepy import VideoFileClip
 from PIL import Image
 
 
+# Number of frames skipped between two frames analyzed when detecting the cut of a transition video
+NEW_CAMERA_DETECTION_FRAME_SKIP = 2
+
+
 system_prompt_template_select_reference_camera = \
 """
 [Role]
@@ -155,13 +159,16 @@ class CameraImageGenerator:
         first_shot_visual_desc: str,
         second_shot_visual_desc: str,
         first_shot_ff_path: str,
+        task_ledger: Optional[TaskLedger] = None,
     ) -> VideoOutput:
 
         prompt = f"Two shots. The transition between the shots is a cut to. The style of the two shots should be consistent."
         prompt += f"\nThe first shot description: {first_shot_visual_desc}."
         prompt += f"\nThe second shot description: {second_shot_visual_desc}."
         reference_image_paths = [first_shot_ff_path]
-        video_output = await self.video_generator.generate_single_video(
+        video_output = await generate_single_video_resumable(
+            self.video_generator,
+            task_ledger,
             prompt=prompt,
             reference_image_paths=reference_image_paths,
         )
@@ -172,32 +179,7 @@ class CameraImageGenerator:
         self,
         transition_video_path: str,
     ) -> ImageOutput:
-        video = open_video(transition_video_path)
-        scene_manager = SceneManager()
-        scene_manager.add_detector(ContentDetector())
-        scene_manager.detect_scenes(video, show_progress=False)
-        scene_list = scene_manager.get_scene_list()
-        output_dir = os.path.join(os.path.dirname(transition_video_path), "cache")
-        os.makedirs(output_dir, exist_ok=True)
-        split_video_ffmpeg(transition_video_path, scene_list, output_dir, show_progress=True)
-
-
-        video_name = os.path.basename(transition_video_path).split('.')[0]
-        second_video_path = os.path.join(output_dir, f"{video_name}-Scene-002.mp4")
-        if os.path.exists(second_video_path):
-            # use first frame of second shot as new camera image
-            clip = VideoFileClip(second_video_path)
-            ff = clip.get_frame(0)
-            ff = Image.fromarray(ff.astype('uint8'), 'RGB')
-            return ImageOutput(fmt="pil", ext="png", data=ff)
-        else:
-            # use last frame of transition video to instead
-            clip = VideoFileClip(transition_video_path)
-            lf_time = clip.duration - (1 / clip.fps)
-            lf_time = max(0, lf_time)
-            lf = clip.get_frame(lf_time)
-            lf = Image.fromarray(lf.astype('uint8'), 'RGB')
-            return ImageOutput(fmt="pil", ext="png", data=lf)
+        return get_new_camera_image(transition_video_path)
 
 
     async def generate_first_frame(
@@ -216,4 +198,51 @@ class CameraImageGenerator:
             reference_image_paths=reference_image_paths,
             size="1600x900",
         )
-        return image_output
\ No newline at end of file
+        return image_output
+
+
+def get_new_camera_image(
+    transition_video_path: str,
+) -> ImageOutput:
+    """
+    Extract the image of the new camera from a transition video: the first frame
+    of its second scene, or its last frame when no cut is detected. This is CPU
+    bound and defined at module level, so it can run in the media executor.
+
+    The cut is detected on a downscaled decode that skips frames, then the video
+    is seeked to the cut and exactly one frame is decoded. Nothing is written to disk.
+    """
+    video = open_video(transition_video_path)
+    scene_manager = SceneManager()
+    scene_manager.auto_downscale = True
+    scene_manager.add_detector(ContentDetector())
+    # With skipped frames the cut is found up to NEW_CAMERA_DETECTION_FRAME_SKIP
+    # frames late, which is still inside the second scene.
+    scene_manager.detect_scenes(video, frame_skip=NEW_CAMERA_DETECTION_FRAME_SKIP, show_progress=False)
+    scene_list = scene_manager.get_scene_list()
+
+    capture = cv2.VideoCapture(transition_video_path)
+    try:
+        num_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        if len(scene_list) >= 2:
+            # use first frame of second shot as new camera image
+            frame_idx = scene_list[1][0].frame_num
+        else:
+            # use last frame of transition video to instead
+            frame_idx = num_frames - 1
+
+        frame = None
+        # the frame count of some containers is an estimate, step back until a frame decodes
+        while frame is None and frame_idx >= 0:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            success, frame = capture.read()
+            if not success:
+                frame = None
+                frame_idx -= 1
+    finally:
+        capture.release()
+
+    if frame is None:
+        raise ValueError(f"Could not decode any frame of {transition_video_path}")
+    frame = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    return ImageOutput(fmt="pil", ext="png", data=frame)
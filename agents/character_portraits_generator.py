@@ -6,7 +6,9 @@ from langchain_core.output_parsers import PydanticOutputParser
 from langchain.chat_models.base import BaseChatModel
 from langchain.chat_models import init_chat_model
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
+import numpy as np
+from PIL import Image
 from tenacity import retry, stop_after_attempt
 from interfaces import CharacterInScene, ImageOutput
 from langchain_core.messages import HumanMessage, SystemMessage
@@ -31,13 +33,37 @@ prompt_template_back = \
 Generate a full-body, back-view portrait of character {identifier} based on the provided front-view portrait, with a pure white background. The character should be centered in the image, occupying most of the frame. No facial features should be visible.
 """
 
+prompt_template_turnaround = \
+"""
+Generate a character turnaround sheet of character {identifier} based on the following description, with a pure white background. Show three full-body views of the same character side by side in a single row, from left to right: front view gazing straight ahead, side view facing left, back view with no facial features visible. All three views at the same scale, standing on the same ground line with arms relaxed at sides, separated by clear white space and not overlapping. No text, labels, borders or shadows.
+Features: {features}
+Style: {style}
+"""
+
+# views of a turnaround sheet, from left to right
+TURNAROUND_VIEWS = ["front", "side", "back"]
+
+# maximum difference of a channel to the background color for a pixel to be background
+TURNAROUND_BACKGROUND_TOLERANCE = 24
+
 
 class CharacterPortraitsGenerator:
     def __init__(
         self,
         image_generator,
+        turnaround_sheet: bool = False,
     ):
+        """
+        Initialize the generator.
+
+        Args:
+            image_generator: Image generator of the portraits.
+            turnaround_sheet: Whether the pipelines generate the three views as one
+                              turnaround sheet, see generate_turnaround_sheet, rather
+                              than a front portrait followed by the side and back ones.
+        """
         self.image_generator = image_generator
+        self.turnaround_sheet = turnaround_sheet
 
 
     @retry(stop=stop_after_attempt(3), after=after_func, reraise=True)
@@ -89,4 +115,121 @@ class CharacterPortraitsGenerator:
             reference_image_paths=[front_image_path],
             # size="512x512",
         )
-        return image_output
\ No newline at end of file
+        return image_output
+
+
+    @retry(stop=stop_after_attempt(3), after=after_func, reraise=True)
+    async def generate_turnaround_sheet(
+        self,
+        character: CharacterInScene,
+        style: str,
+    ) -> ImageOutput:
+        """
+        Generate the front, side and back views of a character as a single sheet,
+        in one request instead of three. split_turnaround_sheet cuts it into the
+        portraits.
+        """
+        features = "(static) " + character.static_features + "; (dynamic) " + character.dynamic_features
+        prompt = prompt_template_turnaround.format(
+            identifier=character.identifier_in_scene,
+            features=features,
+            style=style,
+        )
+        image_output = await self.image_generator.generate_single_image(
+            prompt=prompt,
+        )
+        return image_output
+
+
+def find_turnaround_view_columns(
+    occupied: np.ndarray,
+    num_views: int,
+) -> List[Tuple[int, int]]:
+    """
+    Find the column range of each view of a turnaround sheet, cutting in the
+    middle of the widest runs of empty columns between the figures. Falls back to
+    equal widths when the figures are not separated by enough space.
+
+    Args:
+        occupied: Whether each column of the sheet holds part of a figure.
+        num_views: Number of views on the sheet.
+
+    Returns:
+        The start and end (exclusive) column of each view, from left to right.
+    """
+    width = len(occupied)
+    filled = np.flatnonzero(occupied)
+    if len(filled) > 0:
+        left, right = int(filled[0]), int(filled[-1]) + 1
+        # inside [left, right) the changes alternate between the start and the end of a gap
+        edges = np.flatnonzero(np.diff(occupied[left:right].astype(np.int8))) + left + 1
+        min_gap = max(1, width // 100)
+        gaps = [(start, end) for start, end in zip(edges[0::2], edges[1::2]) if end - start >= min_gap]
+        if len(gaps) >= num_views - 1:
+            widest_gaps = sorted(sorted(gaps, key=lambda gap: (gap[0] - gap[1], gap[0]))[:num_views - 1])
+            cuts = [int(start + end) // 2 for start, end in widest_gaps]
+            bounds = list(zip([0] + cuts, cuts + [width]))
+            # a figure with a gap inside (an arm held away) could be cut in two
+            if min(end - start for start, end in bounds) >= width / (num_views * 4):
+                return bounds
+
+    logging.warning(f"Could not separate the {num_views} views of the turnaround sheet, splitting it into equal widths")
+    cuts = [width * idx // num_views for idx in range(num_views + 1)]
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+def split_turnaround_sheet(
+    sheet_path: str,
+    num_views: int = len(TURNAROUND_VIEWS),
+    margin_ratio: float = 0.05,
+) -> List[ImageOutput]:
+    """
+    Split a turnaround sheet into one portrait per view. This is CPU bound and
+    defined at module level, so it can run in the media executor.
+
+    The background color is taken from the border of the sheet. Each figure is
+    cropped to its bounding box and centered on a canvas of that color, the same
+    size for every view so that they keep the scale of the sheet.
+
+    Args:
+        sheet_path: Path of the turnaround sheet.
+        num_views: Number of views on the sheet, from left to right.
+        margin_ratio: Margin around the largest figure, relative to its largest side.
+
+    Returns:
+        The portrait of each view, from left to right.
+    """
+    sheet = Image.open(sheet_path).convert("RGB")
+    pixels = np.asarray(sheet, dtype=np.int16)
+    height, width, _ = pixels.shape
+
+    border = np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])
+    background = np.median(border, axis=0)
+    foreground = np.abs(pixels - background).max(axis=2) > TURNAROUND_BACKGROUND_TOLERANCE
+    # ignore columns and rows with only a few stray pixels (compression artifacts)
+    occupied = foreground.sum(axis=0) > max(1, height // 100)
+
+    boxes = []
+    for start, end in find_turnaround_view_columns(occupied, num_views):
+        columns = np.flatnonzero(occupied[start:end])
+        rows = np.flatnonzero(foreground[:, start:end].sum(axis=1) > max(1, (end - start) // 100))
+        if len(columns) == 0 or len(rows) == 0:
+            boxes.append((start, 0, end, height))
+        else:
+            boxes.append((start + int(columns[0]), int(rows[0]), start + int(columns[-1]) + 1, int(rows[-1]) + 1))
+
+    box_width = max(right - left for left, _, right, _ in boxes)
+    box_height = max(bottom - top for _, top, _, bottom in boxes)
+    margin = int(max(box_width, box_height) * margin_ratio)
+    canvas_size = (box_width + 2 * margin, box_height + 2 * margin)
+    fill = tuple(int(channel) for channel in background)
+
+    views = []
+    for left, top, right, bottom in boxes:
+        canvas = Image.new("RGB", canvas_size, fill)
+        canvas.paste(
+            sheet.crop((left, top, right, bottom)),
+            ((canvas_size[0] - (right - left)) // 2, (canvas_size[1] - (bottom - top)) // 2),
+        )
+        views.append(ImageOutput(fmt="pil", ext="png", data=canvas))
+    return views
@@ -5,7 +5,7 @@ from pydantic import BaseModel, Field
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain.chat_models import init_chat_model
-from utils.image import image_path_to_b64
+from utils.image import aimage_path_to_payload
 
 from utils.retry import after_func
 
@@ -194,7 +194,7 @@ class ReferenceImageSelector:
             })
             human_content.append({
                 "type": "image_url",
-                "image_url": {"url": image_path_to_b64(image_path)}
+                "image_url": {"url": await aimage_path_to_payload(image_path, tier="llm")}
             })
         human_content.append({
             "type": "text",
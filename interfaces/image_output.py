@@ -1,26 +1,69 @@
+import asyncio
 import base64
+import os
+import shutil
 import cv2
+from io import BytesIO
 from typing import List, Literal, Optional, Union
 from PIL import Image
 
-from utils.image import download_image
+from utils.download import download, download_sync
+from utils.image import pil_to_b64
+from utils.media_executor import get_media_executor
 
 
+MIME_TYPE_EXTENSIONS = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/webp": "webp",
+    "image/gif": "gif",
+}
+
+
+def mime_type_of_path(path: str) -> Optional[str]:
+    """
+    MIME type of the image format an extension stands for, None if unknown.
+    """
+    ext = os.path.splitext(path)[1][1:].lower()
+    if ext == "jpeg":
+        ext = "jpg"
+    return next((mime_type for mime_type, mime_ext in MIME_TYPE_EXTENSIONS.items() if mime_ext == ext), None)
+
 
 class ImageOutput:
-    fmt: Literal["b64", "url", "pil", "np"]
+    fmt: Literal["b64", "url", "pil", "np", "file", "bytes"]
     ext: str = "png"
-    data: Union[str, Image.Image]
+    data: Union[str, bytes, Image.Image]
+    mime_type: Optional[str] = None
 
     def __init__(
         self,
-        fmt: Literal["b64", "url", "pil", "np"],
+        fmt: Literal["b64", "url", "pil", "np", "file", "bytes"],
         ext: str,
-        data: Union[str, Image.Image],
+        data: Union[str, bytes, Image.Image],
+        mime_type: Optional[str] = None,
     ):
+        """
+        Args:
+            mime_type: MIME type of encoded bytes data, as sent by the provider.
+        """
         self.fmt = fmt
         self.ext = ext
         self.data = data
+        self.mime_type = mime_type
+        self._image: Optional[Image.Image] = None
+
+    @classmethod
+    def from_bytes(cls, data: bytes, mime_type: Optional[str]) -> "ImageOutput":
+        """Wrap encoded image bytes from a provider, saved untouched and decoded
+        only when the pixels are needed.
+
+        Args:
+            data (bytes): The encoded image.
+            mime_type (str): Its MIME type, e.g. image/png.
+        """
+        ext = MIME_TYPE_EXTENSIONS.get(mime_type, "png")
+        return cls(fmt="bytes", ext=ext, data=data, mime_type=mime_type)
 
 
     def save_b64(self, path: str) -> None:
@@ -38,7 +81,7 @@ class ImageOutput:
         Args:
             path (str): Path where the image will be saved.
         """
-        download_image(self.data, path)
+        download_sync(self.data, path)
 
     def save_pil(self, path: str) -> None:
         """Save a PIL Image to the specified path.
@@ -56,6 +99,98 @@ class ImageOutput:
         """
         cv2.imencode('.png', self.data)[1].tofile(path)
 
+    def _needs_transcoding(self, path: str) -> bool:
+        # only encoded images are written as they are, bytes or an existing file
+        if self.fmt == "bytes":
+            source_mime_type = self.mime_type
+        elif self.fmt == "file":
+            source_mime_type = mime_type_of_path(self.data)
+        else:
+            return False
+        target_mime_type = mime_type_of_path(path)
+        return source_mime_type is not None and target_mime_type is not None and target_mime_type != source_mime_type
+
+    def _save_transcoded(self, path: str) -> None:
+        image = self.to_pil()
+        if mime_type_of_path(path) == "image/jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(path)
+
+    def save_bytes(self, path: str) -> None:
+        """Save encoded image bytes to the specified path, as they are when their
+        format is the one of the extension, transcoded otherwise (e.g. JPEG bytes
+        saved to a .png path).
+
+        Args:
+            path (str): Path where the image will be saved.
+        """
+        if self._needs_transcoding(path):
+            self._save_transcoded(path)
+            return
+        with open(path, 'wb') as f:
+            f.write(self.data)
+
+    def save_file(self, path: str) -> None:
+        """Copy an image file to the specified path, transcoded when the two
+        extensions stand for different formats (e.g. a cached .jpg saved to a .png path).
+
+        Args:
+            path (str): Path where the image will be saved.
+        """
+        if self._needs_transcoding(path):
+            self._save_transcoded(path)
+            return
+        shutil.copyfile(self.data, path)
+
     def save(self, path: str) -> None:
         save_func = getattr(self, f"save_{self.fmt}")
-        save_func(path)
\ No newline at end of file
+        save_func(path)
+
+    def to_pil(self) -> Image.Image:
+        """Decode the image, once, for pixel access. Not supported for url images.
+
+        Returns:
+            Image.Image: The decoded image.
+        """
+        if self._image is None:
+            if self.fmt == "pil":
+                self._image = self.data
+            elif self.fmt == "np":
+                self._image = Image.fromarray(cv2.cvtColor(self.data, cv2.COLOR_BGR2RGB))
+            elif self.fmt in ["bytes", "b64"]:
+                data = self.data if self.fmt == "bytes" else base64.b64decode(self.data)
+                self._image = Image.open(BytesIO(data))
+                self._image.load()
+            elif self.fmt == "file":
+                with Image.open(self.data) as image:
+                    image.load()
+                    self._image = image.copy()
+            else:
+                raise ValueError(f"Cannot decode a {self.fmt} image, save it first")
+        return self._image
+
+    def to_b64(self, mime: bool = True) -> str:
+        """Encode the image in base64, as a data URL if mime. Encoded bytes are
+        used as they are, without decoding and re-encoding.
+
+        Returns:
+            str: The base64 encoded image.
+        """
+        if self.fmt == "bytes":
+            b64 = base64.b64encode(self.data).decode('utf-8')
+            return f"data:{self.mime_type or 'image/png'};base64,{b64}" if mime else b64
+        return pil_to_b64(self.to_pil(), mime=mime)
+
+    async def asave(self, path: str) -> None:
+        """Save the image without blocking the event loop. Encoding happens in the
+        media executor, downloading on the event loop, writing in a thread.
+
+        Args:
+            path (str): Path where the image will be saved.
+        """
+        if self.fmt == "url":
+            await download(self.data, path)
+        elif self.fmt in ["pil", "np"] or self._needs_transcoding(path):
+            await get_media_executor().run("image_save", self.save, path)
+        else:
+            await asyncio.to_thread(self.save, path)
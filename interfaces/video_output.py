@@ -1,24 +1,32 @@
 import asyncio
-from typing import List, Literal, Optional, Union
+import shutil
+from typing import Dict, List, Literal, Optional, Union
 from PIL import Image
 
-from utils.video import download_video
+from utils.download import download, download_sync
 
 
 class VideoOutput:
-    fmt: Literal["url", "bytes"]
+    fmt: Literal["url", "bytes", "file"]
     ext: str = "mp4"
     data: Union[str, bytes]
+    headers: Optional[Dict[str, str]] = None
 
     def __init__(
         self,
-        fmt: Literal["url", "bytes"],
+        fmt: Literal["url", "bytes", "file"],
         ext: str,
         data: Union[str, bytes],
+        headers: Optional[Dict[str, str]] = None,
     ):
+        """
+        Args:
+            headers: HTTP headers needed to download a url video, e.g. for authentication.
+        """
         self.fmt = fmt
         self.ext = ext
         self.data = data
+        self.headers = headers
 
     def save_url(self, path: str) -> None:
         """Download and save a video from a URL to the specified path.
@@ -26,7 +34,7 @@ class VideoOutput:
         Args:
             path (str): Path where the video will be saved.
         """
-        download_video(self.data, path)
+        download_sync(self.data, path, headers=self.headers)
 
     def save_bytes(self, path: str) -> None:
         """Save a bytes object to the specified path.
@@ -37,7 +45,28 @@ class VideoOutput:
         with open(path, 'wb') as f:
             f.write(self.data)
 
+    def save_file(self, path: str) -> None:
+        """Copy a video file to the specified path.
+
+        Args:
+            path (str): Path where the video will be saved.
+        """
+        shutil.copyfile(self.data, path)
+
     def save(self, path: str) -> None:
         save_func = getattr(self, f"save_{self.fmt}")
         save_func(path)
 
+    async def asave(self, path: str) -> None:
+        """Save the video without blocking the event loop: downloading on the event
+        loop, writing in a thread.
+
+        Args:
+            path (str): Path where the video will be saved.
+        """
+        if self.fmt == "url":
+            await download(self.data, path, headers=self.headers)
+        else:
+            await asyncio.to_thread(self.save, path)
+
+
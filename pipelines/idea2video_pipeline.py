@@ -1,21 +1,46 @@
 import os
 import logging
+import functools
 from agents import Screenwriter, CharacterExtractor, CharacterPortraitsGenerator
-from pipelines.script2video_pipeline import Script2VideoPipeline
+from pipelines.script2video_pipeline import Script2VideoPipeline, DEFAULT_MAX_CONCURRENT_TASKS, init_services_from_config
 from interfaces import CharacterInScene
 from typing import List, Dict, Optional
 import asyncio
 import json
-from moviepy import VideoFileClip, concatenate_videoclips
 import yaml
 from langchain.chat_models import init_chat_model
 from utils.rate_limiter import RateLimiter
+from utils.video_concat import concatenate_videos
+from utils.task_graph import TaskGraph, PrioritySemaphore
 import importlib
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Default number of scenes rendered at the same time
+DEFAULT_MAX_CONCURRENT_SCENES = 3
+
+# Default requests per minute and per day of each service, when not set in the environment
+DEFAULT_RATE_LIMITS = {
+    "CHAT_MODEL": (500, 2000),
+    "IMAGE_GENERATOR": (10, 500),
+    "VIDEO_GENERATOR": (2, 10),
+}
+
+# Image and video backends that IMAGE_GENERATOR_BACKENDS and VIDEO_GENERATOR_BACKENDS
+# may list, the first one being the default
+IMAGE_GENERATOR_CLASS_PATHS = {
+    "nanobanana_google": "tools.ImageGeneratorNanobananaGoogleAPI",
+    "nanobanana_yunwu": "tools.ImageGeneratorNanobananaYunwuAPI",
+    "seedream_yunwu": "tools.ImageGeneratorDoubaoSeedreamYunwuAPI",
+}
+VIDEO_GENERATOR_CLASS_PATHS = {
+    "veo_google": "tools.VideoGeneratorVeoGoogleAPI",
+    "veo_yunwu": "tools.VideoGeneratorVeoYunwuAPI",
+    "seedance_yunwu": "tools.VideoGeneratorDoubaoSeedanceYunwuAPI",
+}
+
 
 class Idea2VideoPipeline:
     def __init__(
@@ -24,6 +49,9 @@ class Idea2VideoPipeline:
         image_generator: str,
         video_generator: str,
         working_dir: str,
+        resources: Optional[Dict[str, PrioritySemaphore]] = None,
+        max_concurrent_scenes: int = DEFAULT_MAX_CONCURRENT_SCENES,
+        turnaround_sheet: bool = False,
     ):
         self.chat_model = chat_model
         self.image_generator = image_generator
@@ -31,11 +59,37 @@ class Idea2VideoPipeline:
         self.working_dir = working_dir
         os.makedirs(self.working_dir, exist_ok=True)
 
+        # Task slots shared by all scenes, so that scenes running in parallel
+        # compete for the same provider capacity
+        if resources is None:
+            resources = {
+                resource: PrioritySemaphore(max_concurrent_tasks)
+                for resource, max_concurrent_tasks in DEFAULT_MAX_CONCURRENT_TASKS.items()
+            }
+        self.resources = resources
+        self.max_concurrent_scenes = max_concurrent_scenes
+
         self.screenwriter = Screenwriter(chat_model=self.chat_model)
         self.character_extractor = CharacterExtractor(
             chat_model=self.chat_model)
         self.character_portraits_generator = CharacterPortraitsGenerator(
-            image_generator=self.image_generator)
+            image_generator=self.image_generator, turnaround_sheet=turnaround_sheet)
+
+    def with_working_dir(self, working_dir: str) -> "Idea2VideoPipeline":
+        """
+        Create a pipeline working in another directory that shares the chat model,
+        the image and video generators (with their rate limiters) and the task slots
+        of this one.
+        """
+        return self.__class__(
+            chat_model=self.chat_model,
+            image_generator=self.image_generator,
+            video_generator=self.video_generator,
+            working_dir=working_dir,
+            resources=self.resources,
+            max_concurrent_scenes=self.max_concurrent_scenes,
+            turnaround_sheet=self.character_portraits_generator.turnaround_sheet,
+        )
 
     @classmethod
     def init_from_env(cls):
@@ -50,80 +104,76 @@ class Idea2VideoPipeline:
         if not chat_model_args["api_key"]:
             raise ValueError("OPENROUTER_API_KEY environment variable is required")
 
-        chat_model = init_chat_model(**chat_model_args)
-
-        # Create separate rate limiters for each service
-        chat_model_rpm = int(os.getenv("CHAT_MODEL_RPM", "500"))
-        chat_model_rpd = int(os.getenv("CHAT_MODEL_RPD", "2000"))
-        image_generator_rpm = int(os.getenv("IMAGE_GENERATOR_RPM", "10"))
-        image_generator_rpd = int(os.getenv("IMAGE_GENERATOR_RPD", "500"))
-        video_generator_rpm = int(os.getenv("VIDEO_GENERATOR_RPM", "2"))
-        video_generator_rpd = int(os.getenv("VIDEO_GENERATOR_RPD", "10"))
-
-        chat_model_rate_limiter = RateLimiter(
-            max_requests_per_minute=chat_model_rpm,
-            max_requests_per_day=chat_model_rpd
-        ) if (chat_model_rpm or chat_model_rpd) else None
-
-        image_rate_limiter = RateLimiter(
-            max_requests_per_minute=image_generator_rpm,
-            max_requests_per_day=image_generator_rpd
-        ) if (image_generator_rpm or image_generator_rpd) else None
-
-        video_rate_limiter = RateLimiter(
-            max_requests_per_minute=video_generator_rpm,
-            max_requests_per_day=video_generator_rpd
-        ) if (video_generator_rpm or video_generator_rpd) else None
-
-        # Display rate limiting configuration
-        if chat_model_rate_limiter:
-            limits = []
-            if chat_model_rpm:
-                limits.append(f"{chat_model_rpm} req/min")
-            if chat_model_rpd:
-                limits.append(f"{chat_model_rpd} req/day")
-            print(f"Chat model rate limiting: {', '.join(limits)}")
-
-        if image_rate_limiter:
-            limits = []
-            if image_generator_rpm:
-                limits.append(f"{image_generator_rpm} req/min")
-            if image_generator_rpd:
-                limits.append(f"{image_generator_rpd} req/day")
-            print(f"Image generator rate limiting: {', '.join(limits)}")
-
-        if video_rate_limiter:
-            limits = []
-            if video_generator_rpm:
-                limits.append(f"{video_generator_rpm} req/min")
-            if video_generator_rpd:
-                limits.append(f"{video_generator_rpd} req/day")
-            print(f"Video generator rate limiting: {', '.join(limits)}")
-
-        # Initialize image generator
-        from tools.image_generator_nanobanana_google_api import ImageGeneratorNanobananaGoogleAPI
         google_api_key = os.getenv("GOOGLE_API_KEY")
         if not google_api_key:
             raise ValueError("GOOGLE_API_KEY environment variable is required")
-        image_generator = ImageGeneratorNanobananaGoogleAPI(
-            api_key=google_api_key,
-            rate_limiter=image_rate_limiter
-        )
+        # several comma-separated keys are pooled, each key with the limits of its service
+        google_api_keys = [api_key.strip() for api_key in google_api_key.split(",") if api_key.strip()]
+        yunwu_api_key = os.getenv("YUNWU_API_KEY")
+
+        def generator_config(service: str, env_prefix: str, class_paths: Dict[str, str]) -> dict:
+            # the same section as in the script2video config, see init_generator_from_config
+            default_backend = next(iter(class_paths))
+            backend_names = [name.strip() for name in os.getenv(f"{env_prefix}_BACKENDS", default_backend).split(",") if name.strip()]
+            backend_configs = []
+            for name in backend_names:
+                if name not in class_paths:
+                    raise ValueError(f"Unknown {service} generator backend {name}, expected one of {', '.join(class_paths)}")
+                if name.endswith("_yunwu") and not yunwu_api_key:
+                    raise ValueError(f"YUNWU_API_KEY environment variable is required by the {name} {service} generator backend")
+                # every backend has its own quota, by default the limits of its service
+                backend_env_prefix = env_prefix if name == default_backend else name.upper()
+                backend_configs.append({
+                    "name": name,
+                    "class_path": class_paths[name],
+                    "init_args": {
+                        "api_key": yunwu_api_key if name.endswith("_yunwu") else (google_api_keys if len(google_api_keys) > 1 else google_api_keys[0]),
+                    },
+                    "max_requests_per_minute": int(os.getenv(f"{backend_env_prefix}_RPM", os.getenv(f"{env_prefix}_RPM", DEFAULT_RATE_LIMITS[env_prefix][0]))),
+                    "max_requests_per_day": int(os.getenv(f"{backend_env_prefix}_RPD", os.getenv(f"{env_prefix}_RPD", DEFAULT_RATE_LIMITS[env_prefix][1]))),
+                })
+            if backend_names == [default_backend]:
+                section = backend_configs[0]
+            else:
+                section = {"backends": backend_configs}
+            section["max_concurrent_tasks"] = int(os.getenv(f"{env_prefix}_MAX_CONCURRENT_TASKS", DEFAULT_MAX_CONCURRENT_TASKS[service]))
+            return section
+
+        image_generator_config = generator_config("image", "IMAGE_GENERATOR", IMAGE_GENERATOR_CLASS_PATHS)
+        # Hedge slow image requests, when configured
+        if os.getenv("IMAGE_GENERATOR_HEDGE_PERCENTILE"):
+            image_generator_config["hedge_percentile"] = float(os.getenv("IMAGE_GENERATOR_HEDGE_PERCENTILE"))
+            image_generator_config["max_hedge_ratio"] = float(os.getenv("IMAGE_GENERATOR_MAX_HEDGE_RATIO", "0.1"))
+            print(f"Image generator hedging after p{image_generator_config['hedge_percentile'] * 100:.0f} latency, up to {image_generator_config['max_hedge_ratio']:.0%} of requests")
+
+        generation_cache_dir = os.getenv("GENERATION_CACHE_DIR")
+        config = {
+            "chat_model": {
+                "init_args": chat_model_args,
+                "max_requests_per_minute": int(os.getenv("CHAT_MODEL_RPM", DEFAULT_RATE_LIMITS["CHAT_MODEL"][0])),
+                "max_requests_per_day": int(os.getenv("CHAT_MODEL_RPD", DEFAULT_RATE_LIMITS["CHAT_MODEL"][1])),
+                "max_concurrent_tasks": int(os.getenv("CHAT_MODEL_MAX_CONCURRENT_TASKS", DEFAULT_MAX_CONCURRENT_TASKS["chat"])),
+            },
+            "image_generator": image_generator_config,
+            "video_generator": generator_config("video", "VIDEO_GENERATOR", VIDEO_GENERATOR_CLASS_PATHS),
+            "generation_cache": {
+                "cache_dir": generation_cache_dir,
+                "max_size_gb": float(os.getenv("GENERATION_CACHE_MAX_SIZE_GB", "10")),
+            },
+        }
+        services = init_services_from_config(config)
 
-        # Initialize video generator
-        from tools.video_generator_veo_google_api import VideoGeneratorVeoGoogleAPI
-        video_generator = VideoGeneratorVeoGoogleAPI(
-            api_key=google_api_key,
-            rate_limiter=video_rate_limiter
-        )
+        max_concurrent_scenes = int(os.getenv("MAX_CONCURRENT_SCENES", DEFAULT_MAX_CONCURRENT_SCENES))
+
+        turnaround_sheet = os.getenv("CHARACTER_PORTRAIT_TURNAROUND_SHEET", "false").lower() in ("1", "true", "yes")
 
         working_dir = os.getenv("WORKING_DIR", ".working_dir")
 
         return cls(
-            chat_model=chat_model,
-            image_generator=image_generator,
-            video_generator=video_generator,
+            **services,
             working_dir=working_dir,
+            max_concurrent_scenes=max_concurrent_scenes,
+            turnaround_sheet=turnaround_sheet,
         )
 
     async def extract_characters(
@@ -225,50 +275,45 @@ class Idea2VideoPipeline:
         character: CharacterInScene,
         style: str,
     ):
-        character_dir = os.path.join(
-            self.working_dir, "character_portraits", f"{character.idx}_{character.identifier_in_scene}")
-        os.makedirs(character_dir, exist_ok=True)
-
-        front_portrait_path = os.path.join(character_dir, "front.png")
-        if os.path.exists(front_portrait_path):
-            pass
-        else:
-            front_portrait_output = await self.character_portraits_generator.generate_front_portrait(character, style)
-            front_portrait_output.save(front_portrait_path)
-
-        side_portrait_path = os.path.join(character_dir, "side.png")
-        if os.path.exists(side_portrait_path):
-            pass
-        else:
-            side_portrait_output = await self.character_portraits_generator.generate_side_portrait(character, front_portrait_path)
-            side_portrait_output.save(side_portrait_path)
+        # the portraits are laid out, generated and rate limited like those of a script
+        script2video_pipeline = Script2VideoPipeline(
+            chat_model=self.chat_model,
+            image_generator=self.image_generator,
+            video_generator=self.video_generator,
+            working_dir=self.working_dir,
+            resources=self.resources,
+            turnaround_sheet=self.character_portraits_generator.turnaround_sheet,
+        )
+        return await script2video_pipeline.generate_portraits_for_single_character(character, style)
 
-        back_portrait_path = os.path.join(character_dir, "back.png")
-        if os.path.exists(back_portrait_path):
-            pass
-        else:
-            back_portrait_output = await self.character_portraits_generator.generate_back_portrait(character, front_portrait_path)
-            back_portrait_output.save(back_portrait_path)
-
-        print(
-            f"☑️ Completed character portrait generation for {character.identifier_in_scene}.")
-
-        return {
-            character.identifier_in_scene: {
-                "front": {
-                    "path": front_portrait_path,
-                    "description": f"A front view portrait of {character.identifier_in_scene}.",
-                },
-                "side": {
-                    "path": side_portrait_path,
-                    "description": f"A side view portrait of {character.identifier_in_scene}.",
-                },
-                "back": {
-                    "path": back_portrait_path,
-                    "description": f"A back view portrait of {character.identifier_in_scene}.",
-                },
-            }
-        }
+    async def generate_video_for_single_scene(
+        self,
+        idx: int,
+        scene_script: str,
+        user_requirement: str,
+        style: str,
+        characters: List[CharacterInScene],
+        character_portraits_registry: Dict[str, Dict[str, Dict[str, str]]],
+    ):
+        scene_working_dir = os.path.join(self.working_dir, f"scene_{idx}")
+        os.makedirs(scene_working_dir, exist_ok=True)
+        script2video_pipeline = Script2VideoPipeline(
+            chat_model=self.chat_model,
+            image_generator=self.image_generator,
+            video_generator=self.video_generator,
+            working_dir=scene_working_dir,
+            resources=self.resources,
+        )
+        print(f"🎬 Starting scene {idx}...")
+        final_video_path = await script2video_pipeline(
+            script=scene_script,
+            user_requirement=user_requirement,
+            style=style,
+            characters=characters,
+            character_portraits_registry=character_portraits_registry,
+        )
+        print(f"☑️ Completed scene {idx}.")
+        return final_video_path
 
     async def __call__(
         self,
@@ -289,34 +334,32 @@ class Idea2VideoPipeline:
 
         scene_scripts = await self.write_script_based_on_story(story=story, user_requirement=user_requirement)
 
-        all_video_paths = []
-
+        # Scenes are independent of each other, render up to max_concurrent_scenes of
+        # them at the same time. Their provider calls share the rate limiters and task
+        # slots, so the total load stays within the provider budget.
+        task_graph = TaskGraph(resources={"scene": PrioritySemaphore(self.max_concurrent_scenes)})
         for idx, scene_script in enumerate(scene_scripts):
-            scene_working_dir = os.path.join(self.working_dir, f"scene_{idx}")
-            os.makedirs(scene_working_dir, exist_ok=True)
-            script2video_pipeline = Script2VideoPipeline(
-                chat_model=self.chat_model,
-                image_generator=self.image_generator,
-                video_generator=self.video_generator,
-                working_dir=scene_working_dir,
-            )
-            final_video_path = await script2video_pipeline(
-                script=scene_script,
-                user_requirement=user_requirement,
-                style=style,
-                characters=characters,
-                character_portraits_registry=character_portraits_registry,
+            task_graph.add_task(
+                f"scene_{idx}",
+                functools.partial(
+                    self.generate_video_for_single_scene,
+                    idx=idx,
+                    scene_script=scene_script,
+                    user_requirement=user_requirement,
+                    style=style,
+                    characters=characters,
+                    character_portraits_registry=character_portraits_registry,
+                ),
+                resource="scene",
             )
-            all_video_paths.append(final_video_path)
+        results = await task_graph.run()
+        all_video_paths = [results[f"scene_{idx}"] for idx in range(len(scene_scripts))]
 
         final_video_path = os.path.join(self.working_dir, "final_video.mp4")
         if os.path.exists(final_video_path):
             print(f"🚀 Skipped concatenating videos, already exists.")
         else:
             print(f"🎬 Starting concatenating videos...")
-            video_clips = [VideoFileClip(final_video_path)
-                           for final_video_path in all_video_paths]
-            final_video = concatenate_videoclips(video_clips)
-            final_video.write_videofile(final_video_path)
+            await concatenate_videos(video_paths=all_video_paths, output_path=final_video_path)
             print(f"☑️ Concatenated videos, saved to {final_video_path}.")
         return final_video_path
@@ -416,7 +416,7 @@ class Novel2MoviePipeline(BasePipeline):
                     prompt=prompt,
                     size="512x512",
                 )
-                image.save(image_path)
+                await image.asave(image_path)
                 print(f"✅ Generated portrait for character {character.index} ({character.identifier_in_novel}), saved to {image_path}")
 
 
@@ -475,7 +475,7 @@ class Novel2MoviePipeline(BasePipeline):
                     reference_image_paths=[base_character_image_path],
                     size="512x512",
                 )
-                image.save(image_path)
+                await image.asave(image_path)
                 print(f"✅ For event {event_idx}, scene {scene_idx}, generated portrait for character {character.index} ({character.identifier_in_scene}), saved to {image_path}")
 
 
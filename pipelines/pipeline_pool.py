@@ -0,0 +1,92 @@
+import asyncio
+import os
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional, Set
+
+
+class PipelinePool:
+    """
+    Hands out lightweight per-job pipelines.
+
+    The expensive part of a pipeline (chat model, image and video generators and
+    their rate limiters) is created once per pipeline type and shared. Every job
+    gets its own pipeline instance working in `{jobs_dir}/{job_id}`, so concurrent
+    jobs never resume from or overwrite each other's artifacts.
+    """
+
+    def __init__(
+        self,
+        factories: Dict[str, Callable[[], Any]],
+        jobs_dir: str = "videos",
+        max_concurrent_jobs: Optional[int] = None,
+    ):
+        """
+        Initialize the pool.
+
+        Args:
+            factories: Mapping from pipeline type to a callable creating a fully
+                       configured pipeline. Pipelines must implement with_working_dir.
+            jobs_dir: Directory holding the working directory of every job.
+            max_concurrent_jobs: Maximum number of jobs running at the same time.
+                                 If None, the number of jobs is not limited.
+        """
+        self.factories = factories
+        self.jobs_dir = jobs_dir
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self._templates: Dict[str, Any] = {}
+        self._active_jobs: Dict[str, Any] = {}
+        # jobs waiting for a slot, reserved so that no other job takes their id meanwhile
+        self._queued_jobs: Set[str] = set()
+        self._semaphore = asyncio.Semaphore(max_concurrent_jobs) if max_concurrent_jobs else None
+
+    def get_template(self, pipeline_type: str):
+        """
+        Get the shared pipeline of a type, creating it on first use.
+        """
+        if pipeline_type not in self._templates:
+            if pipeline_type not in self.factories:
+                raise ValueError(f"Unknown pipeline type: {pipeline_type}")
+            self._templates[pipeline_type] = self.factories[pipeline_type]()
+            logging.info(f"Initialized shared {pipeline_type} pipeline")
+        return self._templates[pipeline_type]
+
+    def create(self, pipeline_type: str, job_id: str):
+        """
+        Create the pipeline of a job, working in its own directory.
+        """
+        working_dir = os.path.join(self.jobs_dir, job_id)
+        return self.get_template(pipeline_type).with_working_dir(working_dir)
+
+    @asynccontextmanager
+    async def acquire(self, pipeline_type: str, job_id: str):
+        """
+        Create the pipeline of a job and hold one of the job slots while it is used.
+        """
+        if job_id in self._active_jobs or job_id in self._queued_jobs:
+            raise ValueError(f"Job {job_id} is already running")
+
+        self._queued_jobs.add(job_id)
+        try:
+            if self._semaphore is not None:
+                await self._semaphore.acquire()
+        finally:
+            self._queued_jobs.discard(job_id)
+        try:
+            pipeline = self.create(pipeline_type, job_id)
+            self._active_jobs[job_id] = pipeline
+            try:
+                yield pipeline
+            finally:
+                del self._active_jobs[job_id]
+        finally:
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_jobs": len(self._active_jobs),
+            "queued_jobs": len(self._queued_jobs),
+            "max_concurrent_jobs": self.max_concurrent_jobs,
+            "initialized_pipelines": sorted(self._templates),
+        }
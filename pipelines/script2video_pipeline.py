@@ -4,24 +4,217 @@ import json
 import logging
 import asyncio
 import time
-from typing import Optional, Dict, List, Tuple, Literal
-from moviepy import VideoFileClip, concatenate_videoclips
+import functools
+import contextlib
+from typing import Optional, Dict, List, Tuple, Literal, Union
 from PIL import Image
 from agents import *
 import yaml
 from interfaces import *
 from langchain.chat_models import init_chat_model
 from utils.timer import Timer
-from utils.rate_limiter import RateLimiter
+from utils.rate_limiter import RateLimiter, ChatModelRateLimiter
+from utils.video_concat import concatenate_videos
+from utils.media_executor import get_media_executor
+from agents.camera_image_generator import get_new_camera_image
+from agents.character_portraits_generator import TURNAROUND_VIEWS, split_turnaround_sheet
+from utils.task_graph import TaskGraph, PrioritySemaphore
+from tools.task_ledger import TaskLedger, generate_single_video_resumable
+from tools.generation_cache import CachedGenerator, CoalescedGenerator, get_generation_cache
+from tools.generator_router import ImageGeneratorRouter, VideoGeneratorRouter
+from tools.api_key_pool import ApiKeyPool
 import importlib
+import inspect
+
+
+# Default number of tasks of each kind that may call a provider at the same time
+DEFAULT_MAX_CONCURRENT_TASKS = {
+    "chat": 8,
+    "image": 4,
+    "video": 2,
+}
+
+# Rough duration (in seconds) of a task of each kind, used to rank tasks by critical path
+TASK_COST_ESTIMATES = {
+    "chat": 15.0,
+    "image": 30.0,
+    "video": 120.0,
+}
+
+
+def init_generator_from_config(
+    generator_config: dict,
+    rate_limiter: Optional[RateLimiter],
+    router_cls=None,
+):
+    """
+    Create the generator of a config section: the class at class_path built with
+    init_args, a pool of them when init_args has a list of api_key, or a router
+    between the generators listed under backends.
+
+    Args:
+        generator_config: The image_generator or video_generator section of the config.
+        rate_limiter: Rate limiter of the generator. Every backend of a router gets its
+                      own, from its own max_requests_per_minute and max_requests_per_day.
+        router_cls: Router class used when the section lists backends, or asks for
+                    hedging (hedge_percentile, max_hedge_ratio).
+    """
+    router_kwargs = {key: generator_config[key] for key in ["hedge_percentile", "max_hedge_ratio"] if generator_config.get(key) is not None}
+    if "backends" in generator_config:
+        backends = []
+        names = []
+        for backend_config in generator_config["backends"]:
+            rpm = backend_config.get("max_requests_per_minute", None)
+            rpd = backend_config.get("max_requests_per_day", None)
+            backend_rate_limiter = RateLimiter(
+                max_requests_per_minute=rpm,
+                max_requests_per_day=rpd
+            ) if (rpm or rpd) else None
+            backends.append(init_generator_from_config(backend_config, backend_rate_limiter))
+            names.append(backend_config.get("name", backend_config["class_path"].rsplit(".", 1)[1]))
+        # video backends may restrict the generations (t2v, ff2v, flf2v) routed to them
+        if any("capabilities" in backend_config for backend_config in generator_config["backends"]):
+            router_kwargs["capabilities"] = [backend_config.get("capabilities", None) for backend_config in generator_config["backends"]]
+        print(f"Routing between {len(backends)} backends: {', '.join(names)}")
+        return router_cls(backends=backends, names=names, **router_kwargs)
+
+    cls_module, cls_name = generator_config["class_path"].rsplit(".", 1)
+    generator_cls = getattr(importlib.import_module(cls_module), cls_name)
+    generator_args = dict(generator_config["init_args"])
+    if isinstance(generator_args.get("api_key"), list):
+        # every key of the pool gets the limits of the section
+        api_keys = generator_args.pop("api_key")
+        print(f"Pooling {len(api_keys)} API keys for {cls_name}")
+        generator = ApiKeyPool.from_api_keys(
+            generator_cls,
+            api_keys,
+            max_requests_per_minute=generator_config.get("max_requests_per_minute", None),
+            max_requests_per_day=generator_config.get("max_requests_per_day", None),
+            **generator_args,
+        )
+    else:
+        # not every generator supports rate limiting
+        if "rate_limiter" in inspect.signature(generator_cls).parameters:
+            generator_args["rate_limiter"] = rate_limiter
+        generator = generator_cls(**generator_args)
+    if router_kwargs and router_cls is not None:
+        # a single backend is hedged on another key of its pool, or on itself
+        return router_cls(backends=[generator], names=[cls_name], **router_kwargs)
+    return generator
+
+
+def init_services_from_config(config: dict) -> dict:
+    """
+    Create the chat model, the image and video generators (with their rate limiters,
+    routers, key pools and generation cache) and the task slots described by the
+    chat_model, image_generator, video_generator and generation_cache sections of a
+    config. Every pipeline builds its services here, whether its config comes from a
+    file or from the environment.
+
+    Returns:
+        The chat_model, image_generator, video_generator and resources arguments of
+        the pipeline.
+    """
+    # Create separate rate limiters for each service
+    chat_model_rpm = config.get("chat_model", {}).get("max_requests_per_minute", None)
+    chat_model_rpd = config.get("chat_model", {}).get("max_requests_per_day", None)
+    image_generator_rpm = config.get("image_generator", {}).get("max_requests_per_minute", None)
+    image_generator_rpd = config.get("image_generator", {}).get("max_requests_per_day", None)
+    video_generator_rpm = config.get("video_generator", {}).get("max_requests_per_minute", None)
+    video_generator_rpd = config.get("video_generator", {}).get("max_requests_per_day", None)
+
+    chat_model_rate_limiter = RateLimiter(
+        max_requests_per_minute=chat_model_rpm,
+        max_requests_per_day=chat_model_rpd
+    ) if (chat_model_rpm or chat_model_rpd) else None
+
+    image_rate_limiter = RateLimiter(
+        max_requests_per_minute=image_generator_rpm,
+        max_requests_per_day=image_generator_rpd
+    ) if (image_generator_rpm or image_generator_rpd) else None
+
+    video_rate_limiter = RateLimiter(
+        max_requests_per_minute=video_generator_rpm,
+        max_requests_per_day=video_generator_rpd
+    ) if (video_generator_rpm or video_generator_rpd) else None
+
+    # Display rate limiting configuration
+    if chat_model_rate_limiter:
+        limits = []
+        if chat_model_rpm:
+            limits.append(f"{chat_model_rpm} req/min")
+        if chat_model_rpd:
+            limits.append(f"{chat_model_rpd} req/day")
+        print(f"Chat model rate limiting: {', '.join(limits)}")
+
+    if image_rate_limiter:
+        limits = []
+        if image_generator_rpm:
+            limits.append(f"{image_generator_rpm} req/min")
+        if image_generator_rpd:
+            limits.append(f"{image_generator_rpd} req/day")
+        print(f"Image generator rate limiting: {', '.join(limits)}")
+
+    if video_rate_limiter:
+        limits = []
+        if video_generator_rpm:
+            limits.append(f"{video_generator_rpm} req/min")
+        if video_generator_rpd:
+            limits.append(f"{video_generator_rpd} req/day")
+        print(f"Video generator rate limiting: {', '.join(limits)}")
+
+    chat_model_args = config["chat_model"]["init_args"]
+    if chat_model_rate_limiter:
+        chat_model_args["rate_limiter"] = ChatModelRateLimiter(chat_model_rate_limiter)
+    chat_model = init_chat_model(**chat_model_args)
+
+    image_generator = init_generator_from_config(config["image_generator"], image_rate_limiter, router_cls=ImageGeneratorRouter)
+
+    video_generator = init_generator_from_config(config["video_generator"], video_rate_limiter, router_cls=VideoGeneratorRouter)
+
+    generation_cache_config = config.get("generation_cache") or {}
+    if generation_cache_config.get("cache_dir"):
+        generation_cache = get_generation_cache(
+            cache_dir=generation_cache_config["cache_dir"],
+            max_bytes=int(generation_cache_config.get("max_size_gb", 10) * 1024 ** 3),
+        )
+        image_generator = CachedGenerator(image_generator, generation_cache)
+        video_generator = CachedGenerator(video_generator, generation_cache)
+        print(f"Generation cache: {generation_cache_config['cache_dir']}")
+    else:
+        # identical requests in flight are still sent once
+        image_generator = CoalescedGenerator(image_generator)
+        video_generator = CoalescedGenerator(video_generator)
+
+    resources = {}
+    for resource, section in [("chat", "chat_model"), ("image", "image_generator"), ("video", "video_generator")]:
+        max_concurrent_tasks = config.get(section, {}).get("max_concurrent_tasks", None) or DEFAULT_MAX_CONCURRENT_TASKS[resource]
+        resources[resource] = PrioritySemaphore(max_concurrent_tasks)
+
+    return {
+        "chat_model": chat_model,
+        "image_generator": image_generator,
+        "video_generator": video_generator,
+        "resources": resources,
+    }
+
+
+class Script2VideoRunContext:
+    """
+    Coordination state of a single Script2VideoPipeline run.
+
+    A new context is created for every call of the pipeline, so runs in the same
+    process never share events or tasks, even when they share a pipeline instance.
+    """
+
+    def __init__(self):
+        # character idx -> task generating the portraits of the character
+        self.character_portrait_tasks: Dict[int, asyncio.Task] = {}
+        # shot idx -> task decomposing the visual description of the shot
+        self.shot_desc_tasks: Dict[int, asyncio.Task] = {}
 
-class Script2VideoPipeline:
-
-    # events
-    character_portrait_events = {}
-    shot_desc_events = {}
-    frame_events = {}
 
+class Script2VideoPipeline:
 
     def __init__(
         self,
@@ -29,6 +222,8 @@ class Script2VideoPipeline:
         image_generator,
         video_generator,
         working_dir: str,
+        resources: Optional[Dict[str, PrioritySemaphore]] = None,
+        turnaround_sheet: bool = False,
     ):
 
         self.chat_model = chat_model
@@ -36,7 +231,7 @@ class Script2VideoPipeline:
         self.video_generator = video_generator
 
         self.character_extractor = CharacterExtractor(chat_model=self.chat_model)
-        self.character_portraits_generator = CharacterPortraitsGenerator(image_generator=self.image_generator)
+        self.character_portraits_generator = CharacterPortraitsGenerator(image_generator=self.image_generator, turnaround_sheet=turnaround_sheet)
         self.storyboard_artist = StoryboardArtist(chat_model=self.chat_model)
         self.camera_image_generator = CameraImageGenerator(chat_model=self.chat_model, image_generator=self.image_generator, video_generator=self.video_generator)
         self.reference_image_selector = ReferenceImageSelector(chat_model=self.chat_model)
@@ -44,6 +239,49 @@ class Script2VideoPipeline:
         self.working_dir = working_dir
         os.makedirs(self.working_dir, exist_ok=True)
 
+        # slots shared by the provider calls of the task graph, see build_task_graph
+        if resources is None:
+            resources = {
+                resource: PrioritySemaphore(max_concurrent_tasks)
+                for resource, max_concurrent_tasks in DEFAULT_MAX_CONCURRENT_TASKS.items()
+            }
+        self.resources = resources
+
+
+    def with_working_dir(
+        self,
+        working_dir: str,
+    ) -> "Script2VideoPipeline":
+        """
+        Create a pipeline working in another directory that shares the chat model,
+        the image and video generators (with their rate limiters) and the task slots
+        of this one.
+        """
+        return self.__class__(
+            chat_model=self.chat_model,
+            image_generator=self.image_generator,
+            video_generator=self.video_generator,
+            working_dir=working_dir,
+            resources=self.resources,
+            turnaround_sheet=self.character_portraits_generator.turnaround_sheet,
+        )
+
+
+
+    def resource_slot(
+        self,
+        resource: str,
+    ):
+        """
+        Hold a slot of a resource for work running outside of the task graph, so
+        that it counts against the same concurrency limit as the tasks. Such work
+        (portraits, shot decomposition) gates most of the graph, so it is served
+        before any waiting task.
+        """
+        semaphore = self.resources.get(resource)
+        if semaphore is None:
+            return contextlib.nullcontext()
+        return semaphore.slot(priority=float("inf"))
 
 
     @classmethod
@@ -54,74 +292,12 @@ class Script2VideoPipeline:
         with open(config_path, "r") as f:
             config = yaml.safe_load(f)
 
-        chat_model_args = config["chat_model"]["init_args"]
-        chat_model = init_chat_model(**chat_model_args)
-
-        # Create separate rate limiters for each service
-        chat_model_rpm = config.get("chat_model", {}).get("max_requests_per_minute", None)
-        chat_model_rpd = config.get("chat_model", {}).get("max_requests_per_day", None)
-        image_generator_rpm = config.get("image_generator", {}).get("max_requests_per_minute", None)
-        image_generator_rpd = config.get("image_generator", {}).get("max_requests_per_day", None)
-        video_generator_rpm = config.get("video_generator", {}).get("max_requests_per_minute", None)
-        video_generator_rpd = config.get("video_generator", {}).get("max_requests_per_day", None)
-
-        chat_model_rate_limiter = RateLimiter(
-            max_requests_per_minute=chat_model_rpm,
-            max_requests_per_day=chat_model_rpd
-        ) if (chat_model_rpm or chat_model_rpd) else None
-
-        image_rate_limiter = RateLimiter(
-            max_requests_per_minute=image_generator_rpm,
-            max_requests_per_day=image_generator_rpd
-        ) if (image_generator_rpm or image_generator_rpd) else None
-
-        video_rate_limiter = RateLimiter(
-            max_requests_per_minute=video_generator_rpm,
-            max_requests_per_day=video_generator_rpd
-        ) if (video_generator_rpm or video_generator_rpd) else None
-
-        # Display rate limiting configuration
-        if chat_model_rate_limiter:
-            limits = []
-            if chat_model_rpm:
-                limits.append(f"{chat_model_rpm} req/min")
-            if chat_model_rpd:
-                limits.append(f"{chat_model_rpd} req/day")
-            print(f"Chat model rate limiting: {', '.join(limits)}")
-
-        if image_rate_limiter:
-            limits = []
-            if image_generator_rpm:
-                limits.append(f"{image_generator_rpm} req/min")
-            if image_generator_rpd:
-                limits.append(f"{image_generator_rpd} req/day")
-            print(f"Image generator rate limiting: {', '.join(limits)}")
-
-        if video_rate_limiter:
-            limits = []
-            if video_generator_rpm:
-                limits.append(f"{video_generator_rpm} req/min")
-            if video_generator_rpd:
-                limits.append(f"{video_generator_rpd} req/day")
-            print(f"Video generator rate limiting: {', '.join(limits)}")
-
-        image_generator_cls_module, image_generator_cls_name = config["image_generator"]["class_path"].rsplit(".", 1)
-        image_generator_cls = getattr(importlib.import_module(image_generator_cls_module), image_generator_cls_name)
-        image_generator_args = config["image_generator"]["init_args"]
-        image_generator_args["rate_limiter"] = image_rate_limiter
-        image_generator = image_generator_cls(**image_generator_args)
-
-        video_generator_cls_module, video_generator_cls_name = config["video_generator"]["class_path"].rsplit(".", 1)
-        video_generator_cls = getattr(importlib.import_module(video_generator_cls_module), video_generator_cls_name)
-        video_generator_args = config["video_generator"]["init_args"]
-        video_generator_args["rate_limiter"] = video_rate_limiter
-        video_generator = video_generator_cls(**video_generator_args)
+        services = init_services_from_config(config)
 
         return cls(
-            chat_model=chat_model,
-            image_generator=image_generator,
-            video_generator=video_generator,
+            **services,
             working_dir=config["working_dir"],
+            turnaround_sheet=(config.get("character_portraits") or {}).get("turnaround_sheet", False),
         )
 
     async def __call__(
@@ -132,6 +308,8 @@ class Script2VideoPipeline:
         characters: List[CharacterInScene] = None,
         character_portraits_registry: Optional[Dict[str, Dict[str, Dict[str, str]]]] = None,
     ):
+        run_context = Script2VideoRunContext()
+
         if characters is None:
             characters = await self.extract_characters(script=script)
 
@@ -147,228 +325,303 @@ class Script2VideoPipeline:
             #         json.dump([c.model_dump() for c in characters], f, ensure_ascii=False, indent=4)
             #     print(f"☑️ Extracted {len(characters)} characters from script and saved to {characters_path}.")
 
+        # The portraits are only needed as references of the frames, so they are
+        # generated in the background while the shots are planned.
+        portraits_task = None
         if character_portraits_registry is None:
-            character_portraits_registry_path = os.path.join(self.working_dir, "character_portraits_registry.json")
-            if os.path.exists(character_portraits_registry_path):
-                with open(character_portraits_registry_path, "r", encoding="utf-8") as f:
-                    character_portraits_registry = json.load(f)
-                print(f"🚀 Loaded {len(character_portraits_registry)} character portraits from existing file.")
-            else:
-                print(f"🔍 Generating character portraits...")
-                character_portraits_registry = await self.generate_character_portraits(
-                    characters=characters,
-                    character_portraits_registry=None,
-                    style=style,
-                )
-
-                with open(character_portraits_registry_path, "w", encoding="utf-8") as f:
-                    json.dump(character_portraits_registry, f, ensure_ascii=False, indent=4)
-                print(f"☑️ Generated {len(character_portraits_registry)} character portraits and saved to {character_portraits_registry_path}.")
-
-
-
-        # design shots
-        storyboard = await self.design_storyboard(
-            script=script,
-            characters=characters,
-            user_requirement=user_requirement,
-        )
+            print(f"🔍 Generating character portraits...")
+            portraits_task = asyncio.create_task(self.generate_character_portraits(
+                characters=characters,
+                character_portraits_registry=None,
+                style=style,
+                run_context=run_context,
+            ))
+            # let the portrait tasks of every character start before planning
+            await asyncio.sleep(0)
+            character_portraits_registry = {
+                character.identifier_in_scene: self.get_character_portraits_registry_item(character)
+                for character in characters
+            }
 
-        # decompose visual descriptions of shots
-        shot_descriptions = await self.decompose_visual_descriptions(
-            shot_brief_descriptions=storyboard,
-            characters=characters,
-        )
+        decomposition_task = None
+        try:
+            # design shots
+            storyboard = await self.design_storyboard(
+                script=script,
+                characters=characters,
+                user_requirement=user_requirement,
+            )
 
-        # construct camera tree
-        camera_tree = await self.construct_camera_tree(
-            shot_descriptions=shot_descriptions,
-        )
+            # decompose visual descriptions of shots in the background, the camera
+            # tree only needs the brief descriptions of the storyboard
+            decomposition_task = asyncio.create_task(self.decompose_visual_descriptions(
+                shot_brief_descriptions=storyboard,
+                characters=characters,
+                run_context=run_context,
+            ))
+            # let the decomposition tasks of every shot start before the camera tree
+            await asyncio.sleep(0)
+
+            # construct camera tree
+            camera_tree = await self.construct_camera_tree(
+                shot_descriptions=storyboard,
+            )
 
-        priority_shot_idxs = [camera.parent_cam_idx for camera in camera_tree if camera.parent_cam_idx is not None]
-        tasks = [
-            self.generate_frames_for_single_camera(
-                camera=camera,
-                shot_descriptions=shot_descriptions,
+            # generate frames, transitions and videos as one dependency graph
+            task_graph = self.build_task_graph(
+                camera_tree=camera_tree,
+                storyboard=storyboard,
                 characters=characters,
                 character_portraits_registry=character_portraits_registry,
-                priority_shot_idxs=priority_shot_idxs,
+                run_context=run_context,
             )
-            for camera in camera_tree
-        ]
+            await task_graph.run()
 
-        video_tasks = [
-            self.generate_video_for_single_shot(
-                shot_description=shot_description,
-            )
-            for shot_description in shot_descriptions
-        ]
-        tasks.extend(video_tasks)
-        await asyncio.gather(*tasks)
+            shot_descriptions = await decomposition_task
+            if portraits_task is not None:
+                await portraits_task
+        finally:
+            for background_task in [portraits_task, decomposition_task]:
+                if background_task is not None and not background_task.done():
+                    background_task.cancel()
+                    await asyncio.gather(background_task, return_exceptions=True)
 
         final_video_path = os.path.join(self.working_dir, "final_video.mp4")
         if os.path.exists(final_video_path):
             print(f"🚀 Skipped concatenating videos, already exists.")
         else:
             print(f"🎬 Starting concatenating videos...")
-            video_clips = [
-                VideoFileClip(os.path.join(self.working_dir, "shots", f"{shot_description.idx}", "video.mp4"))
-                for shot_description in shot_descriptions
-            ]
-            final_video = concatenate_videoclips(video_clips)
-            final_video.write_videofile(final_video_path, codec="libx264", preset="medium")
+            await concatenate_videos(
+                video_paths=[
+                    os.path.join(self.working_dir, "shots", f"{shot_description.idx}", "video.mp4")
+                    for shot_description in shot_descriptions
+                ],
+                output_path=final_video_path,
+            )
             print(f"☑️ Concatenated videos, saved to {final_video_path}.")
 
         return final_video_path
 
 
-    async def generate_frames_for_single_camera(
+    def build_task_graph(
         self,
-        camera: Camera,
-        shot_descriptions: List[ShotDescription],
+        camera_tree: List[Camera],
+        storyboard: List[ShotBriefDescription],
         characters: List[CharacterInScene],
         character_portraits_registry: Dict[str, Dict[str, Dict[str, str]]],
-        priority_shot_idxs: List[int],
-    ):
-        # 1. generate the first_frame of the first shot of the camera
-        first_shot_idx = camera.active_shot_idxs[0]
-        first_shot_ff_path = os.path.join(self.working_dir, "shots", f"{first_shot_idx}", "first_frame.png")
-
-        if os.path.exists(first_shot_ff_path):
-            print(f"🚀 Skipped generating first_frame for shot {first_shot_idx}, already exists.")
-            self.frame_events[first_shot_idx]["first_frame"].set()
-
-        else:
-            print(f"🖼️ Starting first_frame generation for shot {first_shot_idx}...")
-            available_image_path_and_text_pairs = []
-
-            for character_idx in shot_descriptions[first_shot_idx].ff_vis_char_idxs:
+        run_context: Script2VideoRunContext,
+    ) -> TaskGraph:
+        """
+        Build the dependency graph reference selection -> frame -> transition -> video
+        for every shot. The frames of a camera all reference the first frame of its
+        first shot, and a child camera's first frame is derived from a transition video
+        starting at the first frame of its parent shot.
+
+        The graph is built from the camera tree and the brief storyboard only. The shot
+        descriptions are still being decomposed by the tasks of the run context, so the
+        work of a shot waits for its own description, and the reference selection of a
+        frame waits for the portraits of the characters visible in it. Every shot gets
+        a last_frame node, which does nothing when its variation is small.
+        """
+        task_graph = TaskGraph(resources=self.resources)
+
+        def add_task(name, func, deps, resource):
+            cost = TASK_COST_ESTIMATES.get(resource, 0.0)
+            return task_graph.add_task(name, func, deps=deps, resource=resource, cost=cost)
+
+        def get_shot_description(shot_idx: int) -> ShotDescription:
+            # only called by tasks depending on shot_description_{shot_idx}
+            return run_context.shot_desc_tasks[shot_idx].result()
+
+        def needs_frame(shot_description: ShotDescription, frame_type: str) -> bool:
+            return frame_type == "first_frame" or shot_description.variation_type in ["medium", "large"]
+
+        def portrait_pairs(character_idxs: List[int]) -> List[Tuple[str, str]]:
+            pairs = []
+            for character_idx in character_idxs:
                 identifier_in_scene = characters[character_idx].identifier_in_scene
-                registry_item = character_portraits_registry[identifier_in_scene]
-                for view, item in registry_item.items():
-                    available_image_path_and_text_pairs.append((item["path"], item["description"]))
-            
-            # generate the first_frame based on the shot_description.ff_desc
-            if camera.parent_shot_idx is not None:
-                # generate the first_frame based on the transition video
-                parent_shot_idx = camera.parent_shot_idx
-                await self.frame_events[parent_shot_idx]["first_frame"].wait()
-                parent_shot_ff_path = os.path.join(self.working_dir, "shots", f"{parent_shot_idx}", "first_frame.png")
-                transition_video_path = os.path.join(self.working_dir, "shots", f"{first_shot_idx}", f"transition_video_from_shot_{parent_shot_idx}.mp4")
-
-                if os.path.exists(transition_video_path):
-                    print(f"🚀 Skipped generating transition video for shot {first_shot_idx} from shot {parent_shot_idx}, already exists.")
-                else:
-                    print(f"🖼️ Starting transition video generation for shot {first_shot_idx} from shot {parent_shot_idx}...")
-                    transition_video_output = await self.camera_image_generator.generate_transition_video(
-                        first_shot_visual_desc=shot_descriptions[parent_shot_idx].visual_desc,
-                        second_shot_visual_desc=shot_descriptions[first_shot_idx].visual_desc,
-                        first_shot_ff_path=parent_shot_ff_path,
-                    )
-                    transition_video_output.save(transition_video_path)
-                    print(f"☑️ Generated transition video for shot {first_shot_idx} from shot {parent_shot_idx}, saved to {transition_video_path}.")
-
-                new_camera_image_path = os.path.join(self.working_dir, "shots", f"{first_shot_idx}", f"new_camera_{camera.idx}.png")
-                if os.path.exists(new_camera_image_path):
-                    print(f"🚀 Skipped generating new camera image for shot {first_shot_idx}, already exists.")
-                else:
-                    print(f"🖼️ Starting new camera image generation for shot {first_shot_idx}...")
-                    new_camera_image = self.camera_image_generator.get_new_camera_image(transition_video_path)
-                    new_camera_image.save(new_camera_image_path)
-                    print(f"☑️ Generated new camera image for shot {first_shot_idx} (not completed), saved to {new_camera_image_path}.")
+                for view, item in character_portraits_registry[identifier_in_scene].items():
+                    pairs.append((item["path"], item["description"]))
+            return pairs
+
+        async def wait_for_portraits(shot_idx: int, frame_type: str):
+            shot_description = get_shot_description(shot_idx)
+            if not needs_frame(shot_description, frame_type):
+                return
+            vis_char_idxs = shot_description.ff_vis_char_idxs if frame_type == "first_frame" else shot_description.lf_vis_char_idxs
+            await asyncio.gather(*[
+                asyncio.shield(run_context.character_portrait_tasks[character_idx])
+                for character_idx in vis_char_idxs
+                if character_idx in run_context.character_portrait_tasks
+            ])
+
+        async def select_reference_images(shot_idx: int, frame_type: str, camera: Camera):
+            shot_description = get_shot_description(shot_idx)
+            if not needs_frame(shot_description, frame_type):
+                return None
+
+            first_shot_idx = camera.active_shot_idxs[0]
+            if frame_type == "first_frame":
+                available_image_path_and_text_pairs = portrait_pairs(shot_description.ff_vis_char_idxs)
+                frame_desc = shot_description.ff_desc
+            else:
+                available_image_path_and_text_pairs = portrait_pairs(shot_description.lf_vis_char_idxs)
+                frame_desc = shot_description.lf_desc
 
+            if shot_idx == first_shot_idx and frame_type == "first_frame":
+                if camera.parent_shot_idx is not None:
+                    new_camera_image_path = os.path.join(self.working_dir, "shots", f"{first_shot_idx}", f"new_camera_{camera.idx}.png")
                     available_image_path_and_text_pairs.append(
                         (
                             new_camera_image_path,
                             f"The composition and background are correct but some elements may be wrong. The wrong elements should be replaced.\nWrong elements: {camera.missing_info}.\nYou must select this image as the main reference and replace the characters in the image with the provided character portraits. Don't change the background."
                         )
                     )
+            else:
+                # the following frames of the camera all reference the first frame of the camera
+                available_image_path_and_text_pairs.append(
+                    (
+                        os.path.join(self.working_dir, "shots", f"{first_shot_idx}", "first_frame.png"),
+                        get_shot_description(first_shot_idx).ff_desc,
+                    )
+                )
+
+            return await self.select_reference_images_for_frame(
+                shot_idx=shot_idx,
+                frame_type=frame_type,
+                available_image_path_and_text_pairs=available_image_path_and_text_pairs,
+                frame_desc=frame_desc,
+            )
+
+        async def generate_frame(shot_idx: int, frame_type: str):
+            if not needs_frame(get_shot_description(shot_idx), frame_type):
+                return None
+            return await self.generate_frame_for_single_shot(shot_idx=shot_idx, frame_type=frame_type)
 
+        async def generate_video(shot_idx: int):
+            return await self.generate_video_for_single_shot(shot_description=get_shot_description(shot_idx))
 
-            # 如果子镜头缺少信息，则需要选择参考图像生成
-            if camera.parent_shot_idx is None or camera.missing_info is not None:
-                ff_selector_output_path = os.path.join(self.working_dir, "shots", f"{first_shot_idx}", "first_frame_selector_output.json")
-                if os.path.exists(ff_selector_output_path):
-                    with open(ff_selector_output_path, 'r', encoding='utf-8') as f:
-                        ff_selector_output = json.load(f)
-                    print(f"🚀 Loaded existing reference image selection and prompt for first_frame of shot {first_shot_idx} from {ff_selector_output_path}.")
+        def add_frame_tasks(shot_idx, frame_type, camera, deps):
+            portraits_task = add_task(
+                f"{frame_type}_{shot_idx}_portraits",
+                functools.partial(wait_for_portraits, shot_idx=shot_idx, frame_type=frame_type),
+                deps=[f"shot_description_{shot_idx}"],
+                resource=None,
+            )
+            selection_task = add_task(
+                f"{frame_type}_{shot_idx}_selection",
+                functools.partial(select_reference_images, shot_idx=shot_idx, frame_type=frame_type, camera=camera),
+                deps=[portraits_task] + deps,
+                resource="chat",
+            )
+            return add_task(
+                f"{frame_type}_{shot_idx}",
+                functools.partial(generate_frame, shot_idx=shot_idx, frame_type=frame_type),
+                deps=[selection_task],
+                resource="image",
+            )
+
+        # 0. the shot descriptions, decomposed by the tasks of the run context
+        for shot_brief_description in storyboard:
+            add_task(
+                f"shot_description_{shot_brief_description.idx}",
+                functools.partial(asyncio.shield, run_context.shot_desc_tasks[shot_brief_description.idx]),
+                deps=[],
+                resource=None,
+            )
+
+        for camera in camera_tree:
+            first_shot_idx = camera.active_shot_idxs[0]
+
+            # 1. the first_frame of the first shot of the camera
+            if camera.parent_shot_idx is None:
+                first_frame_task = add_frame_tasks(first_shot_idx, "first_frame", camera, deps=[])
+            else:
+                transition_task = add_task(
+                    f"transition_camera_{camera.idx}",
+                    functools.partial(self.generate_new_camera_image, camera=camera, shot_descriptions=storyboard),
+                    deps=[f"first_frame_{camera.parent_shot_idx}"],
+                    resource="video",
+                )
+                if camera.missing_info is not None:
+                    first_frame_task = add_frame_tasks(first_shot_idx, "first_frame", camera, deps=[transition_task])
                 else:
-                    print(f"🔍 Selecting reference images and generating prompt for first_frame of shot {first_shot_idx}...")
-                    ff_selector_output = await self.reference_image_selector.select_reference_images_and_generate_prompt(
-                        available_image_path_and_text_pairs=available_image_path_and_text_pairs,
-                        frame_description=shot_descriptions[first_shot_idx].ff_desc
+                    first_frame_task = add_task(
+                        f"first_frame_{first_shot_idx}",
+                        functools.partial(self.copy_new_camera_image_as_first_frame, camera=camera),
+                        deps=[transition_task],
+                        resource=None,
                     )
-                    with open(ff_selector_output_path, 'w', encoding='utf-8') as f:
-                        json.dump(ff_selector_output, f, ensure_ascii=False, indent=4)
-
-                    print(f"☑️ Selected reference images and generated prompt for first_frame of shot {first_shot_idx}, saved to {ff_selector_output_path}.")
-
-                reference_image_path_and_text_pairs, prompt = ff_selector_output["reference_image_path_and_text_pairs"], ff_selector_output["text_prompt"]
-                prefix_prompt = ""
-                for i, (image_path, text) in enumerate(reference_image_path_and_text_pairs):
-                    prefix_prompt += f"Image {i}: {text}\n"
-                prompt = f"{prefix_prompt}\n{prompt}"
-                reference_image_paths = [item[0] for item in reference_image_path_and_text_pairs]
-                ff_image: ImageOutput = await self.image_generator.generate_single_image(
-                    prompt=prompt,
-                    reference_image_paths=reference_image_paths,
-                    size="1600x900",
-                )
-                ff_image.save(first_shot_ff_path)
-                self.frame_events[first_shot_idx]["first_frame"].set()
-                print(f"☑️ Generated first_frame for shot {first_shot_idx}, saved to {first_shot_ff_path}.")
-            else:
-                shutil.copy(new_camera_image_path, first_shot_ff_path)
-                self.frame_events[first_shot_idx]["first_frame"].set()
-                print(f"☑️ Generated first_frame for shot {first_shot_idx}, saved to {first_shot_ff_path}.")
-
-
-        # 2. generate the following frames of the camera
-        priority_tasks = []
-        normal_tasks = []
-
-        if shot_descriptions[first_shot_idx].variation_type in ["medium", "large"]:
-            task = self.generate_frame_for_single_shot(
-                shot_idx=first_shot_idx, 
-                frame_type="last_frame", 
-                first_shot_ff_path_and_text_pair=(first_shot_ff_path, shot_descriptions[first_shot_idx].ff_desc),
-                frame_desc=shot_descriptions[first_shot_idx].lf_desc,
-                visible_characters=[characters[idx] for idx in shot_descriptions[first_shot_idx].lf_vis_char_idxs],
-                character_portraits_registry=character_portraits_registry,
+
+            # 2. the following frames of the camera, all referencing the first frame of the camera
+            for shot_idx in camera.active_shot_idxs:
+                following_frame_deps = [first_frame_task, f"shot_description_{first_shot_idx}"]
+                if shot_idx != first_shot_idx:
+                    add_frame_tasks(shot_idx, "first_frame", camera, deps=following_frame_deps)
+                add_frame_tasks(shot_idx, "last_frame", camera, deps=following_frame_deps)
+
+        # 3. the video of every shot
+        for shot_brief_description in storyboard:
+            shot_idx = shot_brief_description.idx
+            add_task(
+                f"video_{shot_idx}",
+                functools.partial(generate_video, shot_idx=shot_idx),
+                deps=[f"shot_description_{shot_idx}", f"first_frame_{shot_idx}", f"last_frame_{shot_idx}"],
+                resource="video",
             )
-            normal_tasks.append(task)
-
-        for shot_idx in camera.active_shot_idxs[1:]:
-            first_frame_task = self.generate_frame_for_single_shot(
-                    shot_idx=shot_idx, 
-                    frame_type="first_frame", 
-                    first_shot_ff_path_and_text_pair=(first_shot_ff_path, shot_descriptions[first_shot_idx].ff_desc),
-                    frame_desc=shot_descriptions[shot_idx].ff_desc,
-                    visible_characters=[characters[idx] for idx in shot_descriptions[shot_idx].ff_vis_char_idxs],
-                    character_portraits_registry=character_portraits_registry,
-                )
-            if shot_idx in priority_shot_idxs:
-                priority_tasks.append(first_frame_task)
-            else:
-                normal_tasks.append(first_frame_task)
 
+        return task_graph
 
-            if shot_descriptions[shot_idx].variation_type in ["medium", "large"]:
-                last_frame_task = self.generate_frame_for_single_shot(
-                    shot_idx=shot_idx, 
-                    frame_type="last_frame", 
-                    first_shot_ff_path_and_text_pair=(first_shot_ff_path, shot_descriptions[first_shot_idx].ff_desc),
-                    frame_desc=shot_descriptions[shot_idx].lf_desc,
-                    visible_characters=[characters[idx] for idx in shot_descriptions[shot_idx].lf_vis_char_idxs],
-                    character_portraits_registry=character_portraits_registry,
-                )
-                normal_tasks.append(last_frame_task)
 
+    async def generate_new_camera_image(
+        self,
+        camera: Camera,
+        shot_descriptions: List[Union[ShotDescription, ShotBriefDescription]],
+    ):
+        first_shot_idx = camera.active_shot_idxs[0]
+        parent_shot_idx = camera.parent_shot_idx
+        parent_shot_ff_path = os.path.join(self.working_dir, "shots", f"{parent_shot_idx}", "first_frame.png")
+        transition_video_path = os.path.join(self.working_dir, "shots", f"{first_shot_idx}", f"transition_video_from_shot_{parent_shot_idx}.mp4")
+        new_camera_image_path = os.path.join(self.working_dir, "shots", f"{first_shot_idx}", f"new_camera_{camera.idx}.png")
+
+        if os.path.exists(new_camera_image_path):
+            print(f"🚀 Skipped generating new camera image for shot {first_shot_idx}, already exists.")
+            return new_camera_image_path
 
-        await asyncio.gather(*priority_tasks)
-        await asyncio.gather(*normal_tasks)
+        if os.path.exists(transition_video_path):
+            print(f"🚀 Skipped generating transition video for shot {first_shot_idx} from shot {parent_shot_idx}, already exists.")
+        else:
+            print(f"🖼️ Starting transition video generation for shot {first_shot_idx} from shot {parent_shot_idx}...")
+            transition_video_output = await self.camera_image_generator.generate_transition_video(
+                first_shot_visual_desc=shot_descriptions[parent_shot_idx].visual_desc,
+                second_shot_visual_desc=shot_descriptions[first_shot_idx].visual_desc,
+                first_shot_ff_path=parent_shot_ff_path,
+                task_ledger=TaskLedger(os.path.splitext(transition_video_path)[0] + "_task.json"),
+            )
+            await transition_video_output.asave(transition_video_path)
+            print(f"☑️ Generated transition video for shot {first_shot_idx} from shot {parent_shot_idx}, saved to {transition_video_path}.")
+
+        print(f"🖼️ Starting new camera image generation for shot {first_shot_idx}...")
+        new_camera_image = await get_media_executor().run("new_camera_image", get_new_camera_image, transition_video_path)
+        await new_camera_image.asave(new_camera_image_path)
+        print(f"☑️ Generated new camera image for shot {first_shot_idx} (not completed), saved to {new_camera_image_path}.")
+        return new_camera_image_path
 
 
+    async def copy_new_camera_image_as_first_frame(
+        self,
+        camera: Camera,
+    ):
+        first_shot_idx = camera.active_shot_idxs[0]
+        first_shot_ff_path = os.path.join(self.working_dir, "shots", f"{first_shot_idx}", "first_frame.png")
+        if os.path.exists(first_shot_ff_path):
+            print(f"🚀 Skipped generating first_frame for shot {first_shot_idx}, already exists.")
+        else:
+            new_camera_image_path = os.path.join(self.working_dir, "shots", f"{first_shot_idx}", f"new_camera_{camera.idx}.png")
+            shutil.copy(new_camera_image_path, first_shot_ff_path)
+            print(f"☑️ Generated first_frame for shot {first_shot_idx}, saved to {first_shot_ff_path}.")
+        return first_shot_ff_path
+
 
     async def generate_video_for_single_shot(
         self,
@@ -378,32 +631,52 @@ class Script2VideoPipeline:
         if os.path.exists(video_path):
             print(f"🚀 Skipped generating video for shot {shot_description.idx}, already exists.")
         else:
-            await self.frame_events[shot_description.idx]["first_frame"].wait()
-            if shot_description.variation_type in ["medium", "large"]:
-                await self.frame_events[shot_description.idx]["last_frame"].wait()
-
             frame_paths = []
             frame_paths.append(os.path.join(self.working_dir, "shots", f"{shot_description.idx}", "first_frame.png"))
             if shot_description.variation_type in ["medium", "large"]:
                 frame_paths.append(os.path.join(self.working_dir, "shots", f"{shot_description.idx}", "last_frame.png"))
 
             print(f"🎬 Starting video generation for shot {shot_description.idx}...")
-            video_output = await self.video_generator.generate_single_video(
+            video_output = await generate_single_video_resumable(
+                self.video_generator,
+                TaskLedger(os.path.join(self.working_dir, "shots", f"{shot_description.idx}", "video_task.json")),
                 prompt=shot_description.motion_desc + "\n" + shot_description.audio_desc,
                 reference_image_paths=frame_paths,
             )
-            video_output.save(video_path)
+            await video_output.asave(video_path)
             print(f"☑️ Generated video for shot {shot_description.idx}, saved to {video_path}.")
+        return video_path
 
-    async def generate_frame_for_single_shot(
+
+    async def select_reference_images_for_frame(
         self,
         shot_idx: int,
         frame_type: Literal["first_frame", "last_frame"],
-        first_shot_ff_path_and_text_pair: Tuple[str, str],
+        available_image_path_and_text_pairs: List[Tuple[str, str]],
         frame_desc: str,
-        visible_characters: List[CharacterInScene],
-        character_portraits_registry: Dict[str, Dict[str, Dict[str, str]]],
-    ) -> ImageOutput:
+    ):
+        frame_image_path = os.path.join(self.working_dir, "shots", f"{shot_idx}", f"{frame_type}.png")
+        selector_output_path = os.path.join(self.working_dir, "shots", f"{shot_idx}", f"{frame_type}_selector_output.json")
+
+        if os.path.exists(frame_image_path) or os.path.exists(selector_output_path):
+            print(f"🚀 Loaded existing reference image selection and prompt for {frame_type} of shot {shot_idx} from {selector_output_path}.")
+        else:
+            print(f"🔍 Selecting reference images and generating prompt for {frame_type} of shot {shot_idx}...")
+            selector_output = await self.reference_image_selector.select_reference_images_and_generate_prompt(
+                available_image_path_and_text_pairs=available_image_path_and_text_pairs,
+                frame_description=frame_desc
+            )
+            with open(selector_output_path, 'w', encoding='utf-8') as f:
+                json.dump(selector_output, f, ensure_ascii=False, indent=4)
+            print(f"☑️ Selected reference images and generated prompt for {frame_type} of shot {shot_idx}, saved to {selector_output_path}.")
+        return selector_output_path
+
+
+    async def generate_frame_for_single_shot(
+        self,
+        shot_idx: int,
+        frame_type: Literal["first_frame", "last_frame"],
+    ) -> str:
 
         frame_image_path = os.path.join(self.working_dir, "shots", f"{shot_idx}", f"{frame_type}.png")
 
@@ -412,29 +685,9 @@ class Script2VideoPipeline:
 
         else:
             print(f"🖼️ Starting {frame_type} generation for shot {shot_idx}...")
-            available_image_path_and_text_pairs = []
-            for visible_character in visible_characters:
-                identifier_in_scene = visible_character.identifier_in_scene
-                registry_item = character_portraits_registry[identifier_in_scene]
-                for view, item in registry_item.items():
-                    available_image_path_and_text_pairs.append((item["path"], item["description"]))
-
-            available_image_path_and_text_pairs.append(first_shot_ff_path_and_text_pair)
-
             selector_output_path = os.path.join(self.working_dir, "shots", f"{shot_idx}", f"{frame_type}_selector_output.json")
-            if os.path.exists(selector_output_path):
-                with open(selector_output_path, 'r', encoding='utf-8') as f:
-                    selector_output = json.load(f)
-                print(f"🚀 Loaded existing reference image selection and prompt for {frame_type} frame of shot {shot_idx} from {selector_output_path}.")
-            else:
-                print(f"🔍 Selecting reference images and generating prompt for {frame_type} frame of shot {shot_idx}...")
-                selector_output = await self.reference_image_selector.select_reference_images_and_generate_prompt(
-                    available_image_path_and_text_pairs=available_image_path_and_text_pairs,
-                    frame_description=frame_desc
-                )
-                with open(selector_output_path, 'w', encoding='utf-8') as f:
-                    json.dump(selector_output, f, ensure_ascii=False, indent=4)
-                print(f"☑️ Selected reference images and generated prompt for {frame_type} frame of shot {shot_idx}, saved to {selector_output_path}.")
+            with open(selector_output_path, 'r', encoding='utf-8') as f:
+                selector_output = json.load(f)
 
             reference_image_path_and_text_pairs, prompt = selector_output["reference_image_path_and_text_pairs"], selector_output["text_prompt"]
             prefix_prompt = ""
@@ -448,17 +701,15 @@ class Script2VideoPipeline:
                 reference_image_paths=reference_image_paths,
                 size="1600x900",
             )
-            frame_image.save(frame_image_path)
-            print(f"☑️ Generated {frame_type} frame for shot {shot_idx}, saved to {frame_image_path}.")
+            await frame_image.asave(frame_image_path)
+            print(f"☑️ Generated {frame_type} for shot {shot_idx}, saved to {frame_image_path}.")
 
-
-        self.frame_events[shot_idx][frame_type].set()
         return frame_image_path
 
 
     async def construct_camera_tree(
         self,
-        shot_descriptions: List[ShotDescription],
+        shot_descriptions: List[Union[ShotDescription, ShotBriefDescription]],
     ):
         camera_tree_path = os.path.join(self.working_dir, "camera_tree.json")
 
@@ -502,9 +753,6 @@ class Script2VideoPipeline:
                 json.dump([character.model_dump() for character in characters], f, ensure_ascii=False, indent=4)
             print(f"✅ Extracted {len(characters)} characters from script and saved to {save_path}.")
 
-        for character in characters:
-            self.character_portrait_events[character.idx] = asyncio.Event()
-
         return characters
 
 
@@ -513,6 +761,7 @@ class Script2VideoPipeline:
         characters: List[CharacterInScene],
         character_portraits_registry: Optional[Dict[str, Dict[str, Dict[str, str]]]],
         style: str,
+        run_context: Optional[Script2VideoRunContext] = None,
     ):
         character_portraits_registry_path = os.path.join(self.working_dir, "character_portraits_registry.json")
         if character_portraits_registry is None:
@@ -523,16 +772,24 @@ class Script2VideoPipeline:
                 character_portraits_registry = {}
 
 
-        tasks = [
-            self.generate_portraits_for_single_character(character, style)
-            for character in characters
-            if character.identifier_in_scene not in character_portraits_registry
-        ]
+        tasks = []
+        for character in characters:
+            if character.identifier_in_scene in character_portraits_registry:
+                continue
+            task = asyncio.create_task(self.generate_portraits_for_single_character(character, style))
+            if run_context is not None:
+                run_context.character_portrait_tasks[character.idx] = task
+            tasks.append(task)
         if tasks:
-            for future in asyncio.as_completed(tasks):
-                character_portraits_registry.update(await future)
-                with open(character_portraits_registry_path, 'w', encoding='utf-8') as f:
-                    json.dump(character_portraits_registry, f, ensure_ascii=False, indent=4)
+            try:
+                for future in asyncio.as_completed(tasks):
+                    character_portraits_registry.update(await future)
+                    with open(character_portraits_registry_path, 'w', encoding='utf-8') as f:
+                        json.dump(character_portraits_registry, f, ensure_ascii=False, indent=4)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
 
             print(f"✅ Completed character portrait generation for {len(characters)} characters.")
         else:
@@ -540,57 +797,85 @@ class Script2VideoPipeline:
         return character_portraits_registry
 
 
+    def get_character_portraits_registry_item(
+        self,
+        character: CharacterInScene,
+    ) -> Dict[str, Dict[str, str]]:
+        character_dir = os.path.join(self.working_dir, "character_portraits", f"{character.idx}_{character.identifier_in_scene}")
+        return {
+            view: {
+                "path": os.path.join(character_dir, f"{view}.png"),
+                "description": f"A {view} view portrait of {character.identifier_in_scene}.",
+            }
+            for view in ["front", "side", "back"]
+        }
+
+
     async def generate_portraits_for_single_character(
         self,
         character: CharacterInScene,
         style: str,
     ):
-        character_dir = os.path.join(self.working_dir, "character_portraits", f"{character.idx}_{character.identifier_in_scene}")
-        os.makedirs(character_dir, exist_ok=True)
-
-        front_portrait_path = os.path.join(character_dir, "front.png")
-        if os.path.exists(front_portrait_path):
-            pass
+        registry_item = self.get_character_portraits_registry_item(character)
+        front_portrait_path = registry_item["front"]["path"]
+        side_portrait_path = registry_item["side"]["path"]
+        back_portrait_path = registry_item["back"]["path"]
+        os.makedirs(os.path.dirname(front_portrait_path), exist_ok=True)
+
+        if self.character_portraits_generator.turnaround_sheet:
+            await self.generate_portraits_from_turnaround_sheet(character, style, registry_item)
         else:
-            front_portrait_output = await self.character_portraits_generator.generate_front_portrait(character, style)
-            front_portrait_output.save(front_portrait_path)
-
+            if os.path.exists(front_portrait_path):
+                pass
+            else:
+                async with self.resource_slot("image"):
+                    front_portrait_output = await self.character_portraits_generator.generate_front_portrait(character, style)
+                await front_portrait_output.asave(front_portrait_path)
+
+            # the side and back views only depend on the front one
+            async def generate_view_portrait(generate_portrait, portrait_path):
+                if os.path.exists(portrait_path):
+                    return
+                async with self.resource_slot("image"):
+                    portrait_output = await generate_portrait(character, front_portrait_path)
+                await portrait_output.asave(portrait_path)
+
+            await asyncio.gather(
+                generate_view_portrait(self.character_portraits_generator.generate_side_portrait, side_portrait_path),
+                generate_view_portrait(self.character_portraits_generator.generate_back_portrait, back_portrait_path),
+            )
 
-        side_portrait_path = os.path.join(character_dir, "side.png")
-        if os.path.exists(side_portrait_path):
-            pass
-        else:
-            side_portrait_output = await self.character_portraits_generator.generate_side_portrait(character, front_portrait_path)
-            side_portrait_output.save(side_portrait_path)
+        print(f"☑️ Completed character portrait generation for {character.identifier_in_scene}.")
 
-        back_portrait_path = os.path.join(character_dir, "back.png")
-        if os.path.exists(back_portrait_path):
-            pass
-        else:
-            back_portrait_output = await self.character_portraits_generator.generate_back_portrait(character, front_portrait_path)
-            back_portrait_output.save(back_portrait_path)
+        return {character.identifier_in_scene: registry_item}
 
-        self.character_portrait_events[character.idx].set()
 
-        print(f"☑️ Completed character portrait generation for {character.identifier_in_scene}.")
-
-        return {
-            character.identifier_in_scene: {
-                "front": {
-                    "path": front_portrait_path,
-                    "description": f"A front view portrait of {character.identifier_in_scene}.",
-                },
-                "side": {
-                    "path": side_portrait_path,
-                    "description": f"A side view portrait of {character.identifier_in_scene}.",
-                },
-                "back": {
-                    "path": back_portrait_path,
-                    "description": f"A back view portrait of {character.identifier_in_scene}.",
-                },
-            }
-        }
 
+    async def generate_portraits_from_turnaround_sheet(
+        self,
+        character: CharacterInScene,
+        style: str,
+        registry_item: Dict[str, Dict[str, str]],
+    ):
+        """
+        Generate the missing portraits of a character from a single turnaround
+        sheet, saved next to them so that a resumed job splits it again rather than
+        generating a new one.
+        """
+        missing_views = [view for view in TURNAROUND_VIEWS if not os.path.exists(registry_item[view]["path"])]
+        if not missing_views:
+            return
+
+        sheet_path = os.path.join(os.path.dirname(registry_item["front"]["path"]), "turnaround_sheet.png")
+        if not os.path.exists(sheet_path):
+            async with self.resource_slot("image"):
+                sheet_output = await self.character_portraits_generator.generate_turnaround_sheet(character, style)
+            await sheet_output.asave(sheet_path)
+
+        view_outputs = await get_media_executor().run("split_turnaround_sheet", split_turnaround_sheet, sheet_path)
+        for view, view_output in zip(TURNAROUND_VIEWS, view_outputs):
+            if view in missing_views:
+                await view_output.asave(registry_item[view]["path"])
 
 
     async def design_storyboard(
@@ -617,9 +902,6 @@ class Script2VideoPipeline:
                 json.dump([shot.model_dump() for shot in storyboard], f, ensure_ascii=False, indent=4)
             print(f"✅ Designed storyboard and saved to {storyboard_path}.")
 
-        for shot_brief_description in storyboard:
-            self.shot_desc_events[shot_brief_description.idx] = asyncio.Event()
-
         return storyboard
 
 
@@ -628,13 +910,21 @@ class Script2VideoPipeline:
         self,
         shot_brief_descriptions: List[ShotBriefDescription],
         characters: List[CharacterInScene],
+        run_context: Optional[Script2VideoRunContext] = None,
     ):
-        tasks = [
-            self.decompose_visual_description_for_single_shot_brief_description(shot_brief_description, characters)
-            for shot_brief_description in shot_brief_descriptions
-        ]
-
-        shot_descriptions = await asyncio.gather(*tasks)
+        tasks = []
+        for shot_brief_description in shot_brief_descriptions:
+            task = asyncio.create_task(self.decompose_visual_description_for_single_shot_brief_description(shot_brief_description, characters))
+            if run_context is not None:
+                run_context.shot_desc_tasks[shot_brief_description.idx] = task
+            tasks.append(task)
+
+        try:
+            shot_descriptions = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
         return shot_descriptions
 
 
@@ -651,25 +941,14 @@ class Script2VideoPipeline:
                 shot_description = ShotDescription.model_validate(json.load(f))
             print(f"🚀 Loaded shot {shot_brief_description.idx} description from existing file.")
         else:
-            shot_description = await self.storyboard_artist.decompose_visual_description(
-                shot_brief_desc=shot_brief_description,
-                characters=characters,
-                retry_timeout=120,
-            )
+            async with self.resource_slot("chat"):
+                shot_description = await self.storyboard_artist.decompose_visual_description(
+                    shot_brief_desc=shot_brief_description,
+                    characters=characters,
+                    retry_timeout=120,
+                )
             with open(shot_description_path, 'w', encoding='utf-8') as f:
                 json.dump(shot_description.model_dump(), f, ensure_ascii=False, indent=4)
             print(f"✅ Decomposed visual description for shot {shot_brief_description.idx} and saved to {shot_description_path}.")
 
-        self.shot_desc_events[shot_brief_description.idx].set()
-
-        if shot_description.variation_type in ["medium", "large"]:
-            self.frame_events[shot_brief_description.idx] = {
-                "first_frame": asyncio.Event(),
-                "last_frame": asyncio.Event(),
-            }
-        else:
-            self.frame_events[shot_brief_description.idx] = {
-                "first_frame": asyncio.Event(),
-            }
-
         return shot_description
\ No newline at end of file
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import os
+import random
+import re
+import tempfile
+from typing import Any, List, Optional
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from interfaces import CharacterInScene, ImageOutput, VideoOutput
+
+
+def make_video_bytes(width: int = 64, height: int = 36, num_frames: int = 8, fps: int = 8) -> bytes:
+    """Encode a tiny solid-color mp4 and return its bytes."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "video.mp4")
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+        color = np.random.randint(0, 255, size=3, dtype=np.uint8)
+        for _ in range(num_frames):
+            writer.write(np.full((height, width, 3), color, dtype=np.uint8))
+        writer.release()
+        with open(path, "rb") as f:
+            return f.read()
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model answering every agent prompt of the pipelines with a canned,
+    schema-valid response, after a short random delay.
+    """
+
+    num_shots: int = 3
+    num_cameras: int = 2
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _respond(self, text: str, human_text: str) -> dict:
+        if "design a complete storyboard" in text:
+            return {
+                "storyboard": [
+                    {
+                        "idx": idx,
+                        "is_last": idx == self.num_shots - 1,
+                        "cam_idx": idx % self.num_cameras,
+                        "visual_desc": f"Shot {idx} of <Alice>.",
+                        "audio_desc": "[Sound Effect] Ambient sound",
+                    }
+                    for idx in range(self.num_shots)
+                ]
+            }
+        if "dissect and rewrite" in text:
+            variation_type = random.choice(["small", "medium"])
+            return {
+                "ff_desc": "Alice stands.",
+                "ff_vis_char_idxs": [0],
+                "lf_desc": "Alice sits.",
+                "lf_vis_char_idxs": [0],
+                "motion_desc": "Alice sits down.",
+                "variation_type": variation_type,
+                "variation_reason": "test",
+            }
+        if "camera position tree" in text:
+            num_cameras = len(re.findall(r"<CAMERA_\d+>", text))
+            return {"camera_parent_items": [None] * num_cameras}
+        if "select the most suitable reference images" in text:
+            num_images = len(re.findall(r"Image \d+:", human_text))
+            return {"ref_image_indices": list(range(num_images)), "text_prompt": "Create an image."}
+        if "extract all relevant character information" in text:
+            return {
+                "characters": [
+                    {
+                        "idx": 0,
+                        "identifier_in_scene": "Alice",
+                        "is_visible": True,
+                        "static_features": "Short hair.",
+                        "dynamic_features": "Green dress.",
+                    }
+                ]
+            }
+        raise ValueError(f"Unexpected prompt: {text[:200]}")
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        texts = []
+        for message in messages:
+            if isinstance(message.content, str):
+                texts.append(message.content)
+            else:
+                texts.append("".join(part.get("text", "") for part in message.content if isinstance(part, dict)))
+        message = AIMessage(content=json.dumps(self._respond("".join(texts), texts[-1])))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(random.uniform(0, 0.01))
+        return self._generate(messages, stop=stop, **kwargs)
+
+
+class FakeImageGenerator:
+    def __init__(self):
+        self.calls = []
+
+    async def generate_single_image(
+        self,
+        prompt: str,
+        reference_image_paths: List[str] = [],
+        **kwargs,
+    ) -> ImageOutput:
+        for path in reference_image_paths:
+            assert os.path.exists(path), f"reference image {path} does not exist yet"
+        self.calls.append((prompt, list(reference_image_paths)))
+        await asyncio.sleep(random.uniform(0, 0.01))
+        image = Image.new("RGB", (32, 18), tuple(random.randint(0, 255) for _ in range(3)))
+        return ImageOutput(fmt="pil", ext="png", data=image)
+
+
+class FakeVideoGenerator:
+    def __init__(self):
+        self.calls = []
+        self.video_bytes = make_video_bytes()
+
+    async def generate_single_video(
+        self,
+        prompt: str,
+        reference_image_paths: List[str],
+        **kwargs,
+    ) -> VideoOutput:
+        for path in reference_image_paths:
+            assert os.path.exists(path), f"reference frame {path} does not exist yet"
+        self.calls.append((prompt, list(reference_image_paths)))
+        await asyncio.sleep(random.uniform(0, 0.01))
+        return VideoOutput(fmt="bytes", ext="mp4", data=self.video_bytes)
+
+
+@pytest.fixture
+def fake_chat_model():
+    return FakeChatModel()
+
+
+@pytest.fixture
+def fake_image_generator():
+    return FakeImageGenerator()
+
+
+@pytest.fixture
+def fake_video_generator():
+    return FakeVideoGenerator()
+
+
+@pytest.fixture
+def characters():
+    return [
+        CharacterInScene(
+            idx=0,
+            identifier_in_scene="Alice",
+            is_visible=True,
+            static_features="Short hair.",
+            dynamic_features="Green dress.",
+        )
+    ]
@@ -0,0 +1,104 @@
+import asyncio
+import pytest
+from interfaces.image_output import ImageOutput
+from interfaces.video_output import VideoOutput
+from tools.api_key_pool import ApiKeyPool, mask_api_key
+from tools.generator_router import VideoGeneratorRouter
+
+
+class ProviderError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class FakeKeyedGenerator:
+    revoked_keys = set()
+    throttled_keys = set()
+
+    def __init__(self, api_key, rate_limiter=None):
+        self.api_key = api_key
+        self.rate_limiter = rate_limiter
+        self.t2v_model = "fake-t2v"
+        self.num_calls = 0
+
+    async def _call(self):
+        if self.rate_limiter:
+            await self.rate_limiter.acquire()
+        self.num_calls += 1
+        await asyncio.sleep(0)
+        if self.api_key in self.revoked_keys:
+            raise ProviderError(403)
+        if self.api_key in self.throttled_keys:
+            raise ProviderError(429)
+
+    async def generate_single_image(self, prompt, reference_image_paths=[], **kwargs):
+        await self._call()
+        return ImageOutput(fmt="b64", ext="png", data=self.api_key)
+
+    async def create_video_generation_task(self, prompt, reference_image_paths, **kwargs):
+        await self._call()
+        return f"{self.api_key}-task"
+
+    async def query_video_generation_task(self, task_id, submitted_at=None):
+        return VideoOutput(fmt="bytes", ext="mp4", data=task_id.encode())
+
+
+@pytest.fixture
+def fake_keys():
+    yield
+    FakeKeyedGenerator.revoked_keys.clear()
+    FakeKeyedGenerator.throttled_keys.clear()
+
+
+@pytest.mark.asyncio
+async def test_requests_are_spread_over_the_keys_with_most_headroom(fake_keys):
+    pool = ApiKeyPool.from_api_keys(FakeKeyedGenerator, ["a", "b", "c"], max_requests_per_day=4)
+    await pool.generators[0].rate_limiter.acquire()
+
+    image_outputs = await asyncio.gather(*[pool.generate_single_image(prompt="A cat.") for _ in range(9)])
+    # the key already used once gets fewer requests, leaving every key the same headroom
+    remaining = [pool.rate_limiters[idx].remaining_requests() for idx in range(3)]
+    assert len(image_outputs) == 9 and max(remaining) - min(remaining) <= 1
+    assert pool.remaining_requests() == 12 - 10
+    assert all(generator.rate_limiter is pool.rate_limiters[idx] for idx, generator in enumerate(pool.generators))
+    assert pool.t2v_model == "fake-t2v"
+
+
+@pytest.mark.asyncio
+async def test_revoked_and_throttled_keys_are_taken_out_of_rotation(fake_keys):
+    FakeKeyedGenerator.revoked_keys.add("a")
+    FakeKeyedGenerator.throttled_keys.add("b")
+    pool = ApiKeyPool.from_api_keys(FakeKeyedGenerator, ["a", "b", "c"])
+
+    for _ in range(4):
+        image_output = await pool.generate_single_image(prompt="A cat.")
+        assert image_output.data == "c"
+    health = pool.health()
+    assert health[mask_api_key("a")]["revoked"]
+    assert health[mask_api_key("b")]["cooldown_seconds"] > 0
+    assert [generator.num_calls for generator in pool.generators] == [1, 1, 4]
+
+    # the error of the last key left is raised, then no key is left at all
+    FakeKeyedGenerator.revoked_keys.update(["b", "c"])
+    with pytest.raises(ProviderError):
+        await pool.generate_single_image(prompt="A cat.")
+    with pytest.raises(RuntimeError):
+        await pool.generate_single_image(prompt="A cat.")
+
+
+@pytest.mark.asyncio
+async def test_video_tasks_are_queried_with_the_key_that_created_them(fake_keys):
+    pool = ApiKeyPool.from_api_keys(FakeKeyedGenerator, ["a", "b"])
+    assert not hasattr(ApiKeyPool([object()], ["key"], [None]), "create_video_generation_task")
+
+    task_id = await pool.create_video_generation_task("A cat.", [])
+    assert task_id == f"{mask_api_key('a')}:a-task"
+    video_output = await pool.query_video_generation_task(task_id)
+    assert video_output.data == b"a-task"
+
+    # pools are backends of routers like any generator
+    router = VideoGeneratorRouter(backends=[pool], names=["veo"])
+    video_output = await router.generate_single_video("A cat.", [])
+    assert video_output.data == b"b-task"
+    assert set(router.health()["veo"]["keys"]) == {mask_api_key("a"), mask_api_key("b")}
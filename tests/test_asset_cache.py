@@ -0,0 +1,133 @@
+import base64
+import os
+import threading
+from io import BytesIO
+import pytest
+from PIL import Image
+from utils import asset_cache
+from utils.asset_cache import ReferenceAssetCache
+
+
+def test_reference_images_are_read_and_encoded_once(tmp_path):
+    path = str(tmp_path / "portrait.png")
+    Image.new("RGB", (16, 16), "red").save(path)
+    cache = ReferenceAssetCache()
+
+    for _ in range(30):
+        data_url = cache.get_b64(path)
+        image = cache.get_image(path)
+    assert data_url.startswith("data:image/png;base64,")
+    assert base64.b64decode(cache.get_b64(path, mime=False)) == cache.get_bytes(path)
+    assert image.size == (16, 16) and image.getpixel((0, 0)) == (255, 0, 0)
+    assert cache.stats()["misses"] == 1 and cache.stats()["entries"] == 1
+
+    # an image rewritten in place is read again
+    Image.new("RGB", (16, 16), "blue").save(path)
+    os.utime(path, ns=(0, 10 ** 9))
+    assert cache.get_image(path).getpixel((0, 0)) == (0, 0, 255)
+    assert cache.stats()["misses"] == 2
+
+
+def test_least_recently_used_images_are_evicted(tmp_path):
+    paths = []
+    for name in ["a", "b", "c"]:
+        paths.append(str(tmp_path / f"{name}.bin"))
+        with open(paths[-1], "wb") as f:
+            f.write(name.encode() * 100)
+    cache = ReferenceAssetCache(max_bytes=250)
+
+    for path in paths:
+        cache.get_bytes(path)
+        cache.get_bytes(paths[0])
+    assert cache.stats()["evictions"] == 1
+    cache.get_bytes(paths[0])
+    cache.get_bytes(paths[2])
+    assert cache.stats()["misses"] == 3
+
+    # encodings count against the budget too
+    cache.get_b64(paths[2])
+    assert cache.stats()["entries"] == 1
+
+
+def test_payload_tiers_shrink_reference_images(tmp_path):
+    path = str(tmp_path / "frame.png")
+    Image.effect_noise((1920, 1080), 64).convert("RGB").save(path)
+    cache = ReferenceAssetCache()
+
+    data, mime_type = cache.get_payload_bytes(path, tier="llm")
+    assert mime_type == "image/jpeg"
+    thumbnail = Image.open(BytesIO(data))
+    assert max(thumbnail.size) == cache.payload_tiers["llm"].max_side
+    assert len(data) * 4 < os.path.getsize(path)
+    assert cache.get_payload(path, tier="llm").startswith("data:image/jpeg;base64,")
+
+    # frames already small enough for generators are only recompressed
+    data, _ = cache.get_payload_bytes(path, tier="generator")
+    assert Image.open(BytesIO(data)).size == (1920, 1080)
+    assert cache.get_payload_bytes(path, tier="original") == (cache.get_bytes(path), "image/png")
+    assert cache.stats()["misses"] == 1
+
+    # an image that re-encoding would not shrink is sent as is
+    small_path = str(tmp_path / "icon.png")
+    Image.new("RGBA", (8, 8), (255, 0, 0, 0)).save(small_path)
+    assert cache.get_payload_bytes(small_path, tier="llm") == (cache.get_bytes(small_path), "image/png")
+
+
+def test_mime_type_is_sniffed_from_the_content(tmp_path):
+    # JPEG bytes in a file named .png, as left by a provider sending JPEG
+    path = str(tmp_path / "front.png")
+    Image.new("RGB", (8, 8), "red").save(path, format="JPEG")
+    cache = ReferenceAssetCache()
+
+    assert cache.get_b64(path).startswith("data:image/jpeg;base64,")
+    assert cache.get_payload_bytes(path, "original")[1] == "image/jpeg"
+
+
+@pytest.mark.asyncio
+async def test_async_payloads_are_encoded_off_the_event_loop(tmp_path, monkeypatch):
+    path = str(tmp_path / "frame.png")
+    Image.effect_noise((1024, 576), 64).convert("RGB").save(path)
+    cache = ReferenceAssetCache()
+    threads = []
+    encode = asset_cache.encode_payload
+
+    def tracked_encode_payload(data, tier):
+        threads.append(threading.current_thread())
+        return encode(data, tier)
+
+    monkeypatch.setattr(asset_cache, "encode_payload", tracked_encode_payload)
+
+    url = await cache.aget_payload(path, tier="llm")
+    assert threads and threads[0] is not threading.main_thread()
+    # once cached, served from memory without another encoding
+    assert await cache.aget_payload(path, tier="llm") is url
+    assert await cache.aget_payload_bytes(path, tier="llm") == cache.get_payload_bytes(path, tier="llm")
+    assert len(threads) == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_size_accounting_survives_concurrent_threads(tmp_path):
+    paths = []
+    for idx in range(4):
+        paths.append(str(tmp_path / f"frame_{idx}.png"))
+        Image.new("RGB", (64, 64), (idx * 60, 0, 0)).save(paths[-1])
+    # room for about two images and their encodings
+    cache = ReferenceAssetCache(max_bytes=40 * 1024)
+    barrier = threading.Barrier(8)
+
+    def worker(offset):
+        barrier.wait()
+        for idx in range(40):
+            path = paths[(idx + offset) % len(paths)]
+            cache.get_b64(path)
+            cache.get_image(path)
+            cache.get_payload(path, tier="llm")
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert cache._num_bytes == sum(asset.size() for asset in cache._assets.values())
+    assert cache._num_bytes <= cache.max_bytes or len(cache._assets) == 1
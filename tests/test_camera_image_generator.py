@@ -0,0 +1,34 @@
+import cv2
+import numpy as np
+from agents.camera_image_generator import get_new_camera_image
+
+
+def write_video(path, colors, frames_per_color=24, width=128, height=72):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 24, (width, height))
+    for color in colors:
+        for _ in range(frames_per_color):
+            # colors are given as RGB, OpenCV writes BGR
+            writer.write(np.full((height, width, 3), color[::-1], dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+def test_new_camera_image_is_first_frame_after_cut(tmp_path):
+    video_path = write_video(tmp_path / "transition.mp4", [(200, 30, 30), (30, 30, 200)])
+
+    image = get_new_camera_image(video_path)
+
+    r, g, b = np.asarray(image.data).reshape(-1, 3).mean(axis=0)
+    assert b > 150 and r < 80
+    # no intermediate scene files are written
+    assert [p.name for p in tmp_path.iterdir()] == ["transition.mp4"]
+
+
+def test_new_camera_image_falls_back_to_last_frame(tmp_path):
+    video_path = write_video(tmp_path / "transition.mp4", [(30, 200, 30)])
+
+    image = get_new_camera_image(video_path)
+
+    r, g, b = np.asarray(image.data).reshape(-1, 3).mean(axis=0)
+    assert g > 150
+    assert image.data.size == (128, 72)
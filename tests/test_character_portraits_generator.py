@@ -0,0 +1,95 @@
+import asyncio
+import os
+import numpy as np
+import pytest
+from PIL import Image
+from agents.character_portraits_generator import find_turnaround_view_columns, split_turnaround_sheet
+from pipelines.script2video_pipeline import Script2VideoPipeline
+
+
+def make_sheet(path, figures, size=(320, 180)):
+    sheet = Image.new("RGB", size, "white")
+    for left, top, right, bottom, color in figures:
+        sheet.paste(color, (left, top, right, bottom))
+    sheet.save(path)
+
+
+def test_turnaround_sheet_is_split_between_the_figures(tmp_path):
+    sheet_path = str(tmp_path / "sheet.png")
+    # the side view is narrower and the back view has an arm held away from the body
+    make_sheet(sheet_path, [
+        (20, 20, 80, 170, (255, 0, 0)),
+        (140, 30, 170, 160, (0, 255, 0)),
+        (220, 20, 270, 170, (0, 0, 255)),
+        (275, 60, 285, 100, (0, 0, 255)),
+    ])
+
+    views = split_turnaround_sheet(sheet_path)
+
+    assert len(views) == 3
+    assert len({view.data.size for view in views}) == 1
+    for view, color in zip(views, [(255, 0, 0), (0, 255, 0), (0, 0, 255)]):
+        pixels = np.asarray(view.data)
+        colors = {tuple(pixel) for pixel in pixels.reshape(-1, 3)}
+        # each view holds its figure only, centered on the background
+        assert colors == {color, (255, 255, 255)}
+        assert tuple(pixels[pixels.shape[0] // 2, pixels.shape[1] // 2]) == color
+
+
+def test_touching_figures_fall_back_to_equal_widths():
+    occupied = np.zeros(300, dtype=bool)
+    occupied[10:290] = True
+    occupied[100:102] = False
+    assert find_turnaround_view_columns(occupied, 3) == [(0, 100), (100, 200), (200, 300)]
+    assert find_turnaround_view_columns(np.zeros(300, dtype=bool), 3) == [(0, 100), (100, 200), (200, 300)]
+
+
+@pytest.mark.asyncio
+async def test_side_and_back_portraits_are_generated_in_parallel(tmp_path, fake_chat_model, fake_image_generator, fake_video_generator, characters):
+    pipeline = Script2VideoPipeline(
+        chat_model=fake_chat_model,
+        image_generator=fake_image_generator,
+        video_generator=fake_video_generator,
+        working_dir=str(tmp_path),
+    )
+    running = []
+    max_running = 0
+    generate_single_image = fake_image_generator.generate_single_image
+
+    async def tracked_generate_single_image(prompt, reference_image_paths=[], **kwargs):
+        nonlocal max_running
+        running.append(prompt)
+        max_running = max(max_running, len(running))
+        await asyncio.sleep(0.05)
+        try:
+            return await generate_single_image(prompt, reference_image_paths, **kwargs)
+        finally:
+            running.remove(prompt)
+
+    fake_image_generator.generate_single_image = tracked_generate_single_image
+    registry = await pipeline.generate_portraits_for_single_character(characters[0], style="Anime Style")
+
+    assert max_running == 2 and len(fake_image_generator.calls) == 3
+    assert all(os.path.exists(item["path"]) for item in registry["Alice"].values())
+
+
+@pytest.mark.asyncio
+async def test_turnaround_sheet_mode_makes_a_single_request(tmp_path, fake_chat_model, fake_image_generator, fake_video_generator, characters):
+    pipeline = Script2VideoPipeline(
+        chat_model=fake_chat_model,
+        image_generator=fake_image_generator,
+        video_generator=fake_video_generator,
+        working_dir=str(tmp_path),
+        turnaround_sheet=True,
+    )
+    assert pipeline.with_working_dir(str(tmp_path / "other")).character_portraits_generator.turnaround_sheet
+
+    registry = await pipeline.generate_portraits_for_single_character(characters[0], style="Anime Style")
+    assert len(fake_image_generator.calls) == 1 and "turnaround sheet" in fake_image_generator.calls[0][0]
+    assert all(os.path.exists(item["path"]) for item in registry["Alice"].values())
+
+    # a missing view is split again from the saved sheet
+    os.remove(registry["Alice"]["back"]["path"])
+    await pipeline.generate_portraits_for_single_character(characters[0], style="Anime Style")
+    assert len(fake_image_generator.calls) == 1
+    assert os.path.exists(registry["Alice"]["back"]["path"])
@@ -0,0 +1,145 @@
+import asyncio
+import hashlib
+import os
+import pytest
+import pytest_asyncio
+from aiohttp import web
+import utils.download
+from utils.download import DownloadError, download, download_stats
+
+CONTENT = os.urandom(3 * 1024 ** 2 + 123)
+
+
+class FileServer:
+    def __init__(self):
+        self.requests = []
+        # indices of the requests to cut short
+        self.failing_requests = set()
+        self.honour_range = True
+
+    async def handle(self, request):
+        self.requests.append(request.headers.get("Range"))
+        if request.path == "/missing":
+            return web.Response(status=404)
+        start, end = 0, len(CONTENT) - 1
+        if self.honour_range and "Range" in request.headers:
+            first, _, last = request.headers["Range"][len("bytes="):].partition("-")
+            start, end = int(first), int(last) if last else end
+        response = web.StreamResponse(status=206 if start or end < len(CONTENT) - 1 else 200)
+        if self.honour_range and "Range" in request.headers:
+            response.set_status(206)
+            response.headers["Content-Range"] = f"bytes {start}-{end}/{len(CONTENT)}"
+        response.content_length = end + 1 - start
+        await response.prepare(request)
+        body = CONTENT[start:end + 1]
+        if len(self.requests) - 1 in self.failing_requests:
+            await response.write(body[:len(body) // 2])
+            # let the client read the first half before the connection drops
+            await _sleep(0.05)
+            request.transport.close()
+            return response
+        await response.write(body)
+        return response
+
+
+@pytest_asyncio.fixture
+async def file_server():
+    server = FileServer()
+    app = web.Application()
+    app.router.add_get("/{name}", server.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    server.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+    yield server
+    await runner.cleanup()
+    from tools.http_client import close_http_sessions
+    await close_http_sessions()
+
+
+@pytest.mark.asyncio
+async def test_interrupted_downloads_resume_from_where_they_stopped(tmp_path, file_server, monkeypatch):
+    monkeypatch.setattr(utils.download, "DOWNLOAD_PARALLEL_THRESHOLD", 1024 ** 3)
+    monkeypatch.setattr(asyncio, "sleep", _no_sleep)
+    file_server.failing_requests = {0, 1}
+    save_path = str(tmp_path / "video.mp4")
+
+    await download(f"{file_server.url}/video.mp4", save_path, sha256=hashlib.sha256(CONTENT).hexdigest())
+
+    with open(save_path, "rb") as f:
+        assert f.read() == CONTENT
+    assert not os.path.exists(save_path + ".part")
+    # each retry asks for the bytes still missing
+    assert file_server.requests[0] == "bytes=0-"
+    assert file_server.requests[1] != "bytes=0-" and file_server.requests[2] != file_server.requests[1]
+
+    # a server ignoring ranges sends the whole file again
+    file_server.honour_range = False
+    file_server.failing_requests = {3}
+    await download(f"{file_server.url}/video.mp4", save_path)
+    with open(save_path, "rb") as f:
+        assert f.read() == CONTENT
+
+
+@pytest.mark.asyncio
+async def test_large_files_are_fetched_as_parallel_ranges(tmp_path, file_server, monkeypatch):
+    monkeypatch.setattr(utils.download, "DOWNLOAD_PARALLEL_THRESHOLD", 1024 ** 2)
+    monkeypatch.setattr(asyncio, "sleep", _no_sleep)
+    # the request of the third part is cut short
+    file_server.failing_requests = {2}
+    num_parallel = download_stats()["parallel"]
+    save_path = str(tmp_path / "video.mp4")
+
+    await download(f"{file_server.url}/video.mp4", save_path, expected_size=len(CONTENT))
+
+    with open(save_path, "rb") as f:
+        assert f.read() == CONTENT
+    assert download_stats()["parallel"] == num_parallel + 1
+    assert len(file_server.requests) == utils.download.DOWNLOAD_NUM_PARTS + 1
+    # the part cut short is resumed, not fetched again
+    failed_start, _, failed_end = file_server.requests[2][len("bytes="):].partition("-")
+    retry_start, _, retry_end = file_server.requests[-1][len("bytes="):].partition("-")
+    assert int(retry_start) > int(failed_start) and retry_end == failed_end
+
+
+@pytest.mark.asyncio
+async def test_failed_downloads_are_bounded_and_leave_nothing_behind(tmp_path, file_server, monkeypatch):
+    monkeypatch.setattr(asyncio, "sleep", _no_sleep)
+    save_path = str(tmp_path / "video.mp4")
+
+    with pytest.raises(DownloadError):
+        await download(f"{file_server.url}/missing", save_path)
+    assert len(file_server.requests) == 1
+
+    file_server.failing_requests = set(range(1, 10))
+    with pytest.raises(DownloadError):
+        await download(f"{file_server.url}/video.mp4", save_path, max_attempts=3)
+    assert len(file_server.requests) == 4
+
+    with pytest.raises(DownloadError):
+        await download(f"{file_server.url}/video.mp4", save_path, sha256="0" * 64)
+    assert os.listdir(tmp_path) == []
+
+
+_sleep = asyncio.sleep
+
+
+async def _no_sleep(delay, *args, **kwargs):
+    await _sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_sync_download_works_from_a_running_event_loop(tmp_path, monkeypatch):
+    async def fake_download(url, save_path, session=None, **kwargs):
+        with open(save_path, "wb") as f:
+            f.write(url.encode())
+
+    monkeypatch.setattr(utils.download, "download", fake_download)
+    save_path = str(tmp_path / "image.png")
+
+    # e.g. a sync ImageOutput.save of a url image called from a coroutine
+    utils.download.download_sync("https://example.com/image.png", save_path)
+
+    with open(save_path, "rb") as f:
+        assert f.read() == b"https://example.com/image.png"
@@ -0,0 +1,216 @@
+import asyncio
+import os
+import pytest
+from io import BytesIO
+from PIL import Image
+from interfaces.image_output import ImageOutput
+from interfaces.video_output import VideoOutput
+from tools.api_key_pool import ApiKeyPool
+from tools.generation_cache import CachedGenerator, CoalescedGenerator, GenerationCache
+from tools.generator_router import ImageGeneratorRouter
+from tools.task_ledger import TaskLedger, generate_single_video_resumable
+from tools.task_poller import TaskPoller, TaskStatus
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_are_served_from_the_cache(tmp_path, fake_image_generator):
+    reference_path = str(tmp_path / "portrait.png")
+    Image.new("RGB", (8, 8), "red").save(reference_path)
+    cache = GenerationCache(str(tmp_path / "cache"), max_bytes=10 * 1024 ** 2)
+    generator = CachedGenerator(fake_image_generator, cache)
+
+    first = await generator.generate_single_image(prompt="A  cat.", reference_image_paths=[reference_path], size="1600x900")
+    await first.asave(str(tmp_path / "first.png"))
+    # same request, whitespace aside
+    second = await generator.generate_single_image(prompt="A cat. ", reference_image_paths=[reference_path], size="1600x900")
+    await second.asave(str(tmp_path / "second.png"))
+    assert len(fake_image_generator.calls) == 1
+    assert (tmp_path / "first.png").read_bytes() == (tmp_path / "second.png").read_bytes()
+
+    # other parameters, or the same path holding another image, are other requests
+    await generator.generate_single_image(prompt="A cat.", reference_image_paths=[reference_path], size="900x1600")
+    Image.new("RGB", (8, 8), "blue").save(reference_path)
+    await generator.generate_single_image(prompt="A cat.", reference_image_paths=[reference_path], size="1600x900")
+    assert len(fake_image_generator.calls) == 3
+
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 3
+
+    # the index survives the process
+    cache = GenerationCache(str(tmp_path / "cache"), max_bytes=10 * 1024 ** 2)
+    await CachedGenerator(fake_image_generator, cache).generate_single_image(prompt="A cat.", reference_image_paths=[reference_path], size="1600x900")
+    assert len(fake_image_generator.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = GenerationCache(str(tmp_path / "cache"), max_bytes=250)
+    for key in ["a", "b", "c"]:
+        await cache.put(key, VideoOutput(fmt="bytes", ext="mp4", data=b"x" * 100))
+        cache.get("a")
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+    assert sorted(os.listdir(tmp_path / "cache")) == ["a.mp4", "c.mp4", "index.json"]
+
+
+class FakeJpegImageGenerator:
+    def __init__(self):
+        self.model = "fake-jpeg"
+        self.num_calls = 0
+
+    async def generate_single_image(self, prompt, reference_image_paths=[], **kwargs):
+        self.num_calls += 1
+        buffered = BytesIO()
+        Image.new("RGB", (16, 9), "red").save(buffered, format="JPEG")
+        return ImageOutput.from_bytes(buffered.getvalue(), "image/jpeg")
+
+
+@pytest.mark.asyncio
+async def test_cached_jpeg_is_transcoded_to_the_format_of_the_path(tmp_path):
+    image_generator = FakeJpegImageGenerator()
+    generator = CachedGenerator(image_generator, GenerationCache(str(tmp_path / "cache"), max_bytes=10 * 1024 ** 2))
+
+    for idx in range(2):
+        image_output = await generator.generate_single_image(prompt="A cat.")
+        assert image_output.ext == "jpg"
+        await image_output.asave(str(tmp_path / f"front_{idx}.png"))
+        with Image.open(tmp_path / f"front_{idx}.png") as image:
+            assert image.format == "PNG" and image.size == (16, 9)
+    assert image_generator.num_calls == 1
+
+
+class FakeModelImageGenerator:
+    def __init__(self, model):
+        self.model = model
+
+
+def test_routers_and_key_pools_are_keyed_by_the_models_of_their_backends(tmp_path):
+    cache = GenerationCache(str(tmp_path / "cache"), max_bytes=10 * 1024 ** 2)
+
+    def key(generator):
+        return cache.key(generator, "A cat.", [], size="1600x900")
+
+    router_a = ImageGeneratorRouter(backends=[FakeModelImageGenerator("model-a")])
+    router_b = ImageGeneratorRouter(backends=[FakeModelImageGenerator("model-b")])
+    pool_a = ApiKeyPool([FakeModelImageGenerator("model-a")] * 2, ["key-1", "key-2"], [None, None])
+    pool_b = ApiKeyPool([FakeModelImageGenerator("model-b")] * 2, ["key-1", "key-2"], [None, None])
+
+    assert key(router_a) != key(router_b)
+    assert key(pool_a) != key(pool_b)
+    # a pool makes the same images as a single key
+    assert key(pool_a) == key(FakeModelImageGenerator("model-a"))
+    assert key(ImageGeneratorRouter(backends=[pool_a])) == key(router_a)
+
+
+class FakeTaskVideoGenerator:
+    def __init__(self):
+        self.t2v_model = "fake-t2v"
+        self.num_created = 0
+
+    async def create_video_generation_task(self, prompt, reference_image_paths, **kwargs):
+        self.num_created += 1
+        return f"task-{self.num_created}"
+
+    async def query_video_generation_task(self, task_id, submitted_at=None):
+        return VideoOutput(fmt="bytes", ext="mp4", data=task_id.encode())
+
+
+@pytest.mark.asyncio
+async def test_cached_video_generator_keeps_provider_tasks_resumable(tmp_path):
+    video_generator = FakeTaskVideoGenerator()
+    generator = CachedGenerator(video_generator, GenerationCache(str(tmp_path / "cache"), max_bytes=10 * 1024 ** 2))
+    assert not hasattr(CachedGenerator(object(), generator.cache), "create_video_generation_task")
+
+    for shot_idx in range(2):
+        ledger = TaskLedger(str(tmp_path / f"video_task_{shot_idx}.json"))
+        video_output = await generate_single_video_resumable(generator, ledger, prompt="A cat.", reference_image_paths=[])
+        await video_output.asave(str(tmp_path / f"video_{shot_idx}.mp4"))
+
+    assert video_generator.num_created == 1
+    assert (tmp_path / "video_1.mp4").read_bytes() == b"task-1"
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_in_flight_are_coalesced(tmp_path, fake_image_generator):
+    cache = GenerationCache(str(tmp_path / "cache"), max_bytes=10 * 1024 ** 2)
+    image_generators = [CachedGenerator(fake_image_generator, cache) for _ in range(3)]
+    video_generator = FakeTaskVideoGenerator()
+    cached_video_generators = [CachedGenerator(video_generator, cache) for _ in range(3)]
+
+    await asyncio.gather(*[
+        generator.generate_single_image(prompt="A cat.", reference_image_paths=[])
+        for generator in image_generators
+    ])
+    await asyncio.gather(*[
+        generate_single_video_resumable(generator, TaskLedger(str(tmp_path / f"video_task_{i}.json")), prompt="A cat.", reference_image_paths=[])
+        for i, generator in enumerate(cached_video_generators)
+    ])
+
+    assert len(fake_image_generator.calls) == 1
+    assert video_generator.num_created == 1
+    # a caller computing its key after the first one finished hits the cache instead
+    assert cache.stats()["coalesced"] + cache.stats()["hits"] >= 4
+    assert cache.pending_task_ids == {} and cache.pending_task_keys == {}
+
+
+class FakePolledVideoGenerator(FakeTaskVideoGenerator):
+    """Tasks waited for through a TaskPoller, as the provider tools do."""
+
+    def __init__(self):
+        super().__init__()
+        self.task_poller = TaskPoller(query_func=self._query, min_interval=0.01, max_interval=0.01)
+        self.num_queries = 0
+
+    async def _query(self, task_id):
+        self.num_queries += 1
+        if self.num_queries < 5:
+            return TaskStatus(state="pending")
+        return TaskStatus(state="succeeded", result=VideoOutput(fmt="bytes", ext="mp4", data=task_id.encode()))
+
+    async def query_video_generation_task(self, task_id, submitted_at=None):
+        return await self.task_poller.wait(task_id, submitted_at=submitted_at)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_duplicate_request_does_not_cancel_the_shared_task(tmp_path):
+    video_generator = FakePolledVideoGenerator()
+    cache = GenerationCache(str(tmp_path / "cache"), max_bytes=10 * 1024 ** 2)
+    generators = [CachedGenerator(video_generator, cache) for _ in range(2)]
+
+    task_ids = await asyncio.gather(*[generator.create_video_generation_task("A cat.", []) for generator in generators])
+    assert task_ids[0] == task_ids[1] and video_generator.num_created == 1
+
+    cancelled = asyncio.create_task(generators[0].query_video_generation_task(task_ids[0]))
+    kept = asyncio.create_task(generators[1].query_video_generation_task(task_ids[1]))
+    await asyncio.sleep(0.02)
+    # e.g. a shot of another job cancelled by its task graph
+    cancelled.cancel()
+    video_output = await asyncio.wait_for(kept, timeout=1)
+    assert open(video_output.data, "rb").read() == b"task-1"
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_in_flight_are_sent_once_without_a_cache(fake_image_generator):
+    generator = CoalescedGenerator(fake_image_generator)
+
+    outputs = await asyncio.gather(
+        generator.generate_single_image(prompt="A cat."),
+        generator.generate_single_image(prompt=" A  cat."),
+        generator.generate_single_image(prompt="A dog."),
+    )
+    assert len(fake_image_generator.calls) == 2 and outputs[0] is outputs[1]
+
+    # nothing is kept once the request is done
+    await generator.generate_single_image(prompt="A cat.")
+    assert len(fake_image_generator.calls) == 3
+
+    video_generator = FakeTaskVideoGenerator()
+    generator = CoalescedGenerator(video_generator)
+    task_ids = await asyncio.gather(*[generator.create_video_generation_task("A cat.", []) for _ in range(2)])
+    assert task_ids == ["task-1", "task-1"]
+    await asyncio.gather(*[generator.query_video_generation_task(task_id) for task_id in task_ids])
+    assert await generator.create_video_generation_task("A cat.", []) == "task-2"
+    assert not hasattr(CoalescedGenerator(object()), "create_video_generation_task")
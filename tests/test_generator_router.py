@@ -0,0 +1,272 @@
+import asyncio
+import pytest
+from interfaces.image_output import ImageOutput
+from interfaces.video_output import VideoOutput
+from tools.generator_router import ImageGeneratorRouter, VideoGeneratorRouter
+from utils.rate_limiter import RateLimiter
+
+
+class ProviderError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class FakeImageBackend:
+    def __init__(self, latency=0.0, error_code=None, rate_limiter=None):
+        self.latency = latency
+        self.error_code = error_code
+        self.rate_limiter = rate_limiter
+        self.num_calls = 0
+
+    async def generate_single_image(self, prompt, reference_image_paths=[], **kwargs):
+        self.num_calls += 1
+        if self.rate_limiter:
+            await self.rate_limiter.acquire()
+        await asyncio.sleep(self.latency)
+        if self.error_code is not None:
+            raise ProviderError(self.error_code)
+        return ImageOutput(fmt="b64", ext="png", data="")
+
+
+@pytest.mark.asyncio
+async def test_throttled_backend_fails_over_and_cools_down():
+    throttled, healthy = FakeImageBackend(error_code=429), FakeImageBackend()
+    router = ImageGeneratorRouter(backends=[throttled, healthy], names=["throttled", "healthy"])
+
+    for _ in range(3):
+        await router.generate_single_image(prompt="A cat.")
+
+    # tried once, then avoided while cooling down
+    assert throttled.num_calls == 1
+    assert healthy.num_calls == 3
+    health = router.health()
+    assert health["throttled"]["throttled"] == 1 and health["throttled"]["cooldown_seconds"] > 0
+    assert health["healthy"]["successes"] == 3
+
+
+@pytest.mark.asyncio
+async def test_request_errors_are_not_failed_over():
+    rejecting, healthy = FakeImageBackend(error_code=400), FakeImageBackend()
+    router = ImageGeneratorRouter(backends=[rejecting, healthy])
+
+    with pytest.raises(ProviderError):
+        await router.generate_single_image(prompt="A cat.")
+    assert healthy.num_calls == 0
+
+    failing = FakeImageBackend(error_code=503)
+    router = ImageGeneratorRouter(backends=[failing, FakeImageBackend(error_code=502)])
+    with pytest.raises(ProviderError):
+        await router.generate_single_image(prompt="A cat.")
+
+
+@pytest.mark.asyncio
+async def test_load_is_spread_by_latency_and_quota():
+    slow, fast = FakeImageBackend(latency=0.05), FakeImageBackend(latency=0.0)
+    router = ImageGeneratorRouter(backends=[slow, fast])
+    for _ in range(10):
+        await router.generate_single_image(prompt="A cat.")
+    assert fast.num_calls > slow.num_calls
+
+    # a backend without quota left is only used when the others are busy
+    exhausted = FakeImageBackend(rate_limiter=RateLimiter(max_requests_per_day=1))
+    await exhausted.rate_limiter.acquire()
+    other = FakeImageBackend(latency=0.01)
+    router = ImageGeneratorRouter(backends=[exhausted, other])
+    await asyncio.gather(*[router.generate_single_image(prompt="A cat.") for _ in range(3)])
+    assert exhausted.num_calls == 0
+    assert router.health()["FakeImageBackend_0"]["remaining_requests"] == 0
+
+
+class FakeVideoBackend:
+    def __init__(self, flf2v_model="fake-flf2v", fail_tasks=False, rate_limiter=None):
+        self.t2v_model = "fake-t2v"
+        self.ff2v_model = "fake-ff2v"
+        self.flf2v_model = flf2v_model
+        self.fail_tasks = fail_tasks
+        self.rate_limiter = rate_limiter
+        self.created = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def create_video_generation_task(self, prompt, reference_image_paths, **kwargs):
+        if self.rate_limiter:
+            await self.rate_limiter.acquire()
+        self.created.append(prompt)
+        return f"task-{len(self.created)}"
+
+    async def query_video_generation_task(self, task_id, submitted_at=None):
+        await self.release.wait()
+        if self.fail_tasks:
+            raise RuntimeError(f"Video generation task {task_id} failed")
+        return VideoOutput(fmt="bytes", ext="mp4", data=task_id.encode())
+
+
+@pytest.mark.asyncio
+async def test_shots_are_dispatched_by_capability_and_queue_depth():
+    veo, seedance = FakeVideoBackend(flf2v_model=None), FakeVideoBackend()
+    for backend in [veo, seedance]:
+        backend.release.clear()
+    router = VideoGeneratorRouter(backends=[veo, seedance], names=["veo", "seedance"])
+
+    # only seedance generates from first and last frames
+    tasks = [asyncio.create_task(router.generate_single_video("A cat.", ["first.png", "last.png"])) for _ in range(2)]
+    # text to video shots go to the backend with the fewest tasks in flight
+    tasks += [asyncio.create_task(router.generate_single_video("A dog.", [])) for _ in range(4)]
+    await asyncio.sleep(0.01)
+    assert seedance.created == ["A cat."] * 2 + ["A dog."]
+    assert veo.created == ["A dog."] * 3
+    for backend in [veo, seedance]:
+        backend.release.set()
+    await asyncio.gather(*tasks)
+
+    with pytest.raises(ValueError):
+        await VideoGeneratorRouter(backends=[veo]).generate_single_video("A cat.", ["first.png", "last.png"])
+
+
+@pytest.mark.asyncio
+async def test_failed_tasks_are_rerouted():
+    failing, healthy = FakeVideoBackend(fail_tasks=True), FakeVideoBackend()
+    router = VideoGeneratorRouter(backends=[failing, healthy], names=["failing", "healthy"])
+
+    task_id = await router.create_video_generation_task("A cat.", [])
+    assert task_id == "failing:task-1"
+    video_output = await router.query_video_generation_task(task_id)
+    assert video_output.data == b"task-1"
+    assert healthy.created == ["A cat."]
+    assert router.health()["failing"]["failures"] == 1
+
+    # tasks of another process cannot be submitted again
+    with pytest.raises(RuntimeError):
+        await router.query_video_generation_task("failing:task-7")
+    with pytest.raises(RuntimeError):
+        await router.query_video_generation_task("unknown:task-1")
+
+
+@pytest.mark.asyncio
+async def test_shots_go_to_the_backend_with_most_daily_quota_left():
+    spent, fresh = FakeVideoBackend(rate_limiter=RateLimiter(max_requests_per_day=10)), FakeVideoBackend(rate_limiter=RateLimiter(max_requests_per_day=10))
+    for _ in range(5):
+        await spent.rate_limiter.acquire()
+    router = VideoGeneratorRouter(backends=[spent, fresh])
+
+    for _ in range(5):
+        await router.generate_single_video("A cat.", [])
+    assert len(fresh.created) == 5 and spent.created == []
+    await router.generate_single_video("A cat.", [])
+    assert router.health()["FakeVideoBackend_0"]["remaining_requests"] == 4
+
+
+@pytest.mark.asyncio
+async def test_slow_image_requests_are_hedged_on_another_backend():
+    stalled, fast = FakeImageBackend(latency=0.01), FakeImageBackend(latency=0.01)
+    router = ImageGeneratorRouter(backends=[stalled, fast], hedge_percentile=0.9, max_hedge_ratio=0.1, min_hedge_samples=10)
+    for _ in range(10):
+        await router.generate_single_image(prompt="A cat.")
+    assert router.hedge_stats()["hedges"] == 0
+
+    # the backend picked first stalls: the hedge on the other one wins, the stalled call is cancelled
+    stalled.latency = 10.0
+    router.healths[1].cooldown_until = float("inf")
+    num_calls = [stalled.num_calls, fast.num_calls]
+    await asyncio.wait_for(router.generate_single_image(prompt="A cat."), timeout=1.0)
+    assert [stalled.num_calls, fast.num_calls] == [num_calls[0] + 1, num_calls[1] + 1]
+    assert router.hedge_stats()["hedges"] == 1 and router.hedge_stats()["hedge_wins"] == 1
+    assert all(health.in_flight == 0 for health in router.healths)
+
+    # hedges are capped to a share of the requests
+    fast.latency = 10.0
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(router.generate_single_image(prompt="A cat."), timeout=0.1)
+    assert router.hedge_stats()["hedges"] == 1
+
+
+@pytest.mark.asyncio
+async def test_hedge_loser_is_cancelled_before_the_request_returns():
+    class CancellableImageBackend(FakeImageBackend):
+        num_cancelled = 0
+
+        async def generate_single_image(self, prompt, reference_image_paths=[], **kwargs):
+            try:
+                return await super().generate_single_image(prompt, reference_image_paths, **kwargs)
+            except asyncio.CancelledError:
+                self.num_cancelled += 1
+                raise
+
+    stalled, fast = CancellableImageBackend(latency=0.01), CancellableImageBackend(latency=0.01)
+    router = ImageGeneratorRouter(backends=[stalled, fast], hedge_percentile=0.9, max_hedge_ratio=0.5, min_hedge_samples=10)
+    for _ in range(10):
+        await router.generate_single_image(prompt="A cat.")
+
+    stalled.latency = 10.0
+    router.healths[1].cooldown_until = float("inf")
+    await router.generate_single_image(prompt="A cat.")
+
+    # no loop iteration ran since the request returned
+    assert stalled.num_cancelled == 1
+    assert all(health.in_flight == 0 for health in router.healths)
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        import aiohttp
+        if self.status >= 400:
+            raise aiohttp.ClientResponseError(None, (), status=self.status)
+
+    async def json(self):
+        return {"id": "task-1"}
+
+
+class FakeSession:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.num_posts = 0
+
+    def post(self, url, **kwargs):
+        self.num_posts += 1
+        return FakeResponse(self.statuses.pop(0))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("module_name, class_name", [
+    ("tools.video_generator_veo_yunwu_api", "VideoGeneratorVeoYunwuAPI"),
+    ("tools.video_generator_doubao_seedance_yunwu_api", "VideoGeneratorDoubaoSeedanceYunwuAPI"),
+])
+async def test_yunwu_task_submission_retries_are_bounded(monkeypatch, module_name, class_name):
+    import importlib
+    module = importlib.import_module(module_name)
+    generator = getattr(module, class_name)(api_key="key")
+
+    async def no_sleep(delay):
+        pass
+
+    monkeypatch.setattr(module.asyncio, "sleep", no_sleep)
+
+    # throttled, then accepted
+    session = FakeSession([429, 200])
+    monkeypatch.setattr(module, "get_http_session", lambda: session)
+    assert await generator.create_video_generation_task("A cat.", []) == "task-1"
+
+    # throttled every time: the error reaches the router, which fails over
+    session = FakeSession([429] * 10)
+    monkeypatch.setattr(module, "get_http_session", lambda: session)
+    router = VideoGeneratorRouter(backends=[generator])
+    with pytest.raises(Exception):
+        await router.create_video_generation_task("A cat.", [])
+    assert session.num_posts == 3 and router.healths[0].num_throttled == 1
+
+    # a rejected request is not retried
+    session = FakeSession([400] * 10)
+    monkeypatch.setattr(module, "get_http_session", lambda: session)
+    with pytest.raises(Exception):
+        await generator.create_video_generation_task("A cat.", [])
+    assert session.num_posts == 1
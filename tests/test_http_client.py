@@ -0,0 +1,34 @@
+import pytest
+from aiohttp import web
+from tools.http_client import get_http_session, close_http_sessions, HTTP_MAX_CONNECTIONS_PER_HOST
+
+
+@pytest.mark.asyncio
+async def test_requests_share_one_keep_alive_connection():
+    peers = set()
+
+    async def handler(request):
+        peers.add(request.transport.get_extra_info("peername"))
+        return web.json_response({"status": "ok"})
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    try:
+        session = get_http_session()
+        assert session.connector.limit_per_host == HTTP_MAX_CONNECTIONS_PER_HOST
+        for _ in range(3):
+            async with get_http_session().get(f"http://127.0.0.1:{port}/") as response:
+                assert (await response.json())["status"] == "ok"
+        assert get_http_session() is session
+        assert len(peers) == 1
+    finally:
+        await close_http_sessions()
+        await runner.cleanup()
+
+    assert session.closed
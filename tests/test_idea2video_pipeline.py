@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+import pytest
+from pipelines.idea2video_pipeline import Idea2VideoPipeline
+from tools.generation_cache import CoalescedGenerator
+from tests.conftest import make_video_bytes
+
+
+@pytest.mark.asyncio
+async def test_scenes_run_in_parallel_up_to_the_cap(tmp_path, fake_chat_model, fake_image_generator, fake_video_generator, characters):
+    num_scenes = 5
+    with open(tmp_path / "story.txt", "w", encoding="utf-8") as f:
+        f.write("A story.")
+    with open(tmp_path / "script.json", "w", encoding="utf-8") as f:
+        json.dump([f"Scene {idx}" for idx in range(num_scenes)], f)
+    with open(tmp_path / "characters.json", "w", encoding="utf-8") as f:
+        json.dump([character.model_dump() for character in characters], f)
+    with open(tmp_path / "character_portraits_registry.json", "w", encoding="utf-8") as f:
+        json.dump({"Alice": {}}, f)
+
+    pipeline = Idea2VideoPipeline(
+        chat_model=fake_chat_model,
+        image_generator=fake_image_generator,
+        video_generator=fake_video_generator,
+        working_dir=str(tmp_path),
+        max_concurrent_scenes=2,
+    )
+
+    running = 0
+    max_running = 0
+    video_bytes = make_video_bytes()
+
+    async def generate_video_for_single_scene(idx, scene_script, **kwargs):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        # later scenes finish first, the final video must still follow scene order
+        await asyncio.sleep(0.01 * (num_scenes - idx))
+        running -= 1
+        video_path = str(tmp_path / f"scene_{idx}.mp4")
+        with open(video_path, "wb") as f:
+            f.write(video_bytes)
+        return video_path
+
+    pipeline.generate_video_for_single_scene = generate_video_for_single_scene
+    final_video_path = await pipeline(idea="An idea.", user_requirement="", style="Anime Style")
+
+    assert max_running == 2
+    assert os.path.getsize(final_video_path) > 0
+
+
+def test_every_routed_backend_is_rate_limited(monkeypatch):
+    for key, value in {
+        "OPENROUTER_API_KEY": "key",
+        "GOOGLE_API_KEY": "key",
+        "YUNWU_API_KEY": "key",
+        "IMAGE_GENERATOR_BACKENDS": "nanobanana_google,nanobanana_yunwu,seedream_yunwu",
+        "VIDEO_GENERATOR_BACKENDS": "veo_google,veo_yunwu,seedance_yunwu",
+        "SEEDANCE_YUNWU_RPD": "3",
+    }.items():
+        monkeypatch.setenv(key, value)
+    monkeypatch.delenv("GENERATION_CACHE_DIR", raising=False)
+
+    pipeline = Idea2VideoPipeline.init_from_env()
+
+    # identical requests in flight are coalesced even without a generation cache
+    assert isinstance(pipeline.image_generator, CoalescedGenerator) and isinstance(pipeline.video_generator, CoalescedGenerator)
+    for router in [pipeline.image_generator, pipeline.video_generator]:
+        assert all(router._remaining_requests(idx) is not None for idx in range(len(router.backends)))
+    assert pipeline.video_generator._remaining_requests(2, "day") == 3
+
+
+def test_env_config_is_built_like_the_script2video_config(monkeypatch, tmp_path):
+    from tools.api_key_pool import ApiKeyPool
+    from tools.generation_cache import CachedGenerator
+
+    for key, value in {
+        "OPENROUTER_API_KEY": "key",
+        "GOOGLE_API_KEY": "key1, key2",
+        "IMAGE_GENERATOR_BACKENDS": "nanobanana_google",
+        "VIDEO_GENERATOR_BACKENDS": "veo_google",
+        "VIDEO_GENERATOR_MAX_CONCURRENT_TASKS": "5",
+        "GENERATION_CACHE_DIR": str(tmp_path / "cache"),
+    }.items():
+        monkeypatch.setenv(key, value)
+
+    pipeline = Idea2VideoPipeline.init_from_env()
+
+    assert isinstance(pipeline.image_generator, CachedGenerator) and isinstance(pipeline.video_generator, CachedGenerator)
+    assert isinstance(pipeline.image_generator.generator, ApiKeyPool)
+    assert pipeline.image_generator.generator.remaining_requests("minute") == 2 * 10
+    assert pipeline.resources["video"].value == 5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("turnaround_sheet", [False, True])
+async def test_portraits_hold_the_shared_image_slots(tmp_path, fake_chat_model, fake_image_generator, fake_video_generator, characters, turnaround_sheet):
+    pipeline = Idea2VideoPipeline(
+        chat_model=fake_chat_model,
+        image_generator=fake_image_generator,
+        video_generator=fake_video_generator,
+        working_dir=str(tmp_path),
+        turnaround_sheet=turnaround_sheet,
+    )
+    slots_in_use = []
+    generate_single_image = fake_image_generator.generate_single_image
+
+    async def tracked_generate_single_image(prompt, reference_image_paths=[], **kwargs):
+        slots_in_use.append(pipeline.resources["image"].in_use)
+        return await generate_single_image(prompt, reference_image_paths, **kwargs)
+
+    fake_image_generator.generate_single_image = tracked_generate_single_image
+    registry = await pipeline.generate_portraits_for_single_character(characters[0], style="Anime Style")
+
+    assert len(slots_in_use) == (1 if turnaround_sheet else 3) and all(in_use >= 1 for in_use in slots_in_use)
+    assert all(os.path.exists(item["path"]) for item in registry["Alice"].values())
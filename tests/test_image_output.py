@@ -0,0 +1,59 @@
+import base64
+from io import BytesIO
+import pytest
+from PIL import Image
+from interfaces.image_output import ImageOutput
+
+
+def encode(image, format):
+    buffered = BytesIO()
+    image.save(buffered, format=format)
+    return buffered.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_provider_bytes_are_saved_untouched_and_decoded_lazily(tmp_path):
+    data = encode(Image.new("RGB", (16, 9), "red"), "JPEG")
+    image_output = ImageOutput.from_bytes(data, "image/jpeg")
+    assert image_output.ext == "jpg"
+    assert image_output._image is None
+
+    await image_output.asave(str(tmp_path / "frame.jpg"))
+    assert (tmp_path / "frame.jpg").read_bytes() == data
+    assert image_output.to_b64() == "data:image/jpeg;base64," + base64.b64encode(data).decode()
+    # nothing was decoded to save or encode it
+    assert image_output._image is None
+
+    image = image_output.to_pil()
+    assert image.size == (16, 9) and image_output.to_pil() is image
+
+
+def test_every_format_decodes_to_the_same_pixels(tmp_path):
+    image = Image.new("RGB", (4, 4), (0, 128, 255))
+    image.save(tmp_path / "image.png")
+    png = encode(image, "PNG")
+    image_outputs = [
+        ImageOutput(fmt="pil", ext="png", data=image),
+        ImageOutput.from_bytes(png, "image/png"),
+        ImageOutput(fmt="b64", ext="png", data=base64.b64encode(png).decode()),
+        ImageOutput(fmt="file", ext="png", data=str(tmp_path / "image.png")),
+    ]
+    for image_output in image_outputs:
+        assert image_output.to_pil().getpixel((0, 0)) == (0, 128, 255)
+    assert image_outputs[0].to_b64(mime=False) == image_outputs[1].to_b64(mime=False)
+
+    with pytest.raises(ValueError):
+        ImageOutput(fmt="url", ext="png", data="https://example.com/image.png").to_pil()
+
+
+@pytest.mark.asyncio
+async def test_bytes_are_transcoded_to_the_format_of_the_path(tmp_path):
+    data = encode(Image.new("RGB", (16, 9), "red"), "JPEG")
+    image_output = ImageOutput.from_bytes(data, "image/jpeg")
+
+    await image_output.asave(str(tmp_path / "first_frame.png"))
+    with Image.open(tmp_path / "first_frame.png") as image:
+        assert image.format == "PNG" and image.size == (16, 9)
+    # a .jpeg path takes the JPEG bytes as they are
+    image_output.save(str(tmp_path / "first_frame.jpeg"))
+    assert (tmp_path / "first_frame.jpeg").read_bytes() == data
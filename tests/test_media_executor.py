@@ -0,0 +1,93 @@
+import asyncio
+import time
+import pytest
+from PIL import Image
+from interfaces import ImageOutput
+from utils.media_executor import MediaExecutor
+from utils.loop_lag import EventLoopLagMonitor
+
+
+def square(x):
+    return x * x
+
+
+def sleep_and_return(x):
+    time.sleep(0.05)
+    return x
+
+
+def fail():
+    raise ValueError("broken media")
+
+
+@pytest.fixture
+def executor():
+    executor = MediaExecutor(max_workers=2, max_queue_depth=0)
+    yield executor
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_run_records_metrics(executor):
+    assert await executor.run("square", square, 3) == 9
+    with pytest.raises(ValueError):
+        await executor.run("fail", fail)
+
+    stats = executor.stats()
+    assert stats["operations"]["square"]["count"] == 1
+    assert stats["operations"]["fail"]["errors"] == 1
+    assert stats["submitted"] == 0
+
+
+@pytest.mark.asyncio
+async def test_queue_depth_is_bounded(executor):
+    max_submitted = 0
+
+    async def watch():
+        nonlocal max_submitted
+        while True:
+            max_submitted = max(max_submitted, executor.stats()["submitted"])
+            await asyncio.sleep(0.005)
+
+    watcher = asyncio.create_task(watch())
+    results = await asyncio.gather(*[executor.run("sleep", sleep_and_return, i) for i in range(6)])
+    watcher.cancel()
+
+    assert results == list(range(6))
+    assert max_submitted == 2
+
+
+@pytest.mark.asyncio
+async def test_image_output_asave(tmp_path):
+    image = ImageOutput(fmt="pil", ext="png", data=Image.new("RGB", (16, 9), (255, 0, 0)))
+    await image.asave(str(tmp_path / "image.png"))
+    assert Image.open(tmp_path / "image.png").size == (16, 9)
+
+
+@pytest.mark.asyncio
+async def test_event_loop_lag_monitor_sees_blocking_work():
+    monitor = EventLoopLagMonitor(interval=0.01)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    time.sleep(0.2)
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+
+    assert monitor.stats()["max_ms"] >= 150
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_keeps_its_slot_until_the_job_ends(executor):
+    # warm the workers up, spawning them takes longer than a job
+    await asyncio.gather(*[executor.run("square", square, idx) for idx in range(2)])
+
+    callers = [asyncio.create_task(executor.run("sleep", sleep_and_return, idx)) for idx in range(2)]
+    await asyncio.sleep(0.01)
+    for caller in callers:
+        caller.cancel()
+    await asyncio.gather(*callers, return_exceptions=True)
+
+    # both jobs still run in the workers and hold the two slots
+    assert executor.stats()["submitted"] == 2
+    assert await executor.run("square", square, 3) == 9
+    assert executor.stats()["submitted"] == 0
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import pytest
+from pipelines.pipeline_pool import PipelinePool
+from pipelines.script2video_pipeline import Script2VideoPipeline
+
+
+def make_pool(tmp_path, fake_chat_model, fake_image_generator, fake_video_generator, **kwargs):
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return Script2VideoPipeline(
+            chat_model=fake_chat_model,
+            image_generator=fake_image_generator,
+            video_generator=fake_video_generator,
+            working_dir=str(tmp_path / "shared"),
+        )
+
+    pool = PipelinePool({"script2video": factory}, jobs_dir=str(tmp_path / "videos"), **kwargs)
+    return pool, calls
+
+
+def test_jobs_share_clients_but_not_working_dirs(tmp_path, fake_chat_model, fake_image_generator, fake_video_generator):
+    pool, calls = make_pool(tmp_path, fake_chat_model, fake_image_generator, fake_video_generator)
+
+    pipeline_a = pool.create("script2video", "job_a")
+    pipeline_b = pool.create("script2video", "job_b")
+
+    assert len(calls) == 1
+    assert pipeline_a is not pipeline_b
+    assert pipeline_a.working_dir == os.path.join(str(tmp_path / "videos"), "job_a")
+    assert pipeline_b.working_dir == os.path.join(str(tmp_path / "videos"), "job_b")
+    assert pipeline_a.chat_model is pipeline_b.chat_model
+    assert pipeline_a.image_generator is pipeline_b.image_generator
+    assert pipeline_a.video_generator is pipeline_b.video_generator
+    assert pipeline_a.resources is pipeline_b.resources
+
+    with pytest.raises(ValueError):
+        pool.create("unknown", "job_c")
+
+
+@pytest.mark.asyncio
+async def test_acquire_limits_concurrent_jobs(tmp_path, fake_chat_model, fake_image_generator, fake_video_generator):
+    pool, _ = make_pool(tmp_path, fake_chat_model, fake_image_generator, fake_video_generator, max_concurrent_jobs=2)
+    max_active = 0
+
+    async def job(job_id):
+        nonlocal max_active
+        async with pool.acquire("script2video", job_id):
+            max_active = max(max_active, pool.stats()["active_jobs"])
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*[job(f"job_{i}") for i in range(5)])
+
+    assert max_active == 2
+    assert pool.stats()["active_jobs"] == 0
+
+
+@pytest.mark.asyncio
+async def test_queued_job_id_cannot_be_taken_twice(tmp_path, fake_chat_model, fake_image_generator, fake_video_generator):
+    pool, _ = make_pool(tmp_path, fake_chat_model, fake_image_generator, fake_video_generator, max_concurrent_jobs=1)
+    release = asyncio.Event()
+
+    async def job(job_id):
+        async with pool.acquire("script2video", job_id):
+            await release.wait()
+
+    running = asyncio.create_task(job("job_a"))
+    queued = asyncio.create_task(job("job_b"))
+    await asyncio.sleep(0.01)
+    assert pool.stats()["queued_jobs"] == 1
+
+    # the same id, queued behind the running job too
+    with pytest.raises(ValueError):
+        await job("job_b")
+
+    release.set()
+    await asyncio.gather(running, queued)
+    assert pool.stats()["queued_jobs"] == 0 and pool.stats()["active_jobs"] == 0
@@ -0,0 +1,158 @@
+import asyncio
+import time
+import pytest
+from langchain_core.messages import HumanMessage
+from tests.conftest import FakeChatModel
+import utils.rate_limiter
+from utils.rate_limiter import RateLimiter, ChatModelRateLimiter
+
+
+@pytest.fixture
+def short_minute(monkeypatch):
+    # limits per minute apply to 50ms windows, so that waiting requests are served quickly
+    monkeypatch.setattr(utils.rate_limiter, "MINUTE_SECONDS", 0.05)
+    return 0.05
+
+
+class CountingRateLimiter(RateLimiter):
+    def __init__(self):
+        super().__init__(max_requests_per_minute=1000)
+        self.num_acquired = 0
+
+    async def acquire(self):
+        self.num_acquired += 1
+        await super().acquire()
+
+
+@pytest.mark.asyncio
+async def test_chat_model_draws_from_rate_limiter():
+    rate_limiter = CountingRateLimiter()
+    chat_model = FakeChatModel(rate_limiter=ChatModelRateLimiter(rate_limiter))
+
+    for _ in range(3):
+        await chat_model.ainvoke([HumanMessage(content="extract all relevant character information")])
+
+    assert rate_limiter.num_acquired == 3
+
+
+@pytest.mark.asyncio
+async def test_remaining_requests():
+    rate_limiter = RateLimiter(max_requests_per_minute=100, max_requests_per_day=3)
+    assert rate_limiter.remaining_requests() == 3
+    await rate_limiter.acquire()
+    await rate_limiter.acquire()
+    assert rate_limiter.remaining_requests() == 1
+    assert rate_limiter.remaining_requests(period="minute") == 98
+    assert RateLimiter().remaining_requests() is None
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_served_in_order_and_can_time_out(short_minute):
+    rate_limiter = RateLimiter(max_requests_per_day=1)
+    assert await rate_limiter.acquire()
+    assert not rate_limiter.try_acquire()
+    assert 86399 < rate_limiter.estimated_wait() <= 86400
+
+    assert not await rate_limiter.acquire(timeout=0.01)
+    assert rate_limiter.num_waiting() == 0 and rate_limiter.remaining_requests() == 0
+
+    # the first waiter being cancelled hands its turn to the next one
+    rate_limiter = RateLimiter(max_requests_per_minute=2)
+    while rate_limiter.try_acquire():
+        pass
+    first, second = asyncio.create_task(rate_limiter.acquire()), asyncio.create_task(rate_limiter.acquire())
+    await asyncio.sleep(0)
+    assert not rate_limiter.try_acquire()
+    first.cancel()
+    assert await asyncio.wait_for(second, timeout=1)
+    assert first.cancelled() and rate_limiter.num_waiting() == 0
+
+
+@pytest.mark.asyncio
+async def test_no_more_than_the_limit_in_any_window(short_minute):
+    max_requests = 5
+    rate_limiter = RateLimiter(max_requests_per_minute=max_requests)
+    admitted = []
+    consume = rate_limiter._consume
+
+    def record(now):
+        admitted.append(now)
+        consume(now)
+
+    rate_limiter._consume = record
+    await asyncio.gather(*[rate_limiter.acquire() for _ in range(4 * max_requests)])
+    await asyncio.sleep(short_minute / 2)
+    assert await rate_limiter.acquire()
+
+    assert len(admitted) == 4 * max_requests + 1
+    # the request N after another one is made a full window later
+    assert all(later - earlier >= short_minute for earlier, later in zip(admitted, admitted[max_requests:]))
+
+
+@pytest.mark.asyncio
+async def test_thousands_of_waiters(short_minute):
+    num_waiters = 5000
+    max_requests = 200
+    # 200 requests per 50ms window, 4000 per second
+    rate_limiter = RateLimiter(max_requests_per_minute=max_requests)
+
+    served = []
+
+    async def request(idx):
+        await rate_limiter.acquire()
+        served.append(idx)
+
+    start_time = time.perf_counter()
+    tasks = [asyncio.create_task(request(idx)) for idx in range(num_waiters)]
+    await asyncio.sleep(0)
+    # the first window is served right away
+    assert rate_limiter.num_waiting() == num_waiters - max_requests
+    for task in tasks[::3]:
+        task.cancel()
+    await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout=30)
+    elapsed = time.perf_counter() - start_time
+
+    expected = [idx for idx, task in enumerate(tasks) if not task.cancelled()]
+    assert len(expected) >= num_waiters * 2 // 3
+    assert served == expected
+    assert rate_limiter.num_waiting() == 0
+    # about 0.8s of rate-limited waiting, the bookkeeping itself is negligible
+    assert elapsed < 5 * len(expected) / max_requests * short_minute + 1
+
+
+def test_chat_model_rate_limiter_does_not_block_when_asked_not_to():
+    chat_model_rate_limiter = ChatModelRateLimiter(RateLimiter(max_requests_per_day=1))
+    assert chat_model_rate_limiter.acquire(blocking=False)
+    assert not chat_model_rate_limiter.acquire(blocking=False)
+
+
+def test_chat_model_invoked_synchronously_draws_from_rate_limiter():
+    rate_limiter = RateLimiter(max_requests_per_minute=1000)
+    chat_model = FakeChatModel(rate_limiter=ChatModelRateLimiter(rate_limiter))
+
+    for _ in range(2):
+        chat_model.invoke([HumanMessage(content="extract all relevant character information")])
+
+    assert rate_limiter.remaining_requests() == 998
+
+
+@pytest.mark.asyncio
+async def test_sync_invocation_from_a_thread_queues_behind_async_waiters(short_minute):
+    rate_limiter = RateLimiter(max_requests_per_minute=1)
+    chat_model = FakeChatModel(rate_limiter=ChatModelRateLimiter(rate_limiter))
+    while rate_limiter.try_acquire():
+        pass
+
+    served = []
+
+    async def request(name):
+        await rate_limiter.acquire()
+        served.append(name)
+
+    waiter = asyncio.create_task(request("async"))
+    await asyncio.sleep(0)
+    await asyncio.to_thread(chat_model.invoke, [HumanMessage(content="extract all relevant character information")])
+    served.append("sync")
+    await waiter
+
+    assert served == ["async", "sync"]
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import pytest
+from pipelines.script2video_pipeline import Script2VideoPipeline
+
+
+SCRIPT = "INT. KITCHEN - DAY\nAlice (30s, short hair) makes coffee."
+
+
+@pytest.mark.asyncio
+async def test_concurrent_pipelines_do_not_share_state(tmp_path, fake_chat_model, fake_image_generator, fake_video_generator):
+    num_jobs = 4
+    pipelines = [
+        Script2VideoPipeline(
+            chat_model=fake_chat_model,
+            image_generator=fake_image_generator,
+            video_generator=fake_video_generator,
+            working_dir=str(tmp_path / f"job_{i}"),
+        )
+        for i in range(num_jobs)
+    ]
+
+    final_video_paths = await asyncio.wait_for(
+        asyncio.gather(*[
+            pipeline(script=SCRIPT, user_requirement="", style="Anime Style")
+            for pipeline in pipelines
+        ]),
+        timeout=120,
+    )
+
+    for i, final_video_path in enumerate(final_video_paths):
+        assert final_video_path == str(tmp_path / f"job_{i}" / "final_video.mp4")
+        assert os.path.getsize(final_video_path) > 0
+        for shot_idx in range(fake_chat_model.num_shots):
+            assert os.path.exists(tmp_path / f"job_{i}" / "shots" / f"{shot_idx}" / "first_frame.png")
+            assert os.path.exists(tmp_path / f"job_{i}" / "shots" / f"{shot_idx}" / "video.mp4")
+
+    # every provider call only ever references files of its own job
+    for _, reference_image_paths in fake_image_generator.calls + fake_video_generator.calls:
+        job_dirs = {os.path.relpath(path, tmp_path).split(os.sep)[0] for path in reference_image_paths}
+        assert len(job_dirs) <= 1
+
+
+@pytest.mark.asyncio
+async def test_shared_pipeline_runs_get_their_own_context(tmp_path, fake_chat_model, fake_image_generator, fake_video_generator, characters):
+    pipeline = Script2VideoPipeline(
+        chat_model=fake_chat_model,
+        image_generator=fake_image_generator,
+        video_generator=fake_video_generator,
+        working_dir=str(tmp_path),
+    )
+    await pipeline(script=SCRIPT, user_requirement="", style="Anime Style", characters=characters)
+
+    assert not hasattr(Script2VideoPipeline, "character_portrait_events")
+    assert not hasattr(Script2VideoPipeline, "shot_desc_events")
+    assert not hasattr(pipeline, "shot_desc_events")
+
+
+@pytest.mark.asyncio
+async def test_portraits_are_generated_while_shots_are_planned(tmp_path, fake_chat_model, fake_image_generator, fake_video_generator, characters):
+    pipeline = Script2VideoPipeline(
+        chat_model=fake_chat_model,
+        image_generator=fake_image_generator,
+        video_generator=fake_video_generator,
+        working_dir=str(tmp_path),
+    )
+    portraits_ready_when_planning = []
+    design_storyboard = pipeline.design_storyboard
+
+    async def record_design_storyboard(**kwargs):
+        front_portrait_path = pipeline.get_character_portraits_registry_item(characters[0])["front"]["path"]
+        portraits_ready_when_planning.append(os.path.exists(front_portrait_path))
+        return await design_storyboard(**kwargs)
+
+    pipeline.design_storyboard = record_design_storyboard
+    await pipeline(script=SCRIPT, user_requirement="", style="Anime Style", characters=characters)
+
+    assert portraits_ready_when_planning == [False]
+    assert os.path.exists(tmp_path / "character_portraits_registry.json")
+    # every frame referencing a portrait was generated after the portrait (checked by the fake generator)
+    assert any(
+        any("character_portraits" in path for path in reference_image_paths)
+        for _, reference_image_paths in fake_image_generator.calls
+    )
+
+
+@pytest.mark.asyncio
+async def test_frames_start_before_every_shot_is_decomposed(tmp_path, fake_chat_model, fake_image_generator, fake_video_generator, characters):
+    pipeline = Script2VideoPipeline(
+        chat_model=fake_chat_model,
+        image_generator=fake_image_generator,
+        video_generator=fake_video_generator,
+        working_dir=str(tmp_path),
+    )
+    last_shot_idx = fake_chat_model.num_shots - 1
+    first_frame_ready_when_last_shot_decomposed = []
+    decompose_visual_description = pipeline.storyboard_artist.decompose_visual_description
+
+    async def slow_decompose_visual_description(shot_brief_desc, **kwargs):
+        shot_description = await decompose_visual_description(shot_brief_desc=shot_brief_desc, **kwargs)
+        if shot_brief_desc.idx == last_shot_idx:
+            await asyncio.sleep(0.5)
+            first_frame_ready_when_last_shot_decomposed.append(os.path.exists(tmp_path / "shots" / "0" / "first_frame.png"))
+        return shot_description
+
+    pipeline.storyboard_artist.decompose_visual_description = slow_decompose_visual_description
+    await pipeline(script=SCRIPT, user_requirement="", style="Anime Style", characters=characters)
+
+    assert first_frame_ready_when_last_shot_decomposed == [True]
+    assert os.path.exists(tmp_path / "camera_tree.json")
+    for shot_idx in range(fake_chat_model.num_shots):
+        assert os.path.exists(tmp_path / "shots" / f"{shot_idx}" / "video.mp4")
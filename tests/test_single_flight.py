@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from utils.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_identical_calls_in_flight_share_one_run():
+    single_flight = SingleFlight()
+    num_runs = 0
+
+    async def generate():
+        nonlocal num_runs
+        num_runs += 1
+        await asyncio.sleep(0.05)
+        return object()
+
+    results = await asyncio.gather(*[single_flight.do("portrait", generate) for _ in range(5)], single_flight.do("frame", generate))
+    assert num_runs == 2
+    assert all(result is results[0] for result in results[:5])
+    assert single_flight.stats() == {"in_flight": 0, "calls": 6, "coalesced": 4}
+
+    # once finished, the call runs again
+    await single_flight.do("portrait", generate)
+    assert num_runs == 3
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_the_call():
+    single_flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def generate():
+        started.set()
+        await asyncio.sleep(0.05)
+        return "video"
+
+    first = asyncio.create_task(single_flight.do("video", generate))
+    await started.wait()
+    second = single_flight.start("video", generate)
+    first.cancel()
+
+    assert await second == "video"
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+
+@pytest.mark.asyncio
+async def test_finished_call_does_not_unregister_a_newer_one():
+    single_flight = SingleFlight()
+
+    async def generate(result):
+        return result
+
+    first = single_flight.start("frame", lambda: generate("old"))
+    task = single_flight._calls["frame"]
+    # run the first call to completion without letting its done callbacks run
+    while not task.done():
+        await asyncio.sleep(0)
+    second = single_flight.start("frame", lambda: generate("new"))
+    assert await first == "old"
+    assert await second == "new"
+    assert not single_flight.in_flight("frame")
@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from utils.task_graph import TaskGraph, PrioritySemaphore
+
+
+def make_task(name, log, delay=0.0):
+    async def func():
+        log.append(f"start {name}")
+        await asyncio.sleep(delay)
+        log.append(f"end {name}")
+        return name
+    return func
+
+
+def test_critical_path_lengths():
+    graph = TaskGraph()
+    graph.add_task("a", make_task("a", []), cost=1)
+    graph.add_task("b", make_task("b", []), deps=["a"], cost=2)
+    graph.add_task("c", make_task("c", []), deps=["a"], cost=5)
+    graph.add_task("d", make_task("d", []), deps=["b"], cost=1)
+
+    lengths = graph.critical_path_lengths()
+    assert lengths == {"a": 6, "b": 3, "c": 5, "d": 1}
+
+
+def test_cycle_is_rejected():
+    graph = TaskGraph()
+    graph.add_task("a", make_task("a", []), deps=["b"])
+    graph.add_task("b", make_task("b", []), deps=["a"])
+    with pytest.raises(ValueError):
+        graph.critical_path_lengths()
+
+
+@pytest.mark.asyncio
+async def test_dependencies_are_respected():
+    log = []
+    graph = TaskGraph()
+    graph.add_task("frame", make_task("frame", log, 0.01))
+    graph.add_task("video", make_task("video", log), deps=["frame"])
+
+    results = await graph.run()
+    assert results == {"frame": "frame", "video": "video"}
+    assert log.index("end frame") < log.index("start video")
+
+
+@pytest.mark.asyncio
+async def test_scarce_slot_goes_to_longest_critical_path():
+    log = []
+    graph = TaskGraph(resources={"video": PrioritySemaphore(1)})
+    # occupy the only slot so that the other tasks queue up behind it
+    graph.add_task("busy", make_task("busy", log, 0.01), resource="video", cost=100)
+    graph.add_task("leaf_video", make_task("leaf_video", log), resource="video", cost=1)
+    graph.add_task("transition", make_task("transition", log), resource="video", cost=1)
+    graph.add_task("child_frame", make_task("child_frame", log), deps=["transition"], cost=10)
+
+    await graph.run()
+    assert log.index("start transition") < log.index("start leaf_video")
+
+
+@pytest.mark.asyncio
+async def test_failure_cancels_running_tasks():
+    log = []
+
+    async def fail():
+        raise RuntimeError("provider error")
+
+    graph = TaskGraph()
+    graph.add_task("slow", make_task("slow", log, 10))
+    graph.add_task("fail", fail)
+    graph.add_task("after", make_task("after", log), deps=["fail"])
+
+    with pytest.raises(RuntimeError):
+        await graph.run()
+    assert "end slow" not in log
+    assert "start after" not in log
+
+
+@pytest.mark.asyncio
+async def test_priority_semaphore_cancelled_waiter_does_not_leak_slot():
+    semaphore = PrioritySemaphore(1)
+    await semaphore.acquire()
+    waiter = asyncio.create_task(semaphore.acquire(priority=1))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    semaphore.release()
+    assert semaphore.in_use == 0
+    await asyncio.wait_for(semaphore.acquire(), timeout=1)
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from PIL import Image
+from tools.task_ledger import TaskLedger, generate_single_video_resumable
+from interfaces.video_output import VideoOutput
+from tools.http_client import close_http_sessions
+
+
+class FakeTaskVideoGenerator:
+    """Provider whose tasks outlive the generator, like a remote API."""
+
+    def __init__(self, provider_tasks, base_url, auto_complete=False):
+        self.provider_tasks = provider_tasks
+        self.base_url = base_url
+        self.auto_complete = auto_complete
+        self.num_created = 0
+        self.queried = []
+
+    async def create_video_generation_task(self, prompt, reference_image_paths, **kwargs):
+        self.num_created += 1
+        task_id = f"task-{len(self.provider_tasks)}"
+        self.provider_tasks[task_id] = asyncio.Event()
+        if self.auto_complete:
+            self.provider_tasks[task_id].set()
+        return task_id
+
+    async def query_video_generation_task(self, task_id, submitted_at=None):
+        self.queried.append(task_id)
+        if task_id not in self.provider_tasks:
+            raise RuntimeError(f"unknown task {task_id}")
+        await self.provider_tasks[task_id].wait()
+        return VideoOutput(fmt="url", ext="mp4", data=f"{self.base_url}/{task_id}.mp4")
+
+
+@pytest_asyncio.fixture
+async def video_server():
+    expired = set()
+
+    async def handle(request):
+        if request.match_info["name"] in expired:
+            raise web.HTTPNotFound()
+        return web.Response(body=b"video-bytes")
+
+    app = web.Application()
+    app.router.add_get("/{name}.mp4", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}", expired
+    await close_http_sessions()
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_resume_reattaches_to_submitted_task(tmp_path, video_server):
+    base_url, expired = video_server
+    frame_path = str(tmp_path / "first_frame.png")
+    Image.new("RGB", (8, 8), "red").save(frame_path)
+    ledger = TaskLedger(str(tmp_path / "video_task.json"))
+    provider_tasks = {}
+
+    # the worker crashes while waiting for the task it submitted
+    generator = FakeTaskVideoGenerator(provider_tasks, base_url)
+    run = asyncio.create_task(generate_single_video_resumable(generator, ledger, prompt="A cat.", reference_image_paths=[frame_path]))
+    while not provider_tasks:
+        await asyncio.sleep(0.01)
+    run.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await run
+    assert ledger.load()["task_id"] == "task-0"
+
+    # the restarted worker reattaches to it
+    generator = FakeTaskVideoGenerator(provider_tasks, base_url)
+    provider_tasks["task-0"].set()
+    video_output = await generate_single_video_resumable(generator, ledger, prompt="A cat.", reference_image_paths=[frame_path])
+    assert generator.num_created == 0
+    assert video_output.data == f"{base_url}/task-0.mp4"
+    assert json.load(open(ledger.path))["video_url"] == video_output.data
+
+    # the recorded result is downloaded again without querying the provider
+    generator = FakeTaskVideoGenerator(provider_tasks, base_url)
+    video_output = await generate_single_video_resumable(generator, ledger, prompt="A cat.", reference_image_paths=[frame_path])
+    assert video_output.data == f"{base_url}/task-0.mp4"
+    assert generator.queried == [] and generator.num_created == 0
+
+    # an expired result is fetched again from the task
+    expired.add("task-0")
+    video_output = await generate_single_video_resumable(generator, ledger, prompt="A cat.", reference_image_paths=[frame_path])
+    assert generator.queried == ["task-0"] and generator.num_created == 0
+
+
+@pytest.mark.asyncio
+async def test_changed_or_lost_task_is_submitted_again(tmp_path, video_server):
+    base_url, _ = video_server
+    frame_path = str(tmp_path / "first_frame.png")
+    Image.new("RGB", (8, 8), "red").save(frame_path)
+    ledger = TaskLedger(str(tmp_path / "video_task.json"))
+    provider_tasks = {}
+    generator = FakeTaskVideoGenerator(provider_tasks, base_url, auto_complete=True)
+
+    ledger.save({"provider": "FakeTaskVideoGenerator", "task_id": "lost", "fingerprint": "stale", "submitted_at": 0})
+    await generate_single_video_resumable(generator, ledger, prompt="A cat.", reference_image_paths=[frame_path])
+    assert generator.num_created == 1
+
+    # the first frame was regenerated, the recorded task does not match any more
+    Image.new("RGB", (8, 8), "blue").save(frame_path)
+    await generate_single_video_resumable(generator, ledger, prompt="A cat.", reference_image_paths=[frame_path])
+    assert generator.num_created == 2
+
+    # the provider does not know the recorded task any more
+    fingerprint = ledger.load()["fingerprint"]
+    ledger.save({"provider": "FakeTaskVideoGenerator", "task_id": "lost", "fingerprint": fingerprint, "submitted_at": 0})
+    await generate_single_video_resumable(generator, ledger, prompt="A cat.", reference_image_paths=[frame_path])
+    assert generator.num_created == 3
@@ -0,0 +1,106 @@
+import asyncio
+import time
+import pytest
+from tools.task_poller import TaskPoller, TaskStatus
+
+
+class FakeProvider:
+    """Tasks succeed a fixed number of seconds after their submission."""
+
+    def __init__(self, duration: float):
+        self.duration = duration
+        self.submitted_at = {}
+        self.num_queries = 0
+        self.batch_sizes = []
+
+    def submit(self, task_id):
+        self.submitted_at[task_id] = time.time()
+        return task_id
+
+    async def query(self, task_id):
+        self.num_queries += 1
+        if task_id.startswith("failing"):
+            return TaskStatus(state="failed", error="content policy")
+        if time.time() - self.submitted_at[task_id] >= self.duration:
+            return TaskStatus(state="succeeded", result=f"{task_id}.mp4")
+        return TaskStatus(state="pending")
+
+    async def batch_query(self, task_ids):
+        self.batch_sizes.append(len(task_ids))
+        return {task_id: await self.query(task_id) for task_id in task_ids}
+
+
+@pytest.mark.asyncio
+async def test_poll_schedule_adapts_to_completion_times():
+    provider = FakeProvider(duration=0.3)
+    poller = TaskPoller(query_func=provider.query, min_interval=0.01, max_interval=0.2)
+
+    async def run_batch(prefix):
+        num_queries = provider.num_queries
+        task_ids = [provider.submit(f"{prefix}-{i}") for i in range(10)]
+        results = await asyncio.gather(*[poller.wait(task_id, timeout=5) for task_id in task_ids])
+        assert results == [f"{task_id}.mp4" for task_id in task_ids]
+        return provider.num_queries - num_queries
+
+    num_queries_before = await run_batch("first")
+    num_queries_after = await run_batch("second")
+
+    # once completion times are known, tasks are not polled before they usually finish
+    assert num_queries_after <= num_queries_before / 2
+    assert poller.stats()["outstanding"] == 0
+    assert poller.stats()["completed"] == 20
+
+
+@pytest.mark.asyncio
+async def test_failed_and_late_tasks_raise():
+    provider = FakeProvider(duration=10)
+    poller = TaskPoller(query_func=provider.query, min_interval=0.01, max_interval=0.05)
+
+    with pytest.raises(RuntimeError, match="content policy"):
+        await poller.wait(provider.submit("failing-0"), timeout=5)
+    with pytest.raises(TimeoutError):
+        await poller.wait(provider.submit("slow-0"), timeout=0.2)
+    assert poller.stats()["outstanding"] == 0
+
+
+@pytest.mark.asyncio
+async def test_due_tasks_are_queried_in_batches():
+    provider = FakeProvider(duration=0.1)
+    poller = TaskPoller(batch_query_func=provider.batch_query, min_interval=0.05, max_interval=0.05)
+
+    task_ids = [provider.submit(f"task-{i}") for i in range(8)]
+    await asyncio.gather(*[poller.wait(task_id, timeout=5) for task_id in task_ids])
+
+    assert max(provider.batch_sizes) == 8
+    assert len(provider.batch_sizes) <= 4
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_stops_polling():
+    provider = FakeProvider(duration=10)
+    poller = TaskPoller(query_func=provider.query, min_interval=0.01, max_interval=0.01)
+
+    waiter = asyncio.create_task(poller.wait(provider.submit("task-0")))
+    await asyncio.sleep(0.05)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert poller.stats()["outstanding"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelling_one_of_several_waiters_keeps_polling():
+    provider = FakeProvider(duration=0.1)
+    poller = TaskPoller(query_func=provider.query, min_interval=0.01, max_interval=0.01)
+    task_id = provider.submit("task-0")
+
+    cancelled = asyncio.create_task(poller.wait(task_id))
+    kept = asyncio.create_task(poller.wait(task_id))
+    await asyncio.sleep(0.02)
+    cancelled.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+
+    assert poller.stats()["outstanding"] == 1
+    assert await asyncio.wait_for(kept, timeout=1) == "task-0.mp4"
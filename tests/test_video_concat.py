@@ -0,0 +1,125 @@
+import asyncio
+import subprocess
+from dataclasses import replace
+import cv2
+import pytest
+from tests.conftest import make_video_bytes
+from utils.video_concat import concatenate_videos, probe_clip, get_ffmpeg_exe, build_normalize_args
+
+
+def write_clip(path, **kwargs):
+    with open(path, "wb") as f:
+        f.write(make_video_bytes(**kwargs))
+    return str(path)
+
+
+def count_frames(path):
+    capture = cv2.VideoCapture(str(path))
+    num_frames = 0
+    while capture.read()[0]:
+        num_frames += 1
+    capture.release()
+    return num_frames
+
+
+@pytest.mark.asyncio
+async def test_probe_clip(tmp_path):
+    params = await probe_clip(write_clip(tmp_path / "clip.mp4", width=64, height=36, fps=8))
+    assert (params.video_codec, params.width, params.height, params.fps) == ("mpeg4", 64, 36, 8.0)
+    assert not params.has_audio
+
+
+@pytest.mark.asyncio
+async def test_compatible_clips_are_stream_copied(tmp_path, monkeypatch):
+    paths = [write_clip(tmp_path / f"clip_{idx}.mp4", num_frames=8) for idx in range(3)]
+
+    normalized = []
+    monkeypatch.setattr("utils.video_concat.build_normalize_args", lambda *args: normalized.append(args))
+    output_path = await concatenate_videos(paths, str(tmp_path / "final_video.mp4"))
+
+    assert normalized == []
+    assert count_frames(output_path) == 24
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["clip_0.mp4", "clip_1.mp4", "clip_2.mp4", "final_video.mp4"]
+
+
+@pytest.mark.asyncio
+async def test_mismatched_clips_are_normalized(tmp_path):
+    paths = [
+        write_clip(tmp_path / "clip_0.mp4", width=64, height=36, num_frames=8),
+        write_clip(tmp_path / "clip_1.mp4", width=32, height=18, num_frames=8),
+        write_clip(tmp_path / "clip_2.mp4", width=64, height=36, num_frames=8),
+    ]
+    output_path = await concatenate_videos(paths, str(tmp_path / "final_video.mp4"))
+
+    params = await probe_clip(output_path)
+    assert (params.width, params.height) == (64, 36)
+    assert count_frames(output_path) == 24
+
+
+@pytest.mark.asyncio
+async def test_clip_without_audio_gets_a_silent_track(tmp_path):
+    silent_path = write_clip(tmp_path / "silent.mp4")
+    with_audio_path = str(tmp_path / "with_audio.mp4")
+    subprocess.run(
+        [get_ffmpeg_exe(), "-y", "-loglevel", "error", "-i", silent_path, "-f", "lavfi", "-i", "sine=duration=1",
+         "-map", "0:v", "-map", "1:a", "-c:v", "copy", "-c:a", "aac", "-shortest", with_audio_path],
+        check=True,
+    )
+    with_audio_params = await probe_clip(with_audio_path)
+    args = build_normalize_args(silent_path, "out.mp4", await probe_clip(silent_path), with_audio_params)
+    assert args[args.index("-c:v") + 1] == "copy"
+
+    output_path = await concatenate_videos([with_audio_path, silent_path, with_audio_path], str(tmp_path / "final_video.mp4"))
+    assert (await probe_clip(output_path)).has_audio
+
+
+@pytest.mark.asyncio
+async def test_clips_of_another_h264_profile_are_normalized(tmp_path, monkeypatch):
+    source_path = write_clip(tmp_path / "source.mp4", num_frames=8)
+    paths = []
+    for idx, profile in enumerate(["high", "baseline", "high"]):
+        paths.append(str(tmp_path / f"clip_{idx}.mp4"))
+        subprocess.run(
+            [get_ffmpeg_exe(), "-y", "-loglevel", "error", "-i", source_path,
+             "-c:v", "libx264", "-profile:v", profile, "-pix_fmt", "yuv420p", paths[-1]],
+            check=True,
+        )
+    clip_params = [await probe_clip(path) for path in paths]
+    assert [params.profile for params in clip_params] == ["High", "Constrained Baseline", "High"]
+    # the same size, codec and frame rate, only the profile differs
+    assert clip_params[0] == replace(clip_params[1], profile="High")
+
+    normalized = []
+
+    def tracked_build_normalize_args(input_path, output_path, params, target):
+        normalized.append(input_path)
+        return build_normalize_args(input_path, output_path, params, target)
+
+    monkeypatch.setattr("utils.video_concat.build_normalize_args", tracked_build_normalize_args)
+    output_path = await concatenate_videos(paths, str(tmp_path / "final_video.mp4"))
+
+    assert normalized == [paths[1]]
+    assert (await probe_clip(output_path)).profile == "High"
+    assert count_frames(output_path) == 24
+
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_kills_its_process(tmp_path, monkeypatch):
+    processes = []
+    create_subprocess_exec = asyncio.create_subprocess_exec
+
+    async def tracked_create_subprocess_exec(*args, **kwargs):
+        # a process that would outlive the probe
+        process = await create_subprocess_exec("sleep", "30", **kwargs)
+        processes.append(process)
+        return process
+
+    monkeypatch.setattr("utils.video_concat.shutil.which", lambda name: None)
+    monkeypatch.setattr("utils.video_concat.asyncio.create_subprocess_exec", tracked_create_subprocess_exec)
+    probe = asyncio.create_task(probe_clip(str(tmp_path / "clip.mp4")))
+    await asyncio.sleep(0.1)
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert processes[0].returncode is not None
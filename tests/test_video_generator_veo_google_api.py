@@ -0,0 +1,63 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from types import SimpleNamespace
+import pytest
+from tools.video_generator_veo_google_api import VideoGeneratorVeoGoogleAPI
+
+
+class FakeAsyncVeoClient:
+    """Async surface of the genai client, finishing the operation after two polls."""
+
+    def __init__(self, video_uri):
+        self.num_polls = 0
+        video = SimpleNamespace(uri=video_uri, video_bytes=None)
+        self.response = SimpleNamespace(generated_videos=[SimpleNamespace(video=video)])
+        self.models = SimpleNamespace(generate_videos=self.generate_videos)
+        self.operations = SimpleNamespace(get=self.get_operation)
+
+    async def generate_videos(self, **kwargs):
+        return SimpleNamespace(name="operations/test", done=False, error=None, response=None)
+
+    async def get_operation(self, operation):
+        assert operation.name == "operations/test"
+        self.num_polls += 1
+        done = self.num_polls >= 2
+        return SimpleNamespace(done=done, error=None, response=self.response if done else None)
+
+
+class VideoHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.headers.get("x-goog-api-key") != "test-key":
+            self.send_response(403)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b"video-bytes")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_generate_single_video_does_not_block_the_event_loop(tmp_path, monkeypatch):
+    server = HTTPServer(("127.0.0.1", 0), VideoHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, "sleep", lambda _: sleep(0))
+
+    generator = VideoGeneratorVeoGoogleAPI(api_key="test-key")
+    # the sync surface of the client must not be used
+    generator.client = SimpleNamespace(aio=FakeAsyncVeoClient(f"http://127.0.0.1:{server.server_port}/video.mp4"))
+    generator.task_poller.min_interval = 0.01
+
+    try:
+        video_output = await generator.generate_single_video(prompt="A cat.", reference_image_paths=[])
+        assert video_output.fmt == "url"
+        await video_output.asave(str(tmp_path / "video.mp4"))
+    finally:
+        server.shutdown()
+
+    assert (tmp_path / "video.mp4").read_bytes() == b"video-bytes"
+    assert generator.client.aio.num_polls == 2
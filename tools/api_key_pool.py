@@ -0,0 +1,223 @@
+import hashlib
+import inspect
+import logging
+import time
+from typing import Any, Dict, List, Optional, Set
+from interfaces.image_output import ImageOutput
+from interfaces.video_output import VideoOutput
+from tools.generator_router import cache_identity, get_error_status
+from utils.rate_limiter import RateLimiter
+
+
+def mask_api_key(api_key: str) -> str:
+    """
+    Short stable name of an API key, safe to log and to record in task IDs.
+    """
+    return "key-" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+
+
+class ApiKeyPool:
+    """
+    Generator using several API keys of one provider, with one instance of the
+    tool and one rate limiter per key.
+
+    Every request is dispatched on the key with the most headroom (requests left
+    under its limits, minus its requests in flight). A key rejected as unauthorized
+    (401, 403) is revoked, and a throttled key (429) rests for a while; in both
+    cases the request is retried on another key.
+    """
+
+    def __init__(
+        self,
+        generators: List[Any],
+        names: List[str],
+        rate_limiters: List[Optional[RateLimiter]],
+        throttle_cooldown: float = 60.0,
+    ):
+        """
+        Initialize the pool.
+
+        Args:
+            generators: One instance of the tool per key.
+            names: Names of the keys in logs, health reports and task IDs.
+            rate_limiters: Rate limiter of each key. The pool acquires it itself for the
+                           generators not taking a rate_limiter.
+            throttle_cooldown: Seconds a key rests after a 429.
+        """
+        if not generators:
+            raise ValueError("An API key pool needs at least one key")
+        self.generators = generators
+        self.names = names
+        self.rate_limiters = rate_limiters
+        self.throttle_cooldown = throttle_cooldown
+        self.revoked: Set[int] = set()
+        self.cooldown_until = [0.0] * len(generators)
+        self.in_flight = [0] * len(generators)
+        self.num_calls = [0] * len(generators)
+
+    @classmethod
+    def from_api_keys(
+        cls,
+        generator_cls,
+        api_keys: List[str],
+        max_requests_per_minute: Optional[int] = None,
+        max_requests_per_day: Optional[int] = None,
+        **init_args,
+    ) -> "ApiKeyPool":
+        """
+        Create a pool of generator_cls(api_key=..., **init_args), one per key, each
+        key getting its own per-minute and per-day limits.
+        """
+        takes_rate_limiter = "rate_limiter" in inspect.signature(generator_cls).parameters
+        generators = []
+        rate_limiters = []
+        for api_key in api_keys:
+            rate_limiter = RateLimiter(
+                max_requests_per_minute=max_requests_per_minute,
+                max_requests_per_day=max_requests_per_day
+            ) if (max_requests_per_minute or max_requests_per_day) else None
+            if takes_rate_limiter:
+                generators.append(generator_cls(api_key=api_key, rate_limiter=rate_limiter, **init_args))
+            else:
+                generators.append(generator_cls(api_key=api_key, **init_args))
+            rate_limiters.append(rate_limiter)
+        return cls(generators, [mask_api_key(api_key) for api_key in api_keys], rate_limiters)
+
+    def __getattr__(self, name):
+        generators = self.__dict__["generators"]
+        if name in ("create_video_generation_task", "query_video_generation_task") and hasattr(generators[0], name):
+            return getattr(self, f"_{name}")
+        # models and other settings are the same for every key
+        return getattr(generators[0], name)
+
+    def cache_identity(self) -> Dict[str, Any]:
+        # every key calls the same models, its outputs are those of a single key
+        return cache_identity(self.generators[0])
+
+    def _remaining_requests_of(self, idx: int, period=None) -> Optional[int]:
+        rate_limiter = self.rate_limiters[idx]
+        return rate_limiter.remaining_requests(period) if rate_limiter is not None else None
+
+    def remaining_requests(self, period=None) -> Optional[int]:
+        """
+        Get the number of requests the keys in rotation can still make without waiting,
+        or None if one of them is not limited.
+        """
+        total = 0
+        for idx in range(len(self.generators)):
+            if idx in self.revoked:
+                continue
+            remaining = self._remaining_requests_of(idx, period)
+            if remaining is None:
+                return None
+            total += remaining
+        return total
+
+    def _headroom(self, idx: int) -> float:
+        remaining = self._remaining_requests_of(idx)
+        return (remaining if remaining is not None else float("inf")) - self.in_flight[idx]
+
+    def _candidates(self, tried: Set[int]) -> List[int]:
+        return [idx for idx in range(len(self.generators)) if idx not in self.revoked and idx not in tried]
+
+    def _select(self, tried: Set[int]) -> int:
+        candidates = self._candidates(tried)
+        if not candidates:
+            raise RuntimeError(f"No API key left to try among {len(self.generators)}, {len(self.revoked)} revoked")
+        now = time.time()
+        # resting keys are only used once every other key is resting too
+        return min(candidates, key=lambda idx: (now < self.cooldown_until[idx], -self._headroom(idx), self.num_calls[idx]))
+
+    async def _dispatch(self, func, idx: Optional[int] = None, acquire: bool = True):
+        """
+        Call func(generator) on the key with the most headroom, retrying on other keys
+        when a key is revoked or throttled, or only on the key idx if given.
+
+        Returns:
+            The index of the key used and the result of the call.
+        """
+        pinned = idx is not None
+        tried: Set[int] = set()
+        while True:
+            if not pinned:
+                idx = self._select(tried)
+            tried.add(idx)
+            self.in_flight[idx] += 1
+            self.num_calls[idx] += 1
+            try:
+                rate_limiter = self.rate_limiters[idx]
+                # generators taking a rate_limiter acquire it themselves
+                if acquire and rate_limiter is not None and rate_limiter is not getattr(self.generators[idx], "rate_limiter", None):
+                    await rate_limiter.acquire()
+                return idx, await func(self.generators[idx])
+            except Exception as e:
+                status = get_error_status(e)
+                if status in (401, 403):
+                    logging.warning(f"API key {self.names[idx]} was rejected ({status}), taking it out of rotation")
+                    self.revoked.add(idx)
+                elif status == 429:
+                    logging.warning(f"API key {self.names[idx]} is throttled, resting it for {self.throttle_cooldown:.0f}s")
+                    self.cooldown_until[idx] = time.time() + self.throttle_cooldown
+                if pinned or status not in (401, 403, 429) or not self._candidates(tried):
+                    raise
+            finally:
+                self.in_flight[idx] -= 1
+
+    async def generate_single_image(
+        self,
+        prompt: str,
+        reference_image_paths: List[str] = [],
+        **kwargs,
+    ) -> ImageOutput:
+        _, image_output = await self._dispatch(lambda generator: generator.generate_single_image(prompt=prompt, reference_image_paths=reference_image_paths, **kwargs))
+        return image_output
+
+    async def generate_single_video(
+        self,
+        prompt: str,
+        reference_image_paths: List[str] = [],
+        **kwargs,
+    ) -> VideoOutput:
+        if hasattr(self.generators[0], "create_video_generation_task"):
+            task_id = await self._create_video_generation_task(prompt, reference_image_paths, **kwargs)
+            return await self._query_video_generation_task(task_id)
+        _, video_output = await self._dispatch(lambda generator: generator.generate_single_video(prompt=prompt, reference_image_paths=reference_image_paths, **kwargs))
+        return video_output
+
+    async def _create_video_generation_task(
+        self,
+        prompt: str,
+        reference_image_paths: List[str] = [],
+        **kwargs,
+    ) -> str:
+        idx, task_id = await self._dispatch(lambda generator: generator.create_video_generation_task(prompt=prompt, reference_image_paths=reference_image_paths, **kwargs))
+        # the key is needed to query the task, also after a restart
+        return f"{self.names[idx]}:{task_id}"
+
+    async def _query_video_generation_task(
+        self,
+        task_id: str,
+        submitted_at: Optional[float] = None,
+    ) -> VideoOutput:
+        name, _, key_task_id = task_id.partition(":")
+        if name not in self.names:
+            raise RuntimeError(f"No API key named {name} in the pool for task {task_id}")
+        _, video_output = await self._dispatch(
+            lambda generator: generator.query_video_generation_task(key_task_id, submitted_at=submitted_at),
+            idx=self.names.index(name),
+            acquire=False,
+        )
+        return video_output
+
+    def health(self) -> Dict[str, Dict[str, Any]]:
+        now = time.time()
+        return {
+            name: {
+                "revoked": idx in self.revoked,
+                "cooldown_seconds": round(max(0.0, self.cooldown_until[idx] - now), 1),
+                "in_flight": self.in_flight[idx],
+                "calls": self.num_calls[idx],
+                "remaining_requests": self._remaining_requests_of(idx),
+            }
+            for idx, name in enumerate(self.names)
+        }
@@ -0,0 +1,397 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Union
+from interfaces.image_output import ImageOutput
+from interfaces.video_output import VideoOutput
+from tools.generator_router import cache_identity
+from tools.task_ledger import request_fingerprint
+from utils.single_flight import SingleFlight
+
+
+def request_key(
+    generator,
+    prompt: str,
+    reference_image_paths: List[str],
+    **kwargs,
+) -> str:
+    """
+    Hash a request: the generator and its models (those of every backend of a
+    router, see cache_identity), the prompt with normalized whitespace, the
+    parameters and the content of the reference images.
+    """
+    identity = cache_identity(generator)
+    return request_fingerprint(
+        identity["provider"],
+        " ".join(prompt.split()),
+        reference_image_paths,
+        models=identity["models"],
+        **kwargs,
+    )
+
+
+class GenerationCache:
+    """
+    Disk-backed store of generated images and videos, addressed by a hash of the
+    request that generated them. Once the files take more than max_bytes, the least
+    recently used ones are evicted. Identical requests in flight are coalesced.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_bytes: int,
+    ):
+        """
+        Initialize the cache, loading the index left by a previous process.
+
+        Args:
+            cache_dir: Directory the files and their index are stored in.
+            max_bytes: Maximum total size of the stored files.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, "index.json")
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # key -> {"filename", "size"}, from the least to the most recently used
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logging.warning(f"Ignoring unreadable generation cache index {self.index_path}: {e}")
+                entries = []
+            for key, entry in entries:
+                if os.path.exists(os.path.join(cache_dir, entry["filename"])):
+                    self._entries[key] = entry
+        self._num_bytes = sum(entry["size"] for entry in self._entries.values())
+
+        # generations in flight, shared by every generator using the cache
+        self.in_flight = SingleFlight()
+        # cache key <-> ID of the provider task generating it
+        self.pending_task_ids: Dict[str, str] = {}
+        self.pending_task_keys: Dict[str, str] = {}
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def key(
+        self,
+        generator,
+        prompt: str,
+        reference_image_paths: List[str],
+        **kwargs,
+    ) -> str:
+        """
+        Hash a request, see request_key.
+        """
+        return request_key(generator, prompt, reference_image_paths, **kwargs)
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Get the path of the file stored for a key, or None on a miss.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            path = os.path.join(self.cache_dir, entry["filename"])
+            if os.path.exists(path):
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return path
+            self._remove(key)
+        self._misses += 1
+        return None
+
+    async def put(
+        self,
+        key: str,
+        output: Union[ImageOutput, VideoOutput],
+    ) -> str:
+        """
+        Store a generated output and return the path of the stored file.
+        """
+        filename = f"{key}.{output.ext}"
+        path = os.path.join(self.cache_dir, filename)
+        # the extension is kept, it selects the encoder of pil images
+        tmp_path = os.path.join(self.cache_dir, f".{uuid.uuid4().hex}.{filename}")
+        await output.asave(tmp_path)
+        size = await asyncio.to_thread(self._move_file, tmp_path, path)
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = {"filename": filename, "size": size}
+        self._num_bytes += size
+
+        # the entry just stored is kept even when it exceeds max_bytes on its own
+        evicted_filenames = []
+        while self._num_bytes > self.max_bytes and len(self._entries) > 1:
+            evicted_key = next(iter(self._entries))
+            evicted_filenames.append(self._entries[evicted_key]["filename"])
+            self._remove(evicted_key)
+            self._evictions += 1
+
+        await asyncio.to_thread(self._delete_files_and_save_index, evicted_filenames, list(self._entries.items()))
+        return path
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._num_bytes -= entry["size"]
+
+    @staticmethod
+    def _move_file(src: str, dst: str) -> int:
+        os.replace(src, dst)
+        return os.path.getsize(dst)
+
+    def _delete_files_and_save_index(self, filenames: List[str], entries):
+        for filename in filenames:
+            try:
+                os.remove(os.path.join(self.cache_dir, filename))
+            except FileNotFoundError:
+                pass
+        self._save_index(entries)
+
+    def _save_index(self, entries):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.index_path)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._num_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else None,
+            "evictions": self._evictions,
+            "coalesced": self.in_flight.stats()["coalesced"],
+        }
+
+
+class CachedGenerator:
+    """
+    Wrap an image or video generator of tools/, serving identical requests from a
+    GenerationCache. A request identical to one in flight waits for its result
+    instead of being sent again. Every other attribute is the one of the wrapped
+    generator.
+    """
+
+    def __init__(
+        self,
+        generator,
+        cache: GenerationCache,
+    ):
+        self.generator = generator
+        self.cache = cache
+
+    def __getattr__(self, name):
+        generator = self.__dict__["generator"]
+        if name in ("create_video_generation_task", "query_video_generation_task") and hasattr(generator, name):
+            return getattr(self, f"_{name}")
+        return getattr(generator, name)
+
+    async def _lookup(self, prompt, reference_image_paths, **kwargs):
+        key = await asyncio.to_thread(self.cache.key, self.generator, prompt, reference_image_paths, **kwargs)
+        return key, self.cache.get(key)
+
+    async def generate_single_image(
+        self,
+        prompt: str,
+        reference_image_paths: List[str] = [],
+        **kwargs,
+    ) -> ImageOutput:
+        key, path = await self._lookup(prompt, reference_image_paths, **kwargs)
+        if path is None:
+            async def generate():
+                image_output = await self.generator.generate_single_image(prompt=prompt, reference_image_paths=reference_image_paths, **kwargs)
+                return await self.cache.put(key, image_output)
+            path = await self.cache.in_flight.do(key, generate)
+        return ImageOutput(fmt="file", ext=os.path.splitext(path)[1][1:], data=path)
+
+    async def generate_single_video(
+        self,
+        prompt: str,
+        reference_image_paths: List[str] = [],
+        **kwargs,
+    ) -> VideoOutput:
+        key, path = await self._lookup(prompt, reference_image_paths, **kwargs)
+        if path is None:
+            async def generate():
+                video_output = await self.generator.generate_single_video(prompt=prompt, reference_image_paths=reference_image_paths, **kwargs)
+                return await self.cache.put(key, video_output)
+            path = await self.cache.in_flight.do(key, generate)
+        return VideoOutput(fmt="file", ext=os.path.splitext(path)[1][1:], data=path)
+
+    async def _create_video_generation_task(
+        self,
+        prompt: str,
+        reference_image_paths: List[str] = [],
+        **kwargs,
+    ) -> str:
+        key, path = await self._lookup(prompt, reference_image_paths, **kwargs)
+        if path is not None:
+            return f"cache:{key}"
+
+        async def create():
+            task_id = await self.generator.create_video_generation_task(prompt=prompt, reference_image_paths=reference_image_paths, **kwargs)
+            self.cache.pending_task_ids[key] = task_id
+            self.cache.pending_task_keys[task_id] = key
+            return task_id
+
+        # an identical request already submitted is waited for instead
+        task_id = self.cache.pending_task_ids.get(key)
+        if task_id is None:
+            task_id = await self.cache.in_flight.do(f"create:{key}", create)
+        return task_id
+
+    async def _query_video_generation_task(
+        self,
+        task_id: str,
+        submitted_at: Optional[float] = None,
+    ) -> VideoOutput:
+        if task_id.startswith("cache:"):
+            path = self.cache.get(task_id[len("cache:"):])
+            if path is None:
+                raise RuntimeError(f"Cached video {task_id} was evicted")
+            return VideoOutput(fmt="file", ext=os.path.splitext(path)[1][1:], data=path)
+
+        key = self.cache.pending_task_keys.get(task_id)
+        try:
+            video_output = await self.generator.query_video_generation_task(task_id, submitted_at=submitted_at)
+        except Exception:
+            self._forget_task(task_id)
+            raise
+        if key is None:
+            # submitted by an earlier process, the request it was made for is unknown
+            return video_output
+
+        async def store():
+            # stored already by another caller waiting for the same task
+            path = self.cache.get(key) or await self.cache.put(key, video_output)
+            self._forget_task(task_id)
+            return path
+
+        path = await self.cache.in_flight.do(f"store:{task_id}", store)
+        return VideoOutput(fmt="file", ext=os.path.splitext(path)[1][1:], data=path)
+
+    def _forget_task(self, task_id: str):
+        key = self.cache.pending_task_keys.pop(task_id, None)
+        if key is not None and self.cache.pending_task_ids.get(key) == task_id:
+            del self.cache.pending_task_ids[key]
+
+
+class CoalescedGenerator:
+    """
+    Wrap an image or video generator of tools/ so that a request identical to one
+    in flight waits for its result instead of being sent again. CachedGenerator
+    does this too, this wrapper is used when no GenerationCache is configured.
+    Every other attribute is the one of the wrapped generator.
+    """
+
+    def __init__(
+        self,
+        generator,
+    ):
+        self.generator = generator
+        self.in_flight = SingleFlight()
+        # request key <-> ID of the provider task generating it
+        self.pending_task_ids: Dict[str, str] = {}
+        self.pending_task_keys: Dict[str, str] = {}
+
+    def __getattr__(self, name):
+        generator = self.__dict__["generator"]
+        if name in ("create_video_generation_task", "query_video_generation_task") and hasattr(generator, name):
+            return getattr(self, f"_{name}")
+        return getattr(generator, name)
+
+    async def _key(self, prompt, reference_image_paths, **kwargs) -> str:
+        return await asyncio.to_thread(request_key, self.generator, prompt, reference_image_paths, **kwargs)
+
+    async def generate_single_image(
+        self,
+        prompt: str,
+        reference_image_paths: List[str] = [],
+        **kwargs,
+    ) -> ImageOutput:
+        key = await self._key(prompt, reference_image_paths, **kwargs)
+        return await self.in_flight.do(
+            key,
+            lambda: self.generator.generate_single_image(prompt=prompt, reference_image_paths=reference_image_paths, **kwargs),
+        )
+
+    async def generate_single_video(
+        self,
+        prompt: str,
+        reference_image_paths: List[str] = [],
+        **kwargs,
+    ) -> VideoOutput:
+        key = await self._key(prompt, reference_image_paths, **kwargs)
+        return await self.in_flight.do(
+            key,
+            lambda: self.generator.generate_single_video(prompt=prompt, reference_image_paths=reference_image_paths, **kwargs),
+        )
+
+    async def _create_video_generation_task(
+        self,
+        prompt: str,
+        reference_image_paths: List[str] = [],
+        **kwargs,
+    ) -> str:
+        key = await self._key(prompt, reference_image_paths, **kwargs)
+
+        async def create():
+            task_id = await self.generator.create_video_generation_task(prompt=prompt, reference_image_paths=reference_image_paths, **kwargs)
+            self.pending_task_ids[key] = task_id
+            self.pending_task_keys[task_id] = key
+            return task_id
+
+        # an identical request already submitted is waited for instead
+        task_id = self.pending_task_ids.get(key)
+        if task_id is None:
+            task_id = await self.in_flight.do(f"create:{key}", create)
+        return task_id
+
+    async def _query_video_generation_task(
+        self,
+        task_id: str,
+        submitted_at: Optional[float] = None,
+    ) -> VideoOutput:
+        try:
+            # waiters on the same task share its polling, see TaskPoller
+            return await self.generator.query_video_generation_task(task_id, submitted_at=submitted_at)
+        finally:
+            key = self.pending_task_keys.pop(task_id, None)
+            if key is not None and self.pending_task_ids.get(key) == task_id:
+                del self.pending_task_ids[key]
+
+
+# cache directory -> cache shared by every generator of the process
+_generation_caches: Dict[str, GenerationCache] = {}
+
+
+def get_generation_cache(
+    cache_dir: str,
+    max_bytes: int,
+) -> GenerationCache:
+    """
+    Get the generation cache stored in cache_dir, shared by every pipeline of the process.
+    """
+    cache_dir = os.path.abspath(cache_dir)
+    cache = _generation_caches.get(cache_dir)
+    if cache is None:
+        cache = GenerationCache(cache_dir, max_bytes)
+        _generation_caches[cache_dir] = cache
+        logging.info(f"Initialized generation cache in {cache_dir} with {len(cache._entries)} entries")
+    return cache
+
+
+def generation_cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {cache_dir: cache.stats() for cache_dir, cache in _generation_caches.items()}
@@ -0,0 +1,449 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional, Set, Tuple
+import tenacity
+from interfaces.image_output import ImageOutput
+from interfaces.video_output import VideoOutput
+
+
+def get_error_status(error: BaseException) -> Optional[int]:
+    """
+    Get the HTTP status of a provider error (google-genai, aiohttp), if any.
+    """
+    if isinstance(error, tenacity.RetryError):
+        error = error.last_attempt.exception()
+    for attr in ["status_code", "status", "code"]:
+        status = getattr(error, attr, None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def cache_identity(generator) -> Dict[str, Any]:
+    """
+    Identify a generator in the keys of the generation cache: its class and the
+    attributes naming its models. Routers and key pools define a cache_identity
+    method returning the identity of the generators they dispatch to.
+    """
+    if hasattr(type(generator), "cache_identity"):
+        return generator.cache_identity()
+    return {
+        "provider": type(generator).__name__,
+        "models": {name: value for name, value in vars(generator).items() if name.endswith("model")},
+    }
+
+
+def latency_percentile(latencies, percentile: float) -> Optional[float]:
+    if not latencies:
+        return None
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * percentile))]
+
+
+class BackendHealth:
+    """
+    Health of one backend of a router, from its most recent calls: latency, calls
+    in flight, and a cooldown during which it is avoided after being throttled (429)
+    or failing (5xx, connection errors).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        latency_window: int = 50,
+    ):
+        self.name = name
+        self.in_flight = 0
+        self.num_successes = 0
+        self.num_failures = 0
+        self.num_throttled = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.last_error: Optional[str] = None
+        self._latencies = deque(maxlen=latency_window)
+
+    def p95_latency(self) -> Optional[float]:
+        return latency_percentile(self._latencies, 0.95)
+
+    def is_cooling_down(self) -> bool:
+        return time.time() < self.cooldown_until
+
+    def record_success(self, latency: float):
+        self.num_successes += 1
+        self.consecutive_failures = 0
+        self._latencies.append(latency)
+
+    def record_failure(self, error: BaseException, cooldown: float, throttled: bool):
+        self.num_failures += 1
+        self.num_throttled += int(throttled)
+        self.consecutive_failures += 1
+        self.last_error = repr(error)
+        # repeated failures keep the backend away longer
+        self.cooldown_until = time.time() + cooldown * 2 ** min(self.consecutive_failures - 1, 5)
+
+    def stats(self) -> Dict[str, Any]:
+        p95_latency = self.p95_latency()
+        return {
+            "in_flight": self.in_flight,
+            "successes": self.num_successes,
+            "failures": self.num_failures,
+            "throttled": self.num_throttled,
+            "p95_latency_seconds": round(p95_latency, 2) if p95_latency is not None else None,
+            "cooldown_seconds": round(max(0.0, self.cooldown_until - time.time()), 1),
+            "last_error": self.last_error,
+        }
+
+
+class _GeneratorRouter:
+    def __init__(
+        self,
+        backends: List[Any],
+        names: Optional[List[str]] = None,
+        throttle_cooldown: float = 30.0,
+        error_cooldown: float = 5.0,
+    ):
+        if not backends:
+            raise ValueError("A router needs at least one backend")
+        self.backends = backends
+        names = names or [f"{type(backend).__name__}_{i}" for i, backend in enumerate(backends)]
+        self.healths = [BackendHealth(name) for name in names]
+        self.throttle_cooldown = throttle_cooldown
+        self.error_cooldown = error_cooldown
+
+    def _remaining_requests(self, idx: int, period: Optional[Literal["minute", "day"]] = None) -> Optional[int]:
+        backend = self.backends[idx]
+        # key pools count the quota of all their keys
+        if hasattr(backend, "remaining_requests"):
+            return backend.remaining_requests(period)
+        rate_limiter = getattr(backend, "rate_limiter", None)
+        return rate_limiter.remaining_requests(period) if rate_limiter is not None else None
+
+    def _score(self, idx: int) -> tuple:
+        health = self.healths[idx]
+        # backends not called yet are assumed faster than the fastest known one, so they get tried
+        known_latencies = [h.p95_latency() for h in self.healths if h.p95_latency() is not None]
+        latency = health.p95_latency()
+        if latency is None:
+            latency = min(known_latencies) / 2 if known_latencies else 1.0
+        return (
+            health.is_cooling_down(),
+            self._remaining_requests(idx) == 0,
+            latency * (1 + health.in_flight),
+        )
+
+    def _select(self, candidates: List[int]) -> int:
+        """
+        Pick the backend to call among candidates: one that is not cooling down, then
+        one with quota left, then the one with the lowest p95 latency weighted by the
+        number of its calls in flight.
+        """
+        return min(candidates, key=self._score)
+
+    def _should_fail_over(self, error: BaseException) -> bool:
+        status = get_error_status(error)
+        # other 4xx errors are the request's fault, another backend would reject it too
+        return status is None or status == 429 or status >= 500
+
+    async def _call(
+        self,
+        idx: int,
+        func: Callable[[Any], Awaitable[Any]],
+        record_latency: bool = True,
+    ):
+        """
+        Call func(backend) on a backend, recording the outcome in its health.
+        """
+        health = self.healths[idx]
+        health.in_flight += 1
+        start_time = time.perf_counter()
+        try:
+            result = await func(self.backends[idx])
+        except Exception as e:
+            if self._should_fail_over(e):
+                throttled = get_error_status(e) == 429
+                health.record_failure(e, self.throttle_cooldown if throttled else self.error_cooldown, throttled)
+            raise
+        finally:
+            health.in_flight -= 1
+        if record_latency:
+            health.record_success(time.perf_counter() - start_time)
+        return result
+
+    def cache_identity(self) -> Dict[str, Any]:
+        # any backend may serve a request, so outputs are shared by routers with the same backends
+        return {
+            "provider": type(self).__name__,
+            "models": [cache_identity(backend) for backend in self.backends],
+        }
+
+    def health(self) -> Dict[str, Dict[str, Any]]:
+        health = {}
+        for idx, backend_health in enumerate(self.healths):
+            health[backend_health.name] = {**backend_health.stats(), "remaining_requests": self._remaining_requests(idx)}
+            if hasattr(self.backends[idx], "health"):
+                health[backend_health.name]["keys"] = self.backends[idx].health()
+        return health
+
+
+class ImageGeneratorRouter(_GeneratorRouter):
+    """
+    Image generator spreading requests over interchangeable backends (any image
+    generator of tools/), and failing over to the next one when a backend is
+    throttled or fails.
+
+    With hedging enabled, a request still running past a percentile of the recent
+    latencies gets a duplicate, on another backend if possible; the first result
+    wins and the other request is cancelled.
+    """
+
+    def __init__(
+        self,
+        backends: List[Any],
+        names: Optional[List[str]] = None,
+        throttle_cooldown: float = 30.0,
+        error_cooldown: float = 5.0,
+        hedge_percentile: Optional[float] = None,
+        max_hedge_ratio: float = 0.1,
+        min_hedge_samples: int = 10,
+    ):
+        """
+        Initialize the router.
+
+        Args:
+            backends: Image generators to route between. The rate_limiter attribute of
+                      a backend, if any, tells how much quota it has left.
+            names: Names of the backends in the health report.
+            throttle_cooldown: Seconds a backend is avoided after a 429.
+            error_cooldown: Seconds a backend is avoided after a 5xx or connection error.
+            hedge_percentile: Percentile of the recent latencies (e.g. 0.9) after which a
+                              request is hedged. If None, requests are never hedged.
+            max_hedge_ratio: Maximum number of hedges per request, so that hedging only
+                             spends a bounded share of the rate limits.
+            min_hedge_samples: Number of latencies needed before hedging.
+        """
+        super().__init__(backends, names, throttle_cooldown, error_cooldown)
+        self.hedge_percentile = hedge_percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_hedge_samples = min_hedge_samples
+        self._latencies = deque(maxlen=200)
+        self.num_requests = 0
+        self.num_hedges = 0
+        self.num_hedge_wins = 0
+
+    async def _generate(
+        self,
+        prompt: str,
+        reference_image_paths: List[str],
+        kwargs: Dict[str, Any],
+        tried: Set[int],
+        avoid: Set[int] = frozenset(),
+    ) -> ImageOutput:
+        while True:
+            untried = [idx for idx in range(len(self.backends)) if idx not in tried]
+            idx = self._select([idx for idx in untried if idx not in avoid] or untried)
+            tried.add(idx)
+            try:
+                start_time = time.perf_counter()
+                image_output = await self._call(idx, lambda backend: backend.generate_single_image(prompt=prompt, reference_image_paths=reference_image_paths, **kwargs))
+                self._latencies.append(time.perf_counter() - start_time)
+                return image_output
+            except Exception as e:
+                if not self._should_fail_over(e) or len(tried) == len(self.backends):
+                    raise
+                logging.warning(f"Image backend {self.healths[idx].name} failed ({e!r}), failing over...")
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_percentile is None or len(self._latencies) < self.min_hedge_samples:
+            return None
+        return latency_percentile(self._latencies, self.hedge_percentile)
+
+    def _may_hedge(self) -> bool:
+        if self.num_hedges + 1 > self.max_hedge_ratio * self.num_requests:
+            return False
+        # a hedge waiting for quota would not come back sooner
+        return any(self._remaining_requests(idx) != 0 for idx in range(len(self.backends)))
+
+    async def generate_single_image(
+        self,
+        prompt: str,
+        reference_image_paths: List[str] = [],
+        **kwargs,
+    ) -> ImageOutput:
+        self.num_requests += 1
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None:
+            return await self._generate(prompt, reference_image_paths, kwargs, tried=set())
+
+        primary_backends: Set[int] = set()
+        primary = asyncio.create_task(self._generate(prompt, reference_image_paths, kwargs, tried=primary_backends))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done and self._may_hedge():
+                self.num_hedges += 1
+                logging.info(f"Image request running for more than {hedge_delay:.1f}s, hedging...")
+                hedge = asyncio.create_task(self._generate(prompt, reference_image_paths, kwargs, tried=set(), avoid=set(primary_backends)))
+                tasks.add(hedge)
+                while tasks:
+                    done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    winner = next((task for task in done if task.exception() is None), None)
+                    if winner is not None:
+                        self.num_hedge_wins += int(winner is hedge)
+                        return winner.result()
+                # both failed
+            return await primary
+        finally:
+            for task in tasks:
+                task.cancel()
+            # the loser releases its backend slot before the request returns
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def hedge_stats(self) -> Dict[str, Any]:
+        hedge_delay = self._hedge_delay()
+        return {
+            "requests": self.num_requests,
+            "hedges": self.num_hedges,
+            "hedge_wins": self.num_hedge_wins,
+            "hedge_delay_seconds": round(hedge_delay, 2) if hedge_delay is not None else None,
+        }
+
+
+class VideoGeneratorRouter(_GeneratorRouter):
+    """
+    Video generator dispatching shots over several backends (any video generator
+    of tools/ with create_video_generation_task and query_video_generation_task)
+    by capability, daily quota left and number of tasks in flight. A task failing
+    or expiring is submitted again to another capable backend.
+
+    Task IDs are prefixed with the name of their backend, so a task recorded in a
+    ledger can be reattached to by a router with the same backends.
+    """
+
+    CAPABILITIES = ["t2v", "ff2v", "flf2v"]  # by number of reference images
+
+    def __init__(
+        self,
+        backends: List[Any],
+        names: Optional[List[str]] = None,
+        capabilities: Optional[List[Optional[List[str]]]] = None,
+        throttle_cooldown: float = 60.0,
+        error_cooldown: float = 10.0,
+    ):
+        """
+        Initialize the router.
+
+        Args:
+            backends: Video generators to route between. The rate_limiter attribute of
+                      a backend, if any, tells how much daily quota it has left.
+            names: Names of the backends in the health report and the task IDs.
+            capabilities: For each backend, the generations it supports among t2v
+                          (text), ff2v (first frame) and flf2v (first and last frame).
+                          By default, those it has a model for (t2v_model, ...).
+            throttle_cooldown: Seconds a backend is avoided after a 429.
+            error_cooldown: Seconds a backend is avoided after a failure.
+        """
+        super().__init__(backends, names, throttle_cooldown, error_cooldown)
+        capabilities = capabilities or [None] * len(backends)
+        self.capabilities = [
+            set(backend_capabilities) if backend_capabilities is not None
+            else {capability for capability in self.CAPABILITIES if getattr(backend, f"{capability}_model", None)}
+            for backend, backend_capabilities in zip(backends, capabilities)
+        ]
+        # routed task ID -> request and backends tried, for the tasks submitted by this router
+        self._requests: Dict[str, Tuple[str, List[str], Dict[str, Any], Set[int]]] = {}
+
+    def _score(self, idx: int) -> tuple:
+        health = self.healths[idx]
+        remaining_today = self._remaining_requests(idx, period="day")
+        return (
+            health.is_cooling_down(),
+            self._remaining_requests(idx) == 0,
+            health.in_flight,
+            -(remaining_today if remaining_today is not None else float("inf")),
+        )
+
+    def _capable_backends(self, num_reference_images: int) -> List[int]:
+        if num_reference_images > len(self.CAPABILITIES) - 1:
+            raise ValueError("The number of reference images must be no more than 2")
+        capability = self.CAPABILITIES[num_reference_images]
+        capable = [idx for idx, capabilities in enumerate(self.capabilities) if capability in capabilities]
+        if not capable:
+            raise ValueError(f"No video generator backend supports {capability}")
+        return capable
+
+    async def _submit(
+        self,
+        prompt: str,
+        reference_image_paths: List[str],
+        kwargs: Dict[str, Any],
+        tried: Set[int],
+    ) -> Tuple[int, str]:
+        while True:
+            candidates = [idx for idx in self._capable_backends(len(reference_image_paths)) if idx not in tried]
+            if not candidates:
+                raise RuntimeError("Every capable video generator backend failed")
+            idx = self._select(candidates)
+            tried.add(idx)
+            try:
+                task_id = await self._call(
+                    idx,
+                    lambda backend: backend.create_video_generation_task(prompt=prompt, reference_image_paths=reference_image_paths, **kwargs),
+                    record_latency=False,
+                )
+                return idx, task_id
+            except Exception as e:
+                if not self._should_fail_over(e):
+                    raise
+                logging.warning(f"Video backend {self.healths[idx].name} failed to create a task ({e!r}), failing over...")
+
+    async def generate_single_video(
+        self,
+        prompt: str,
+        reference_image_paths: List[str] = [],
+        **kwargs,
+    ) -> VideoOutput:
+        task_id = await self.create_video_generation_task(prompt, reference_image_paths, **kwargs)
+        return await self.query_video_generation_task(task_id)
+
+    async def create_video_generation_task(
+        self,
+        prompt: str,
+        reference_image_paths: List[str] = [],
+        **kwargs,
+    ) -> str:
+        tried: Set[int] = set()
+        idx, task_id = await self._submit(prompt, reference_image_paths, kwargs, tried)
+        routed_task_id = f"{self.healths[idx].name}:{task_id}"
+        self._requests[routed_task_id] = (prompt, reference_image_paths, kwargs, tried)
+        return routed_task_id
+
+    async def query_video_generation_task(
+        self,
+        task_id: str,
+        submitted_at: Optional[float] = None,
+    ) -> VideoOutput:
+        name, _, backend_task_id = task_id.partition(":")
+        idx = next((idx for idx, health in enumerate(self.healths) if health.name == name), None)
+        if idx is None:
+            raise RuntimeError(f"No video generator backend named {name} for task {task_id}")
+
+        request = self._requests.get(task_id)
+        try:
+            while True:
+                try:
+                    return await self._call(
+                        idx,
+                        lambda backend: backend.query_video_generation_task(backend_task_id, submitted_at=submitted_at),
+                    )
+                except Exception as e:
+                    # tasks submitted by an earlier process cannot be submitted again from here
+                    if request is None or not self._should_fail_over(e):
+                        raise
+                    logging.warning(f"Video task {backend_task_id} on {self.healths[idx].name} failed ({e!r}), rerouting...")
+                    prompt, reference_image_paths, kwargs, tried = request
+                    idx, backend_task_id = await self._submit(prompt, reference_image_paths, kwargs, tried)
+                    submitted_at = None
+        finally:
+            self._requests.pop(task_id, None)
@@ -1,12 +1,13 @@
 # https://yunwu.apifox.cn/api-347960869
 
 import logging
-import aiohttp
+from tools.http_client import get_http_session
 from typing import List, Optional
 from tenacity import retry, stop_after_attempt
 from utils.retry import after_func
-from utils.image import image_path_to_b64
+from utils.image import aimage_path_to_payload
 from interfaces.image_output import ImageOutput
+from utils.rate_limiter import RateLimiter
 
 
 class ImageGeneratorDoubaoSeedreamYunwuAPI:
@@ -14,11 +15,12 @@ class ImageGeneratorDoubaoSeedreamYunwuAPI:
         self,
         api_key: str,
         model: str = "doubao-seedream-4-0-250828",
-
+        rate_limiter: Optional[RateLimiter] = None,
     ):
         self.api_key = api_key
         self.base_url = "https://yunwu.ai/v1/images/generations"
         self.model = model
+        self.rate_limiter = rate_limiter
 
 
     @retry(stop=stop_after_attempt(3), after=after_func)
@@ -35,8 +37,12 @@ class ImageGeneratorDoubaoSeedreamYunwuAPI:
 
         logging.info(f"Calling {self.model} to generate image...")
 
+        # Apply rate limiting if configured
+        if self.rate_limiter:
+            await self.rate_limiter.acquire()
+
         image = [
-            image_path_to_b64(path, mime=True) for path in reference_image_paths
+            await aimage_path_to_payload(path, tier="generator") for path in reference_image_paths
         ]
 
         payload = {
@@ -58,9 +64,8 @@ class ImageGeneratorDoubaoSeedreamYunwuAPI:
         }
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.base_url, json=payload, headers=headers) as response:
-                    response_json = await response.json()
+            async with get_http_session().post(self.base_url, json=payload, headers=headers) as response:
+                response_json = await response.json()
         except Exception as e:
             logging.error(f"Error occurred while generating image: {e}")
             raise e
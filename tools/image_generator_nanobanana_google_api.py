@@ -2,7 +2,6 @@
 
 import logging
 import asyncio
-from PIL import Image
 from typing import List, Optional
 from google import genai
 from google.genai import types
@@ -10,6 +9,7 @@ from google.genai.errors import ClientError
 from tenacity import retry, stop_after_attempt
 from interfaces.image_output import ImageOutput
 from utils.retry import after_func
+from utils.asset_cache import get_reference_asset_cache
 from utils.rate_limiter import RateLimiter
 
 
@@ -44,7 +44,10 @@ class ImageGeneratorNanobananaGoogleAPI:
         if self.rate_limiter:
             await self.rate_limiter.acquire()
 
-        reference_images = [Image.open(path) for path in reference_image_paths]
+        reference_images = []
+        for path in reference_image_paths:
+            data, mime_type = await get_reference_asset_cache().aget_payload_bytes(path, tier="generator")
+            reference_images.append(types.Part.from_bytes(data=data, mime_type=mime_type))
 
         # Retry logic for rate limit errors
         max_retries = 3
@@ -71,17 +74,18 @@ class ImageGeneratorNanobananaGoogleAPI:
                 else:
                     raise
 
-        image = None
+        image_output = None
         text = ""
         for part in response.candidates[0].content.parts:
             if part.text is not None:
                 text += part.text
             elif part.inline_data is not None:
-                image = part.as_image()
+                # kept encoded, saved as sent without a decode and PNG re-encode
+                image_output = ImageOutput.from_bytes(part.inline_data.data, part.inline_data.mime_type)
 
-        if image is None:
+        if image_output is None:
             logging.error(f"No image generated. The response text is: {text}")
             raise ValueError("No image generated")
 
-        return ImageOutput(fmt="pil", ext="png", data=image)
+        return image_output
 
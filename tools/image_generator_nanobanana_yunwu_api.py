@@ -1,13 +1,14 @@
 # https://ai.google.dev/gemini-api/docs/image-generation?hl=zh-cn
 
 import logging
-from PIL import Image
 from typing import List, Optional
 from google import genai
 from google.genai import types
 from tenacity import retry, stop_after_attempt
 from interfaces.image_output import ImageOutput
 from utils.retry import after_func
+from utils.asset_cache import get_reference_asset_cache
+from utils.rate_limiter import RateLimiter
 
 
 class ImageGeneratorNanobananaYunwuAPI:
@@ -15,6 +16,7 @@ class ImageGeneratorNanobananaYunwuAPI:
         self,
         api_key: str,
         model: str = "gemini-2.5-flash-image-preview",
+        rate_limiter: Optional[RateLimiter] = None,
     ):
         self.client = genai.Client(
             api_key=api_key,
@@ -24,6 +26,7 @@ class ImageGeneratorNanobananaYunwuAPI:
             ),
         )
         self.model = model
+        self.rate_limiter = rate_limiter
 
 
     @retry(stop=stop_after_attempt(3), after=after_func)
@@ -40,7 +43,14 @@ class ImageGeneratorNanobananaYunwuAPI:
 
         logging.info(f"Calling {self.model} to generate image...")
 
-        reference_images = [Image.open(path) for path in reference_image_paths]
+        # Apply rate limiting if configured
+        if self.rate_limiter:
+            await self.rate_limiter.acquire()
+
+        reference_images = []
+        for path in reference_image_paths:
+            data, mime_type = await get_reference_asset_cache().aget_payload_bytes(path, tier="generator")
+            reference_images.append(types.Part.from_bytes(data=data, mime_type=mime_type))
 
         response = await self.client.aio.models.generate_content(
             model=self.model,
@@ -53,17 +63,18 @@ class ImageGeneratorNanobananaYunwuAPI:
             ),
         )
 
-        image = None
+        image_output = None
         text = ""
         for part in response.candidates[0].content.parts:
             if part.text is not None:
                 text += part.text
             elif part.inline_data is not None:
-                image = part.as_image()
+                # kept encoded, saved as sent without a decode and PNG re-encode
+                image_output = ImageOutput.from_bytes(part.inline_data.data, part.inline_data.mime_type)
 
-        if image is None:
+        if image_output is None:
             logging.error(f"No image generated. The response text is: {text}")
             raise ValueError(f"Error occurred while generating image.")
 
-        return ImageOutput(fmt="pil", ext="png", data=image)
+        return image_output
 
@@ -1,6 +1,6 @@
 import requests
 from typing import List
-import aiohttp
+from tools.http_client import get_http_session
 import asyncio
 from tenacity import retry, stop_after_attempt
 import logging
@@ -47,9 +47,8 @@ class RerankerBgeSiliconapi:
             'Content-Type': 'application/json'
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as resp:
-                response = await resp.json()
+        async with get_http_session().post(url, json=payload, headers=headers) as resp:
+            response = await resp.json()
 
 
         """
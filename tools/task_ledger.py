@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+import aiohttp
+from interfaces.video_output import VideoOutput
+from tools.http_client import get_http_session
+
+
+def request_fingerprint(
+    provider: str,
+    prompt: str,
+    reference_image_paths: List[str],
+    **kwargs,
+) -> str:
+    """
+    Fingerprint a generation request by its provider, parameters and the content
+    (not the path) of its reference images.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(json.dumps({"provider": provider, "prompt": prompt, "kwargs": kwargs}, sort_keys=True, default=str).encode("utf-8"))
+    for path in reference_image_paths:
+        with open(path, "rb") as f:
+            hasher.update(hashlib.sha256(f.read()).digest())
+    return hasher.hexdigest()
+
+
+class TaskLedger:
+    """
+    JSON file recording the provider task generating an artifact: its ID, the
+    fingerprint of the request and the time it was submitted, then the URL of
+    its result. It is written atomically, so a crash leaves either the previous
+    or the new record.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Ignoring unreadable task ledger {self.path}: {e}")
+            return None
+
+    def save(self, entry: Dict[str, Any]):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+async def is_url_valid(url: str) -> bool:
+    """
+    Check whether a result URL can still be downloaded, fetching a single byte.
+    """
+    try:
+        async with get_http_session().get(url, headers={"Range": "bytes=0-0"}) as response:
+            return response.status in (200, 206)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        return False
+
+
+async def generate_single_video_resumable(
+    video_generator,
+    task_ledger: Optional[TaskLedger],
+    prompt: str,
+    reference_image_paths: List[str],
+    **kwargs,
+) -> VideoOutput:
+    """
+    Generate a video, recording the provider task in the ledger.
+
+    When the ledger holds a task for the same request, its result is downloaded
+    from the recorded URL if still valid, or the task is reattached to. A new task
+    is only submitted when there is none, or it failed or expired.
+
+    Args:
+        video_generator: Video generator. Generators without create_video_generation_task
+                         and query_video_generation_task are called directly.
+        task_ledger: Ledger of the video, or None to not record the task.
+        prompt: Prompt of the video.
+        reference_image_paths: Paths of the first (and last) frame.
+
+    Returns:
+        The generated video.
+    """
+    if task_ledger is None or not hasattr(video_generator, "create_video_generation_task"):
+        return await video_generator.generate_single_video(prompt=prompt, reference_image_paths=reference_image_paths, **kwargs)
+
+    provider = type(video_generator).__name__
+    fingerprint = await asyncio.to_thread(request_fingerprint, provider, prompt, reference_image_paths, **kwargs)
+
+    async def record_result(entry: Dict[str, Any], video_output: VideoOutput):
+        # a url needing credentials is not recorded, the task is reattached to instead
+        if video_output.fmt == "url" and not video_output.headers:
+            await asyncio.to_thread(task_ledger.save, {**entry, "video_url": video_output.data})
+
+    entry = task_ledger.load()
+    if entry is not None and entry.get("fingerprint") == fingerprint:
+        if entry.get("video_url") and await is_url_valid(entry["video_url"]):
+            logging.info(f"Reusing the result of {provider} task {entry['task_id']} recorded in {task_ledger.path}")
+            return VideoOutput(fmt="url", ext="mp4", data=entry["video_url"])
+
+        logging.info(f"Reattaching to {provider} task {entry['task_id']} recorded in {task_ledger.path}")
+        try:
+            video_output = await video_generator.query_video_generation_task(entry["task_id"], submitted_at=entry["submitted_at"])
+        except Exception as e:
+            logging.warning(f"Could not reattach to {provider} task {entry['task_id']}: {e}. Submitting a new task...")
+        else:
+            await record_result(entry, video_output)
+            return video_output
+
+    submitted_at = time.time()
+    task_id = await video_generator.create_video_generation_task(prompt=prompt, reference_image_paths=reference_image_paths, **kwargs)
+    entry = {
+        "provider": provider,
+        "task_id": task_id,
+        "fingerprint": fingerprint,
+        "submitted_at": submitted_at,
+    }
+    await asyncio.to_thread(task_ledger.save, entry)
+
+    video_output = await video_generator.query_video_generation_task(task_id, submitted_at=submitted_at)
+    await record_result(entry, video_output)
+    return video_output
@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Literal, NamedTuple, Optional
+
+
+class TaskStatus(NamedTuple):
+    """
+    Status of a long-running provider task, as returned by a status query.
+    """
+    state: Literal["pending", "succeeded", "failed"]
+    result: Any = None
+    error: Optional[str] = None
+
+
+class _PendingTask:
+    def __init__(
+        self,
+        task_id: Hashable,
+        future: asyncio.Future,
+        submitted_at: float,
+        deadline: Optional[float],
+    ):
+        self.task_id = task_id
+        self.future = future
+        self.submitted_at = submitted_at
+        self.deadline = deadline
+        self.next_poll_at = submitted_at
+        self.backoff = 0.0
+        self.num_errors = 0
+        # callers waiting for the task, it is given up once none is left
+        self.num_waiters = 0
+
+
+class TaskPoller:
+    """
+    Poll the status of every outstanding task of a provider from one loop.
+
+    Callers submit a task to the provider themselves and then wait for its result
+    here. Poll times adapt to the completion times observed so far: a task is not
+    polled before the fastest tasks usually finish, then polled densely around
+    the usual completion time, and with a growing interval once it is late. Before
+    anything has completed, the interval grows from min_interval to max_interval.
+    When the provider can query several tasks at once, every task due is queried
+    with a single call.
+    """
+
+    def __init__(
+        self,
+        query_func: Optional[Callable[[Hashable], Awaitable[TaskStatus]]] = None,
+        batch_query_func: Optional[Callable[[List[Hashable]], Awaitable[Dict[Hashable, TaskStatus]]]] = None,
+        min_interval: float = 1.0,
+        max_interval: float = 30.0,
+        max_concurrent_queries: int = 8,
+        max_query_errors: int = 5,
+        history_size: int = 50,
+        name: str = "",
+    ):
+        """
+        Initialize the poller.
+
+        Args:
+            query_func: Query the status of a single task.
+            batch_query_func: Query the status of several tasks at once. Used instead
+                              of query_func when given.
+            min_interval: Minimum number of seconds between two polls of a task.
+            max_interval: Maximum number of seconds between two polls of a task.
+            max_concurrent_queries: Maximum number of single-task queries in flight.
+            max_query_errors: Number of consecutive failed queries after which a task is
+                              given up, e.g. when the provider does not know the task.
+            history_size: Number of most recent completion times the poll schedule is based on.
+            name: Name of the provider, used in the logs.
+        """
+        if query_func is None and batch_query_func is None:
+            raise ValueError("TaskPoller needs a query_func or a batch_query_func")
+        self.query_func = query_func
+        self.batch_query_func = batch_query_func
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_concurrent_queries = max_concurrent_queries
+        self.max_query_errors = max_query_errors
+        self.name = name
+
+        self._completion_times = deque(maxlen=history_size)
+        self._tasks: Dict[Hashable, _PendingTask] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._num_queries = 0
+
+    def stats(self) -> Dict[str, Any]:
+        completion_times = sorted(self._completion_times)
+        return {
+            "outstanding": len(self._tasks),
+            "queries": self._num_queries,
+            "completed": len(completion_times),
+            "p50_completion_seconds": round(completion_times[len(completion_times) // 2], 2) if completion_times else None,
+        }
+
+    async def wait(
+        self,
+        task_id: Hashable,
+        timeout: Optional[float] = None,
+        submitted_at: Optional[float] = None,
+    ) -> Any:
+        """
+        Wait for a task to finish.
+
+        Args:
+            task_id: Identifier of the task at the provider.
+            timeout: Seconds after submission after which the task is given up.
+            submitted_at: time.time() at which the task was submitted, when it is
+                          older than this call (e.g. a task resumed after a restart).
+
+        Returns:
+            The result of the succeeded task.
+
+        Raises:
+            RuntimeError: The task failed, or could not be queried max_query_errors times in a row.
+            TimeoutError: The task did not finish before its timeout.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # tasks waited for on another (closed) loop cannot be resumed here
+            self._loop = loop
+            self._tasks = {}
+            self._runner = None
+            self._wakeup = asyncio.Event()
+
+        task = self._tasks.get(task_id)
+        if task is None:
+            now = time.time()
+            submitted_at = submitted_at if submitted_at is not None else now
+            task = _PendingTask(
+                task_id=task_id,
+                future=loop.create_future(),
+                submitted_at=submitted_at,
+                deadline=submitted_at + timeout if timeout is not None else None,
+            )
+            task.next_poll_at = now + self._next_interval(task, now)
+            self._tasks[task_id] = task
+
+            if self._runner is None or self._runner.done():
+                self._runner = asyncio.create_task(self._run())
+            self._wakeup.set()
+
+        task.num_waiters += 1
+        try:
+            return await asyncio.shield(task.future)
+        finally:
+            task.num_waiters -= 1
+            if task.num_waiters == 0 and not task.future.done():
+                # the last waiter was cancelled, stop polling
+                task.future.cancel()
+                if self._tasks.get(task_id) is task:
+                    del self._tasks[task_id]
+
+    def _next_interval(self, task: _PendingTask, now: float) -> float:
+        elapsed = now - task.submitted_at
+        if len(self._completion_times) >= 3:
+            completion_times = sorted(self._completion_times)
+            fast = completion_times[int(len(completion_times) * 0.1)]
+            slow = completion_times[min(len(completion_times) - 1, int(len(completion_times) * 0.9))]
+            if elapsed < fast:
+                # nothing usually finishes before this, sleep until then
+                interval = fast - elapsed
+            elif elapsed < slow:
+                # most tasks finish now, poll densely
+                interval = (slow - fast) / 10
+            else:
+                # the task is late, back off
+                task.backoff = min(self.max_interval, max(self.min_interval, task.backoff * 1.5))
+                interval = task.backoff
+        else:
+            task.backoff = min(self.max_interval, max(self.min_interval, task.backoff * 1.5))
+            interval = task.backoff
+        interval = min(self.max_interval, max(self.min_interval, interval))
+        if task.deadline is not None:
+            interval = min(interval, max(0.0, task.deadline - now))
+        return interval
+
+    async def _query(self, task_ids: List[Hashable]) -> Dict[Hashable, TaskStatus]:
+        self._num_queries += 1 if self.batch_query_func is not None else len(task_ids)
+        if self.batch_query_func is not None:
+            return await self.batch_query_func(task_ids)
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_queries)
+
+        async def query(task_id):
+            async with semaphore:
+                return task_id, await self.query_func(task_id)
+
+        results = await asyncio.gather(*[query(task_id) for task_id in task_ids], return_exceptions=True)
+        statuses = {}
+        for task_id, result in zip(task_ids, results):
+            if isinstance(result, Exception):
+                logging.warning(f"Error occurred while querying {self.name} task {task_id}: {result}")
+            else:
+                statuses[task_id] = result[1]
+        return statuses
+
+    async def _run(self):
+        while self._tasks:
+            now = time.time()
+            due_task_ids = [task_id for task_id, task in self._tasks.items() if task.next_poll_at <= now]
+            if not due_task_ids:
+                next_poll_at = min(task.next_poll_at for task in self._tasks.values())
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=next_poll_at - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                statuses = await self._query(due_task_ids)
+            except Exception as e:
+                logging.warning(f"Error occurred while querying {self.name} tasks: {e}")
+                statuses = {}
+
+            now = time.time()
+            for task_id in due_task_ids:
+                task = self._tasks.get(task_id)
+                if task is None:
+                    continue
+                status = statuses.get(task_id)
+                if status is not None and status.state == "succeeded":
+                    self._completion_times.append(now - task.submitted_at)
+                    task.future.set_result(status.result)
+                elif status is not None and status.state == "failed":
+                    task.future.set_exception(RuntimeError(f"{self.name} task {task_id} failed: {status.error}"))
+                elif status is None and task.num_errors + 1 >= self.max_query_errors:
+                    task.future.set_exception(RuntimeError(f"{self.name} task {task_id} could not be queried"))
+                elif task.deadline is not None and now >= task.deadline:
+                    task.future.set_exception(TimeoutError(f"{self.name} task {task_id} did not finish in time"))
+                else:
+                    task.num_errors = task.num_errors + 1 if status is None else 0
+                    task.next_poll_at = now + self._next_interval(task, now)
+                    continue
+                del self._tasks[task_id]
+
+
+# (provider, account) -> poller shared by every tool instance of the provider
+_task_pollers: Dict[Hashable, TaskPoller] = {}
+
+
+def get_task_poller(
+    key: Hashable,
+    **kwargs,
+) -> TaskPoller:
+    """
+    Get the poller shared by every tool instance polling the same provider account,
+    creating it with kwargs (see TaskPoller) on first use.
+    """
+    poller = _task_pollers.get(key)
+    if poller is None:
+        poller = TaskPoller(**kwargs)
+        _task_pollers[key] = poller
+    return poller
+
+
+def task_poller_stats() -> Dict[str, Dict[str, Any]]:
+    return {poller.name: poller.stats() for poller in _task_pollers.values()}
@@ -1,9 +1,12 @@
 import logging
-from typing import List, Literal
+from typing import List, Literal, Optional
 import asyncio
-import aiohttp
+from tools.http_client import get_http_session
+from tools.generator_router import get_error_status
+from tools.task_poller import TaskStatus, get_task_poller
 from interfaces.video_output import VideoOutput
-from utils.image import image_path_to_b64
+from utils.image import aimage_path_to_payload
+from utils.rate_limiter import RateLimiter
 
 
 class VideoGeneratorDoubaoSeedanceYunwuAPI:
@@ -13,11 +16,20 @@ class VideoGeneratorDoubaoSeedanceYunwuAPI:
         t2v_model: str = "doubao-seedance-1-0-lite-t2v-250428",
         ff2v_model: str = "doubao-seedance-1-0-lite-i2v-250428",
         flf2v_model: str = "doubao-seedance-1-0-lite-i2v-250428",
+        task_timeout: float = 1800,
+        rate_limiter: Optional[RateLimiter] = None,
     ):
         self.api_key = api_key
         self.t2v_model = t2v_model
         self.ff2v_model = ff2v_model
         self.flf2v_model = flf2v_model
+        self.rate_limiter = rate_limiter
+        self.task_timeout = task_timeout
+        self.task_poller = get_task_poller(
+            ("doubao_seedance_yunwu", api_key),
+            query_func=self.query_video_generation_task_status,
+            name="Seedance (yunwu)",
+        )
 
 
     async def create_video_generation_task(
@@ -50,6 +62,10 @@ class VideoGeneratorDoubaoSeedanceYunwuAPI:
 
         logging.info(f"Calling {model} to generate video...")
 
+        # Apply rate limiting if configured
+        if self.rate_limiter:
+            await self.rate_limiter.acquire()
+
         url = "https://yunwu.ai/volc/v1/contents/generations/tasks"
 
 
@@ -64,7 +80,7 @@ class VideoGeneratorDoubaoSeedanceYunwuAPI:
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": image_path_to_b64(reference_image_paths[0])
+                        "url": await aimage_path_to_payload(reference_image_paths[0], tier="generator")
                     },
                     "role": "first_frame",
                 }
@@ -74,7 +90,7 @@ class VideoGeneratorDoubaoSeedanceYunwuAPI:
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": image_path_to_b64(reference_image_paths[1])
+                        "url": await aimage_path_to_payload(reference_image_paths[1], tier="generator")
                     },
                     "role": "last_frame",
                 }
@@ -90,18 +106,27 @@ class VideoGeneratorDoubaoSeedanceYunwuAPI:
             'Content-Type': 'application/json'
         }
 
-        while True:
+        # Retry logic for rate limit and server errors, then let a router fail over
+        max_retries = 3
+        retry_delay = 5
+
+        for attempt in range(max_retries):
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, headers=headers, json=payload) as response:
-                        response_json = await response.json()
-                        logging.debug(f"Response: {response_json}")
-                        task_id = response_json["id"]
+                async with get_http_session().post(url, headers=headers, json=payload) as response:
+                    response.raise_for_status()
+                    response_json = await response.json()
+                    logging.debug(f"Response: {response_json}")
+                    task_id = response_json["id"]
+                break
             except Exception as e:
-                logging.error(f"Error occurred while creating video generation task.\nRetrying in 1 seconds...")
-                await asyncio.sleep(1)
-                continue
-            break
+                status = get_error_status(e)
+                # other 4xx errors are the request's fault, a retry would be rejected too
+                if attempt == max_retries - 1 or (status is not None and 400 <= status < 500 and status != 429):
+                    logging.error(f"Error occurred while creating video generation task: {e!r}")
+                    raise
+                wait_time = retry_delay * (2 ** attempt)
+                logging.warning(f"Error occurred while creating video generation task: {e!r}. Retrying in {wait_time}s... (attempt {attempt + 1}/{max_retries})")
+                await asyncio.sleep(wait_time)
 
         logging.info(f"Video generation task created successfully. Task ID: {task_id}")
         return task_id
@@ -109,46 +134,45 @@ class VideoGeneratorDoubaoSeedanceYunwuAPI:
     async def query_video_generation_task(
         self,
         task_id: str,
-    ) -> str:
+        submitted_at: Optional[float] = None,
+    ) -> VideoOutput:
         """
-        Query the video generation task until completion and return the video URL.
+        Wait for the video generation task to be completed.
         
         Args:
             task_id: Task ID to query
+            submitted_at: time.time() at which the task was created, when it was
+                          created by an earlier run
             
         Returns:
-            Video URL string
+            VideoOutput containing the video URL
+        """
+        video_url = await self.task_poller.wait(task_id, timeout=self.task_timeout, submitted_at=submitted_at)
+        logging.info(f"Video generation completed successfully. Video URL: {video_url}")
+        return VideoOutput(fmt="url", ext="mp4", data=video_url)
+
+    async def query_video_generation_task_status(
+        self,
+        task_id: str,
+    ) -> TaskStatus:
+        """
+        Query the status of the video generation task once.
         """
         url = f"https://yunwu.ai/volc/v1/contents/generations/tasks/{task_id}"
         headers = {
             'Authorization': f'Bearer {self.api_key}',
         }
-
-        while True:
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url, headers=headers) as response:
-                        response_json = await response.json()
-
-            except Exception as e:
-                logging.error(f"Error occurred while querying video generation task: {e}. Retrying in 1 seconds...")
-                await asyncio.sleep(1)
-                continue
-
-            status = response_json["status"]
-            if status == "succeeded":
-                video_url = response_json["content"]["video_url"]
-                logging.info(f"Video generation completed successfully. Video URL: {video_url}")
-                break
-            elif status == "failed":
-                logging.error(f"Video generation failed. Response: {response_json}")
-                raise ValueError("Video generation failed.")
-            else:
-                logging.info(f"Video generation is still in progress. Checking again in 2 seconds...")
-                await asyncio.sleep(2)
-                continue
-
-        return video_url
+        async with get_http_session().get(url, headers=headers) as response:
+            response_json = await response.json()
+
+        status = response_json["status"]
+        if status == "succeeded":
+            return TaskStatus(state="succeeded", result=response_json["content"]["video_url"])
+        elif status == "failed":
+            logging.error(f"Video generation failed. Response: {response_json}")
+            return TaskStatus(state="failed", error=str(response_json))
+        else:
+            return TaskStatus(state="pending")
 
     async def generate_single_video(
         self,
@@ -173,6 +197,5 @@ class VideoGeneratorDoubaoSeedanceYunwuAPI:
             VideoOutput containing the video URL
         """
         task_id = await self.create_video_generation_task(prompt, reference_image_paths, resolution, aspect_ratio, fps, duration)
-        video_url = await self.query_video_generation_task(task_id)
-        return VideoOutput(fmt="url", ext="mp4", data=video_url)
+        return await self.query_video_generation_task(task_id)
 
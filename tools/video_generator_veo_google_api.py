@@ -1,15 +1,22 @@
 import logging
+import mimetypes
 from typing import List, Optional
 import asyncio
 from google import genai
 from google.genai import types
 from google.genai.errors import ClientError
 from interfaces.video_output import VideoOutput
+from tools.task_poller import TaskStatus, get_task_poller
 from utils.rate_limiter import RateLimiter
+from utils.asset_cache import get_reference_asset_cache
 
 # https://ai.google.dev/gemini-api/docs/video-generation?hl=zh-cn
 
 
+def load_reference_image(path: str) -> types.Image:
+    return types.Image(image_bytes=get_reference_asset_cache().get_bytes(path), mime_type=mimetypes.guess_type(path)[0])
+
+
 class VideoGeneratorVeoGoogleAPI:
     def __init__(
         self,
@@ -18,16 +25,23 @@ class VideoGeneratorVeoGoogleAPI:
         ff2v_model: str = "veo-3.1-generate-preview",
         flf2v_model: str = "veo-3.1-generate-preview",
         rate_limiter: Optional[RateLimiter] = None,
+        task_timeout: float = 1800,
     ):
         self.api_key = api_key
         self.t2v_model = t2v_model
         self.ff2v_model = ff2v_model
         self.flf2v_model = flf2v_model
         self.rate_limiter = rate_limiter
+        self.task_timeout = task_timeout
 
         self.client = genai.Client(
             api_key=api_key,
         )
+        self.task_poller = get_task_poller(
+            ("veo_google", api_key),
+            query_func=self.query_video_generation_task_status,
+            name="Veo (google)",
+        )
     
     async def generate_single_video(
         self,
@@ -37,6 +51,20 @@ class VideoGeneratorVeoGoogleAPI:
         aspect_ratio: str = "16:9",
         duration: int = 8,
     ) -> VideoOutput:
+        operation_name = await self.create_video_generation_task(prompt, reference_image_paths, resolution, aspect_ratio, duration)
+        return await self.query_video_generation_task(operation_name)
+
+    async def create_video_generation_task(
+        self,
+        prompt: str,
+        reference_image_paths: List[str],
+        resolution: str = "1080p",
+        aspect_ratio: str = "16:9",
+        duration: int = 8,
+    ) -> str:
+        """
+        Start a video generation operation and return its name.
+        """
 
         params = {
             "prompt": prompt,
@@ -50,11 +78,11 @@ class VideoGeneratorVeoGoogleAPI:
             params["model"] = self.t2v_model
         elif len(reference_image_paths) == 1:
             params["model"] = self.ff2v_model
-            params["image"] = types.Image.from_file(location=reference_image_paths[0])
+            params["image"] = await asyncio.to_thread(load_reference_image, reference_image_paths[0])
         elif len(reference_image_paths) == 2:
             params["model"] = self.flf2v_model
-            params["image"] = types.Image.from_file(location=reference_image_paths[0])
-            config_params["last_frame"] = types.Image.from_file(location=reference_image_paths[1])
+            params["image"] = await asyncio.to_thread(load_reference_image, reference_image_paths[0])
+            config_params["last_frame"] = await asyncio.to_thread(load_reference_image, reference_image_paths[1])
         else:
             raise ValueError("The number of reference images must be no more than 2")
 
@@ -70,7 +98,7 @@ class VideoGeneratorVeoGoogleAPI:
 
         for attempt in range(max_retries):
             try:
-                operation = self.client.models.generate_videos(
+                operation = await self.client.aio.models.generate_videos(
                     **params,
                     config=types.GenerateVideosConfig(**config_params),
                 )
@@ -83,10 +111,22 @@ class VideoGeneratorVeoGoogleAPI:
                 else:
                     raise
 
-        while not operation.done:
-            await asyncio.sleep(2)
-            operation = self.client.operations.get(operation)
-            logging.info(f"Video generation not completed, waiting 2 seconds...")
+        return operation.name
+
+    async def query_video_generation_task(
+        self,
+        operation_name: str,
+        submitted_at: Optional[float] = None,
+    ) -> VideoOutput:
+        """
+        Wait for the video generation operation to be done.
+
+        Args:
+            operation_name: Name of the operation, as returned by create_video_generation_task.
+            submitted_at: time.time() at which the operation was started, when it was
+                          started by an earlier run.
+        """
+        operation = await self.task_poller.wait(operation_name, timeout=self.task_timeout, submitted_at=submitted_at)
 
         # Check if operation completed successfully
         if operation.error:
@@ -105,11 +145,28 @@ class VideoGeneratorVeoGoogleAPI:
             raise RuntimeError(error_msg)
 
         generated_video = operation.response.generated_videos[0]
-        self.client.files.download(file=generated_video.video)
-
-        video_output = VideoOutput(
-            fmt="bytes",
-            ext="mp4",
-            data=generated_video.video.video_bytes,
-        )
+        if generated_video.video.uri:
+            # the video is streamed to disk when the output is saved, instead of being held in memory
+            video_output = VideoOutput(
+                fmt="url",
+                ext="mp4",
+                data=generated_video.video.uri,
+                headers={"x-goog-api-key": self.api_key},
+            )
+        else:
+            video_output = VideoOutput(
+                fmt="bytes",
+                ext="mp4",
+                data=generated_video.video.video_bytes,
+            )
         return video_output
+
+    async def query_video_generation_task_status(
+        self,
+        operation_name: str,
+    ) -> TaskStatus:
+        operation = await self.client.aio.operations.get(types.GenerateVideosOperation(name=operation_name))
+        if not operation.done:
+            return TaskStatus(state="pending")
+        # errors are reported by generate_single_video from the operation itself
+        return TaskStatus(state="succeeded", result=operation)
@@ -2,9 +2,12 @@ import logging
 from typing import List, Optional
 from PIL import Image
 import asyncio
-import aiohttp
+from tools.http_client import get_http_session
+from tools.generator_router import get_error_status
+from tools.task_poller import TaskStatus, get_task_poller
 from interfaces.video_output import VideoOutput
-from utils.image import image_path_to_b64
+from utils.image import aimage_path_to_payload
+from utils.rate_limiter import RateLimiter
 
 
 class VideoGeneratorVeoYunwuAPI:
@@ -14,6 +17,8 @@ class VideoGeneratorVeoYunwuAPI:
         t2v_model: str = "veo3.1-fast",  # text to video
         ff2v_model: str = "veo3.1-fast",   # first frame to video
         flf2v_model: str = "veo2-fast-frames",  # first and last frame to video
+        task_timeout: float = 1800,
+        rate_limiter: Optional[RateLimiter] = None,
     ):
         """
         all models:
@@ -30,12 +35,21 @@ class VideoGeneratorVeoYunwuAPI:
             veo3-frames
 
         NOTE: veo3 does not support first and last frame to video generation.
+
+        task_timeout: seconds after which a video generation task is given up.
         """
         self.base_url = "https://yunwu.ai"
         self.api_key = api_key
         self.t2v_model = t2v_model
         self.ff2v_model = ff2v_model
         self.flf2v_model = flf2v_model
+        self.rate_limiter = rate_limiter
+        self.task_timeout = task_timeout
+        self.task_poller = get_task_poller(
+            ("veo_yunwu", api_key),
+            query_func=self.query_video_generation_task_status,
+            name="Veo (yunwu)",
+        )
 
     async def generate_single_video(
         self,
@@ -44,6 +58,16 @@ class VideoGeneratorVeoYunwuAPI:
         aspect_ratio: str = "16:9",
         **kwargs,
     ) -> VideoOutput:
+        task_id = await self.create_video_generation_task(prompt, reference_image_paths, aspect_ratio)
+        return await self.query_video_generation_task(task_id)
+
+    async def create_video_generation_task(
+        self,
+        prompt: str = "",
+        reference_image_paths: List[Image.Image] = [],
+        aspect_ratio: str = "16:9",
+        **kwargs,
+    ) -> str:
         if len(reference_image_paths) == 0:
             model = self.t2v_model
         elif len(reference_image_paths) == 1:
@@ -55,11 +79,14 @@ class VideoGeneratorVeoYunwuAPI:
 
         logging.info(f"Calling {model} to generate video...")
 
-        # 1. Create video generation task
+        # Apply rate limiting if configured
+        if self.rate_limiter:
+            await self.rate_limiter.acquire()
+
         payload = {
             "prompt": prompt,
             "model": model,
-            "images": [image_path_to_b64(image_path, mime=True) for image_path in reference_image_paths],
+            "images": [await aimage_path_to_payload(image_path, tier="generator") for image_path in reference_image_paths],
             "enhance_prompt": True,
         }
         # only veo3 supports aspect ratio setting
@@ -74,47 +101,66 @@ class VideoGeneratorVeoYunwuAPI:
 
 
         url = f"https://yunwu.ai/v1/video/create"
-        while True:
+        # Retry logic for rate limit and server errors, then let a router fail over
+        max_retries = 3
+        retry_delay = 5
+
+        for attempt in range(max_retries):
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, headers=headers, json=payload) as response:
-                        response = await response.json()
-                        logging.debug(f"Response: {response}")
-                        task_id = response["id"]
-                        logging.info(f"Video generation task created successfully. Task ID: {task_id}")
+                async with get_http_session().post(url, headers=headers, json=payload) as response:
+                    response.raise_for_status()
+                    response_json = await response.json()
+                    logging.debug(f"Response: {response_json}")
+                    task_id = response_json["id"]
+                    logging.info(f"Video generation task created successfully. Task ID: {task_id}")
+                break
             except Exception as e:
-                logging.error(f"Error occurred while creating video generation task: {e}. Retrying in 1 second...")
-                await asyncio.sleep(1)
-                continue
-            break
+                status = get_error_status(e)
+                # other 4xx errors are the request's fault, a retry would be rejected too
+                if attempt == max_retries - 1 or (status is not None and 400 <= status < 500 and status != 429):
+                    logging.error(f"Error occurred while creating video generation task: {e!r}")
+                    raise
+                wait_time = retry_delay * (2 ** attempt)
+                logging.warning(f"Error occurred while creating video generation task: {e!r}. Retrying in {wait_time}s... (attempt {attempt + 1}/{max_retries})")
+                await asyncio.sleep(wait_time)
 
+        return task_id
 
-        # 2. Query the video generation task until the video generation is completed
+    async def query_video_generation_task(
+        self,
+        task_id: str,
+        submitted_at: Optional[float] = None,
+    ) -> VideoOutput:
+        """
+        Wait for the video generation task to be completed.
+
+        Args:
+            task_id: ID of the task, as returned by create_video_generation_task.
+            submitted_at: time.time() at which the task was created, when it was
+                          created by an earlier run.
+        """
+        video_url = await self.task_poller.wait(task_id, timeout=self.task_timeout, submitted_at=submitted_at)
+        logging.info(f"Video generation completed successfully")
+        return VideoOutput(fmt="url", ext="mp4", data=video_url)
+
+    async def query_video_generation_task_status(
+        self,
+        task_id: str,
+    ) -> TaskStatus:
         headers = {
             'Accept': 'application/json',
             'Authorization': f'Bearer {self.api_key}',
         }
+        async with get_http_session().get(f"{self.base_url}/v1/video/query?id={task_id}", headers=headers) as response:
+            payload = await response.json()
+            logging.debug(f"Response: {payload}")
 
-        while True:
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(f"{self.base_url}/v1/video/query?id={task_id}", headers=headers) as response:
-                        payload = await response.json()
-                        logging.debug(f"Response: {payload}")
-                        status = payload["status"]
-            except Exception as e:
-                logging.error(f"Error occurred while querying video generation task: {e}. Retrying in 1 second...")
-                await asyncio.sleep(1)
-                continue
-
-            if status == "completed":
-                logging.info(f"Video generation completed successfully")
-                video_url = payload["video_url"]
-                return VideoOutput(fmt="url", ext="mp4", data=video_url)
-            elif status == "failed":
-                logging.error(f"Video generation failed: \n{payload}")
-                break
-            else:
-                logging.info(f"Video generation status: {status}, waiting 1 second...")
-                await asyncio.sleep(1)
-                continue
+        status = payload["status"]
+        if status == "completed":
+            return TaskStatus(state="succeeded", result=payload["video_url"])
+        elif status == "failed":
+            logging.error(f"Video generation failed: \n{payload}")
+            return TaskStatus(state="failed", error=str(payload))
+        else:
+            logging.debug(f"Video generation status: {status}")
+            return TaskStatus(state="pending")
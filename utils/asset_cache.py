@@ -0,0 +1,363 @@
+import asyncio
+import base64
+import logging
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from io import BytesIO
+from typing import Any, Dict, Literal, NamedTuple, Optional, Tuple
+from PIL import Image
+
+
+class PayloadTier(NamedTuple):
+    """
+    Re-encoding of the reference images sent to a consumer: downscaled so that no
+    side exceeds max_side, and recompressed to format (JPEG, WEBP) with quality.
+    """
+    max_side: int
+    format: str = "JPEG"
+    quality: int = 85
+
+
+# "original" sends the files as they are
+DEFAULT_PAYLOAD_TIERS = {
+    # multimodal chat models comparing and selecting images
+    "llm": PayloadTier(max_side=768, quality=80),
+    # generators conditioned on the images
+    "generator": PayloadTier(max_side=2048, quality=92),
+}
+
+
+def encode_payload(data: bytes, tier: PayloadTier) -> Tuple[bytes, Optional[str]]:
+    """
+    Re-encode an image for a payload tier.
+
+    Returns:
+        The encoded image and its mime type, or the original bytes and None if
+        re-encoding would not make them smaller.
+    """
+    image = Image.open(BytesIO(data))
+    needs_resize = max(image.size) > tier.max_side
+    if image.mode != "RGB":
+        # no alpha in JPEG, transparent areas become white
+        background = Image.new("RGB", image.size, "white")
+        rgba = image.convert("RGBA")
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        image = background
+    if needs_resize:
+        image.thumbnail((tier.max_side, tier.max_side), Image.Resampling.LANCZOS)
+    buffered = BytesIO()
+    image.save(buffered, format=tier.format, quality=tier.quality)
+    encoded = buffered.getvalue()
+    if not needs_resize and len(encoded) >= len(data):
+        return data, None
+    return encoded, f"image/{tier.format.lower()}"
+
+
+def sniff_mime_type(data: bytes) -> Optional[str]:
+    """
+    MIME type of an image from its magic bytes, None if not recognized. Files are
+    not trusted to hold the format their extension says.
+    """
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    return None
+
+
+def _mime_type(path: str, data: bytes) -> str:
+    return sniff_mime_type(data) or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+class _Asset:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.b64: Optional[str] = None
+        self.image: Optional[Image.Image] = None
+        # tier -> re-encoded image and its mime type
+        self.payloads: Dict[str, Tuple[bytes, str]] = {}
+        # tier -> data URL of the re-encoded image
+        self.payload_urls: Dict[str, str] = {}
+        # size counted in the cache total, updated with it under the cache lock
+        self.num_bytes = 0
+
+    def size(self) -> int:
+        size = len(self.data) + (len(self.b64) if self.b64 is not None else 0)
+        # the original tier shares the raw bytes
+        size += sum(len(encoded) for encoded, _ in self.payloads.values() if encoded is not self.data)
+        size += sum(len(url) for url in self.payload_urls.values())
+        if self.image is not None:
+            size += self.image.width * self.image.height * len(self.image.getbands())
+        return size
+
+
+class ReferenceAssetCache:
+    """
+    In-memory cache of the reference images (character portraits, frames) sent to
+    the chat model and the generators, so that a file referenced by every shot is
+    read, base64-encoded and decoded once.
+
+    Entries are keyed by path, modification time and size, so an image rewritten
+    in place is read again. The least recently used entries are evicted once the
+    raw bytes, encodings and decoded pixels held exceed max_bytes.
+
+    Images can also be served re-encoded for a payload tier ("llm", "generator"),
+    much smaller than the original PNG files.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 256 * 1024 ** 2,
+        payload_tiers: Optional[Dict[str, PayloadTier]] = None,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes: Maximum memory held by the cache, in bytes.
+            payload_tiers: Re-encoding of each payload tier. Defaults to DEFAULT_PAYLOAD_TIERS.
+        """
+        self.max_bytes = max_bytes
+        self.payload_tiers = {**DEFAULT_PAYLOAD_TIERS, **(payload_tiers or {})}
+        self._assets: "OrderedDict[Tuple[str, int, int], _Asset]" = OrderedDict()
+        self._num_bytes = 0
+        # tools decode images in worker threads
+        self._lock = threading.Lock()
+        self._num_hits = 0
+        self._num_misses = 0
+        self._num_evictions = 0
+        self._num_original_payload_bytes = 0
+        self._num_payload_bytes = 0
+
+    def _get(self, path: str) -> Tuple[Tuple[str, int, int], _Asset]:
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            asset = self._assets.get(key)
+            if asset is not None:
+                self._assets.move_to_end(key)
+                self._num_hits += 1
+                return key, asset
+            self._num_misses += 1
+
+        with open(path, "rb") as f:
+            asset = _Asset(f.read())
+        with self._lock:
+            # another thread may have read it in the meantime
+            if key in self._assets:
+                return key, self._assets[key]
+            self._assets[key] = asset
+            asset.num_bytes = asset.size()
+            self._num_bytes += asset.num_bytes
+            self._evict()
+        return key, asset
+
+    @contextmanager
+    def _growing(self, key: Tuple[str, int, int], asset: _Asset):
+        """
+        Hold the lock while an encoding or decoding is attached to an asset, then
+        count its new size. The work producing it runs before, outside the lock.
+        """
+        with self._lock:
+            yield
+            if self._assets.get(key) is asset:
+                size = asset.size()
+                self._num_bytes += size - asset.num_bytes
+                asset.num_bytes = size
+                self._evict()
+
+    def _evict(self):
+        # the most recent entry is kept even if larger than the cache
+        while self._num_bytes > self.max_bytes and len(self._assets) > 1:
+            _, asset = self._assets.popitem(last=False)
+            self._num_bytes -= asset.num_bytes
+            self._num_evictions += 1
+
+    def get_bytes(self, path: str) -> bytes:
+        """
+        Get the content of the file at path.
+        """
+        _, asset = self._get(path)
+        return asset.data
+
+    def get_b64(self, path: str, mime: bool = True) -> str:
+        """
+        Get the content of the file at path encoded in base64, as a data URL if mime.
+        """
+        key, asset = self._get(path)
+        if asset.b64 is None:
+            b64 = base64.b64encode(asset.data).decode("utf-8")
+            with self._growing(key, asset):
+                asset.b64 = b64
+        if mime:
+            return f"data:{_mime_type(path, asset.data)};base64,{asset.b64}"
+        return asset.b64
+
+    def get_payload_bytes(
+        self,
+        path: str,
+        tier: Literal["llm", "generator", "original"] = "original",
+    ) -> Tuple[bytes, str]:
+        """
+        Get the image at path re-encoded for the payload tier, and its mime type.
+        """
+        if tier != "original" and tier not in self.payload_tiers:
+            raise ValueError(f"Unknown payload tier {tier}, expected one of original, {', '.join(self.payload_tiers)}")
+
+        key, asset = self._get(path)
+        payload = asset.payloads.get(tier)
+        if payload is None:
+            encoded, mime_type = (asset.data, None) if tier == "original" else encode_payload(asset.data, self.payload_tiers[tier])
+            if mime_type is None:
+                mime_type = _mime_type(path, asset.data)
+            payload = (encoded, mime_type)
+            with self._growing(key, asset):
+                asset.payloads[tier] = payload
+        self._record_payload(asset, payload)
+        return payload
+
+    def _record_payload(self, asset: _Asset, payload: Tuple[bytes, str]):
+        with self._lock:
+            self._num_original_payload_bytes += len(asset.data)
+            self._num_payload_bytes += len(payload[0])
+
+    def _peek(self, path: str) -> Tuple[Tuple[str, int, int], Optional[_Asset]]:
+        """
+        Get the entry of the file at path if cached, without reading the file or
+        counting a hit.
+        """
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            return key, self._assets.get(key)
+
+    def _record_hit(self, key: Tuple[str, int, int]):
+        with self._lock:
+            self._num_hits += 1
+            if key in self._assets:
+                self._assets.move_to_end(key)
+
+    async def aget_payload_bytes(
+        self,
+        path: str,
+        tier: Literal["llm", "generator", "original"] = "original",
+    ) -> Tuple[bytes, str]:
+        """
+        get_payload_bytes from async code: served from memory on the event loop when
+        cached, read and re-encoded in a worker thread otherwise.
+        """
+        key, asset = self._peek(path)
+        payload = asset.payloads.get(tier) if asset is not None else None
+        if payload is None:
+            return await asyncio.to_thread(self.get_payload_bytes, path, tier)
+        self._record_hit(key)
+        self._record_payload(asset, payload)
+        return payload
+
+    async def aget_payload(
+        self,
+        path: str,
+        tier: Literal["llm", "generator", "original"] = "original",
+    ) -> str:
+        """
+        get_payload from async code: served from memory on the event loop when
+        cached, read, re-encoded and base64-encoded in a worker thread otherwise.
+        """
+        key, asset = self._peek(path)
+        url = None
+        if asset is not None:
+            if tier != "original":
+                url = asset.payload_urls.get(tier)
+            elif asset.b64 is not None:
+                # the original tier shares the base64 encoding of get_b64
+                url = f"data:{_mime_type(path, asset.data)};base64,{asset.b64}"
+        if url is None or tier not in asset.payloads:
+            return await asyncio.to_thread(self.get_payload, path, tier)
+        self._record_hit(key)
+        self._record_payload(asset, asset.payloads[tier])
+        return url
+
+    def get_payload(
+        self,
+        path: str,
+        tier: Literal["llm", "generator", "original"] = "original",
+    ) -> str:
+        """
+        Get the image at path as a data URL, re-encoded for the payload tier.
+        """
+        if tier == "original":
+            self.get_payload_bytes(path, tier)
+            return self.get_b64(path, mime=True)
+        encoded, mime_type = self.get_payload_bytes(path, tier)
+        key, asset = self._peek(path)
+        if asset is None:
+            # evicted in the meantime
+            return f"data:{mime_type};base64,{base64.b64encode(encoded).decode('utf-8')}"
+        url = asset.payload_urls.get(tier)
+        if url is None:
+            url = f"data:{mime_type};base64,{base64.b64encode(encoded).decode('utf-8')}"
+            with self._growing(key, asset):
+                asset.payload_urls[tier] = url
+        return url
+
+    def get_image(self, path: str) -> Image.Image:
+        """
+        Get the decoded image at path. The image is shared, callers must copy it
+        before modifying it.
+        """
+        key, asset = self._get(path)
+        if asset.image is None:
+            image = Image.open(BytesIO(asset.data))
+            # decode now, without keeping a file handle open
+            image.load()
+            with self._growing(key, asset):
+                asset.image = image
+        return asset.image
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            num_requests = self._num_hits + self._num_misses
+            return {
+                "entries": len(self._assets),
+                "size_mb": round(self._num_bytes / 1024 ** 2, 1),
+                "max_size_mb": round(self.max_bytes / 1024 ** 2, 1),
+                "hits": self._num_hits,
+                "misses": self._num_misses,
+                "hit_rate": round(self._num_hits / num_requests, 3) if num_requests else None,
+                "evictions": self._num_evictions,
+                # bytes of the re-encoded payloads served, against those of the original files
+                "payload_mb": round(self._num_payload_bytes / 1024 ** 2, 1),
+                "original_payload_mb": round(self._num_original_payload_bytes / 1024 ** 2, 1),
+            }
+
+
+_reference_asset_cache: Optional[ReferenceAssetCache] = None
+
+
+def get_reference_asset_cache() -> ReferenceAssetCache:
+    """
+    Get the reference asset cache shared by every tool and agent of the process,
+    sized by the REFERENCE_ASSET_CACHE_MAX_MB environment variable. The payload
+    tiers are set by the REFERENCE_IMAGE_{LLM,GENERATOR}_{MAX_SIDE,QUALITY} and
+    REFERENCE_IMAGE_FORMAT environment variables.
+    """
+    global _reference_asset_cache
+    if _reference_asset_cache is None:
+        max_mb = float(os.getenv("REFERENCE_ASSET_CACHE_MAX_MB", "256"))
+        payload_tiers = {}
+        for tier, default in DEFAULT_PAYLOAD_TIERS.items():
+            payload_tiers[tier] = PayloadTier(
+                max_side=int(os.getenv(f"REFERENCE_IMAGE_{tier.upper()}_MAX_SIDE", default.max_side)),
+                format=os.getenv("REFERENCE_IMAGE_FORMAT", default.format).upper(),
+                quality=int(os.getenv(f"REFERENCE_IMAGE_{tier.upper()}_QUALITY", default.quality)),
+            )
+        _reference_asset_cache = ReferenceAssetCache(max_bytes=int(max_mb * 1024 ** 2), payload_tiers=payload_tiers)
+        logging.info(f"Initialized reference asset cache of {max_mb:.0f} MB")
+    return _reference_asset_cache
@@ -0,0 +1,285 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import logging
+import os
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional
+import aiohttp
+
+
+# Files at least this large are fetched as several ranged requests in parallel
+DOWNLOAD_PARALLEL_THRESHOLD = int(os.getenv("DOWNLOAD_PARALLEL_THRESHOLD_MB", "32")) * 1024 ** 2
+DOWNLOAD_NUM_PARTS = int(os.getenv("DOWNLOAD_NUM_PARTS", "4"))
+DOWNLOAD_CHUNK_SIZE = 1024 ** 2
+
+
+class DownloadError(Exception):
+    """
+    A download that cannot succeed by retrying, or that ran out of attempts.
+    """
+
+
+class _RetryableError(Exception):
+    pass
+
+
+_stats = {
+    "downloads": 0,
+    "failures": 0,
+    "retries": 0,
+    "resumed": 0,
+    "parallel": 0,
+    "bytes": 0,
+}
+
+
+def download_stats() -> Dict[str, Any]:
+    return dict(_stats)
+
+
+def _check_status(response: aiohttp.ClientResponse):
+    if response.status == 429 or response.status >= 500:
+        raise _RetryableError(f"HTTP {response.status}")
+    if response.status >= 400:
+        raise DownloadError(f"HTTP {response.status} downloading {response.url}")
+
+
+def _total_size(response: aiohttp.ClientResponse, offset: int) -> Optional[int]:
+    if "Content-Encoding" in response.headers:
+        # the body is decompressed, its length is unknown
+        return None
+    if response.status == 206:
+        match = re.match(r"bytes \d+-\d+/(\d+)", response.headers.get("Content-Range", ""))
+        return int(match.group(1)) if match else None
+    if response.content_length is not None:
+        return response.content_length if response.status == 200 else offset + response.content_length
+    return None
+
+
+async def _stream_to(
+    response: aiohttp.ClientResponse,
+    f,
+    offset: int,
+    end: Optional[int] = None,
+    on_write: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    Write the body of response into f from offset, stopping at end (exclusive).
+    on_write is called with the offset reached after every write, so that the
+    progress survives a connection dropping midway.
+    """
+    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+        if end is not None:
+            chunk = chunk[:end - offset]
+        await asyncio.to_thread(_write_at, f, offset, chunk)
+        offset += len(chunk)
+        _stats["bytes"] += len(chunk)
+        if on_write is not None:
+            on_write(offset)
+        if end is not None and offset >= end:
+            break
+    return offset
+
+
+def _write_at(f, offset: int, chunk: bytes):
+    f.seek(offset)
+    f.write(chunk)
+
+
+def _sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class _Download:
+    def __init__(self, session, url, part_path, headers, max_attempts):
+        self.session = session
+        self.url = url
+        self.part_path = part_path
+        self.headers = headers or {}
+        self.max_attempts = max_attempts
+        self.total: Optional[int] = None
+
+    async def _backoff(self, attempt: int, error: Exception):
+        if attempt >= self.max_attempts:
+            raise DownloadError(f"Downloading {self.url} failed after {attempt} attempts: {error!r}") from error
+        _stats["retries"] += 1
+        delay = min(30.0, 2 ** (attempt - 1))
+        logging.warning(f"Downloading {self.url} failed ({error!r}), retrying in {delay:.0f}s...")
+        await asyncio.sleep(delay)
+
+    async def run(self) -> Optional[int]:
+        """
+        Download into the part file, resuming from the bytes it already holds.
+
+        Returns:
+            The size announced by the server, if any.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            offset = os.path.getsize(self.part_path) if os.path.exists(self.part_path) else 0
+            try:
+                if await self._fetch(offset):
+                    return self.total
+            except (_RetryableError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                await self._backoff(attempt, e)
+
+    async def _fetch(self, offset: int) -> bool:
+        headers = {**self.headers, "Range": f"bytes={offset}-"}
+        async with self.session.get(self.url, headers=headers) as response:
+            if response.status == 416 and offset > 0:
+                # the part file holds more than the server has, start over
+                os.remove(self.part_path)
+                raise _RetryableError("HTTP 416 resuming download")
+            _check_status(response)
+            if response.status == 200 and offset > 0:
+                # the server ignored the range
+                offset = 0
+            elif offset > 0:
+                _stats["resumed"] += 1
+            self.total = _total_size(response, offset)
+
+            mode = "r+b" if offset > 0 else "wb"
+            with open(self.part_path, mode) as f:
+                if response.status == 206 and offset == 0 and self.total is not None \
+                        and self.total >= DOWNLOAD_PARALLEL_THRESHOLD and DOWNLOAD_NUM_PARTS > 1:
+                    await self._fetch_parallel(response, f)
+                    return True
+                offset = await _stream_to(response, f, offset)
+                f.truncate(offset)
+        if self.total is not None and offset < self.total:
+            raise _RetryableError(f"Connection closed after {offset} of {self.total} bytes")
+        return True
+
+    async def _fetch_parallel(self, response: aiohttp.ClientResponse, f):
+        """
+        Fetch the file as DOWNLOAD_NUM_PARTS ranges at once, the first one from the
+        response already open.
+        """
+        _stats["parallel"] += 1
+        f.truncate(self.total)
+        part_size = -(-self.total // DOWNLOAD_NUM_PARTS)
+        bounds = [(start, min(start + part_size, self.total)) for start in range(0, self.total, part_size)]
+        progress: List[int] = [start for start, _ in bounds]
+
+        async def fetch_part(idx: int):
+            start, end = bounds[idx]
+            attempt = 0
+
+            def advance(offset: int):
+                progress[idx] = offset
+
+            with open(self.part_path, "r+b") as part_file:
+                while progress[idx] < end:
+                    attempt += 1
+                    try:
+                        if idx == 0 and attempt == 1:
+                            await _stream_to(response, part_file, progress[idx], end, on_write=advance)
+                        else:
+                            headers = {**self.headers, "Range": f"bytes={progress[idx]}-{end - 1}"}
+                            async with self.session.get(self.url, headers=headers) as part_response:
+                                _check_status(part_response)
+                                if part_response.status != 206:
+                                    raise DownloadError(f"Ranged request not honoured downloading {self.url}")
+                                await _stream_to(part_response, part_file, progress[idx], end, on_write=advance)
+                        if progress[idx] < end:
+                            raise _RetryableError(f"Connection closed after {progress[idx] - start} of {end - start} bytes")
+                    except (_RetryableError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        await self._backoff(attempt, e)
+
+        tasks = [asyncio.create_task(fetch_part(idx)) for idx in range(len(bounds))]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # the part file has holes, it cannot be resumed from its size
+            f.close()
+            os.remove(self.part_path)
+            raise
+
+
+async def download(
+    url: str,
+    save_path: str,
+    headers: Optional[Dict[str, str]] = None,
+    expected_size: Optional[int] = None,
+    sha256: Optional[str] = None,
+    max_attempts: int = 5,
+    deadline: Optional[float] = 600.0,
+    session: Optional[aiohttp.ClientSession] = None,
+) -> None:
+    """
+    Download a file, streaming it to a part file renamed to save_path once complete
+    and verified. A transfer failing midway is resumed with a ranged request, and
+    large files are fetched as parallel ranges.
+
+    Args:
+        url: URL of the file.
+        save_path: Path where the file will be saved.
+        headers: HTTP headers of the requests, e.g. for authentication.
+        expected_size: Size the file must have, in bytes.
+        sha256: Hex digest the file must have.
+        max_attempts: Number of attempts of each request before giving up.
+        deadline: Seconds after which the download is abandoned. None for no limit.
+        session: HTTP session to use. Defaults to the session shared by the tools.
+
+    Raises:
+        DownloadError: The download failed, ran out of attempts or did not verify.
+        TimeoutError: The deadline passed.
+    """
+    if session is None:
+        # tools import the interfaces, which import this module
+        from tools.http_client import get_http_session
+        session = get_http_session()
+
+    _stats["downloads"] += 1
+    start_time = time.perf_counter()
+    part_path = f"{save_path}.part"
+    logging.info(f"Downloading {url} to {save_path}")
+    try:
+        # a part file left by an earlier process may come from another URL
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        total = await asyncio.wait_for(_Download(session, url, part_path, headers, max_attempts).run(), timeout=deadline)
+
+        size = os.path.getsize(part_path)
+        for name, expected in [("announced", total), ("expected", expected_size)]:
+            if expected is not None and size != expected:
+                raise DownloadError(f"Downloaded {size} bytes from {url}, {name} size is {expected}")
+        if sha256 is not None and (digest := await asyncio.to_thread(_sha256, part_path)) != sha256.lower():
+            raise DownloadError(f"Downloaded file from {url} has sha256 {digest}, expected {sha256}")
+        os.replace(part_path, save_path)
+    except BaseException:
+        _stats["failures"] += 1
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    logging.info(f"Downloaded {url} to {save_path} ({size / 1024 ** 2:.1f} MB in {time.perf_counter() - start_time:.1f}s)")
+
+
+def download_sync(url: str, save_path: str, **kwargs) -> None:
+    """
+    Download a file from synchronous code, see download. Called from a running
+    event loop, the download runs in a worker thread with its own loop and blocks
+    the caller like a blocking HTTP client would; coroutines should await download.
+    """
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            await download(url, save_path, session=session, **kwargs)
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        asyncio.run(run())
+        return
+    logging.warning(f"Downloading {url} synchronously from a running event loop, which blocks it; await download instead")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(asyncio.run, run()).result()
@@ -1,41 +1,34 @@
 import logging
-import requests
 import base64
-import mimetypes
-from tenacity import retry
 from io import BytesIO
 import cv2
+from utils.asset_cache import get_reference_asset_cache
+from utils.download import download_sync
 
 
-@retry
 def download_image(url, save_path):
-    try:
-        logging.info(f"Downloading image from {url} to {save_path}")
+    download_sync(url, save_path)
 
-        response = requests.get(url, stream=True)
-        response.raise_for_status() # Check for HTTP errors
 
-        with open(save_path, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=1024):
-                file.write(chunk)
-        logging.info(f"Image downloaded successfully to {save_path}")
+def image_path_to_b64(image_path, mime: bool = True) -> str:
+    # reference images are sent many times, the encoding is cached
+    return get_reference_asset_cache().get_b64(image_path, mime=mime)
 
-    except Exception as e:
-        logging.error(f"Error downloading image: {e}")
-        raise e
 
+def image_path_to_payload(image_path, tier: str = "original") -> str:
+    """
+    Data URL of the image re-encoded for a payload tier: "llm" (small thumbnail for
+    multimodal chat models), "generator" (size-capped) or "original".
+    """
+    return get_reference_asset_cache().get_payload(image_path, tier=tier)
 
-def image_path_to_b64(image_path, mime: bool = True) -> str:
-    with open(image_path, 'rb') as image_file:
-        b64 = base64.b64encode(image_file.read()).decode('utf-8')
 
-    if mime:
-        mime_type, _ = mimetypes.guess_type(image_path)
-        if mime_type is None:
-            mime_type = 'application/octet-stream'
-        return f"data:{mime_type};base64,{b64}"
-
-    return b64
+async def aimage_path_to_payload(image_path, tier: str = "original") -> str:
+    """
+    image_path_to_payload from async code, reading and re-encoding the image in a
+    worker thread unless it is cached.
+    """
+    return await get_reference_asset_cache().aget_payload(image_path, tier=tier)
 
 
 def pil_to_b64(image, mime: bool = True) -> str:
@@ -0,0 +1,56 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+
+class EventLoopLagMonitor:
+    """
+    Measure how late the event loop wakes up a task sleeping for a fixed interval.
+
+    A lag close to zero means coroutines get to run when they should; a large lag
+    means something is blocking the loop (synchronous I/O, CPU-bound work).
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.25,
+        window: int = 240,
+    ):
+        """
+        Initialize the monitor.
+
+        Args:
+            interval: Seconds between two measurements.
+            window: Number of most recent measurements the statistics are computed over.
+        """
+        self.interval = interval
+        self._lags = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            start_time = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self._lags.append(max(0.0, time.perf_counter() - start_time - self.interval))
+
+    def stats(self) -> Dict[str, Any]:
+        if not self._lags:
+            return {"samples": 0}
+        lags = sorted(self._lags)
+        return {
+            "samples": len(lags),
+            "last_ms": round(self._lags[-1] * 1000, 2),
+            "p95_ms": round(lags[min(len(lags) - 1, int(len(lags) * 0.95))] * 1000, 2),
+            "max_ms": round(lags[-1] * 1000, 2),
+        }
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class MediaExecutor:
+    """
+    Process pool running CPU-bound media work (frame extraction, image encoding)
+    away from the event loop.
+
+    At most max_workers + max_queue_depth operations are submitted to the pool at
+    the same time; further callers wait in the event loop instead of piling up in
+    the pool queue. Count, errors, queue wait and run time are recorded per operation.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue_depth: Optional[int] = None,
+    ):
+        """
+        Initialize the executor. The worker processes are started on first use.
+
+        Args:
+            max_workers: Number of worker processes. Defaults to the CPU count.
+            max_queue_depth: Number of operations allowed to wait in the pool queue
+                             once every worker is busy. Defaults to max_workers.
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue_depth = self.max_workers if max_queue_depth is None else max_queue_depth
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._num_submitted = 0
+        self._num_waiting = 0
+        self._metrics: Dict[str, Dict[str, float]] = defaultdict(lambda: {
+            "count": 0,
+            "errors": 0,
+            "total_seconds": 0.0,
+            "max_seconds": 0.0,
+            "total_wait_seconds": 0.0,
+        })
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn rather than fork, the parent process runs threads (event loop, HTTP clients)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    async def run(
+        self,
+        op_name: str,
+        func: Callable[..., Any],
+        *args,
+    ) -> Any:
+        """
+        Run func(*args) in a worker process.
+
+        Args:
+            op_name: Name of the operation the metrics are recorded under.
+            func: Function to run. It must be picklable, i.e. defined at module level
+                  or a method of a picklable object, and so must be its arguments.
+
+        Returns:
+            The value returned by func.
+        """
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_workers + self.max_queue_depth)
+            self._slots_loop = loop
+
+        metrics = self._metrics[op_name]
+        wait_start_time = time.perf_counter()
+        self._num_waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._num_waiting -= 1
+        metrics["total_wait_seconds"] += time.perf_counter() - wait_start_time
+
+        slots = self._slots
+        try:
+            future = self._get_pool().submit(func, *args)
+        except BaseException:
+            slots.release()
+            raise
+        self._num_submitted += 1
+        # a cancelled caller cannot stop a job already running in a worker, its slot
+        # is released once the job is over so the pool never holds more than the limit.
+        # Registered before wrap_future, the slot is back before the caller resumes
+        future.add_done_callback(lambda _: self._call_in_loop(loop, self._release, slots))
+
+        start_time = time.perf_counter()
+        try:
+            return await asyncio.wrap_future(future)
+        except Exception:
+            metrics["errors"] += 1
+            raise
+        finally:
+            duration = time.perf_counter() - start_time
+            metrics["count"] += 1
+            metrics["total_seconds"] += duration
+            metrics["max_seconds"] = max(metrics["max_seconds"], duration)
+
+    @staticmethod
+    def _call_in_loop(loop: asyncio.AbstractEventLoop, callback: Callable[..., Any], *args):
+        # pool futures complete in a thread of the pool
+        try:
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # the loop is closed, and its semaphore with it
+            pass
+
+    def _release(self, slots: asyncio.Semaphore):
+        self._num_submitted -= 1
+        slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        operations = {}
+        for op_name, metrics in self._metrics.items():
+            count = metrics["count"] or 1
+            operations[op_name] = {
+                "count": metrics["count"],
+                "errors": metrics["errors"],
+                "avg_seconds": round(metrics["total_seconds"] / count, 4),
+                "max_seconds": round(metrics["max_seconds"], 4),
+                "avg_wait_seconds": round(metrics["total_wait_seconds"] / count, 4),
+            }
+        return {
+            "max_workers": self.max_workers,
+            "max_queue_depth": self.max_queue_depth,
+            "submitted": self._num_submitted,
+            "waiting": self._num_waiting,
+            "operations": operations,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+_media_executor: Optional[MediaExecutor] = None
+
+
+def get_media_executor() -> MediaExecutor:
+    """
+    Get the media executor shared by every pipeline of the process, sized by the
+    MEDIA_EXECUTOR_MAX_WORKERS and MEDIA_EXECUTOR_MAX_QUEUE_DEPTH environment variables.
+    """
+    global _media_executor
+    if _media_executor is None:
+        max_workers = os.getenv("MEDIA_EXECUTOR_MAX_WORKERS")
+        max_queue_depth = os.getenv("MEDIA_EXECUTOR_MAX_QUEUE_DEPTH")
+        _media_executor = MediaExecutor(
+            max_workers=int(max_workers) if max_workers else None,
+            max_queue_depth=int(max_queue_depth) if max_queue_depth else None,
+        )
+        logging.info(f"Initialized media executor with {_media_executor.max_workers} workers")
+    return _media_executor
+
+
+def shutdown_media_executor():
+    global _media_executor
+    if _media_executor is not None:
+        _media_executor.shutdown()
+        _media_executor = None
@@ -1,14 +1,68 @@
 import asyncio
+import math
 import time
-from typing import Optional
+from collections import deque
+from typing import Deque, List, Literal, Optional
+from langchain_core.rate_limiters import BaseRateLimiter
+
+
+# length of the windows the limits apply to, in seconds
+MINUTE_SECONDS = 60.0
+DAY_SECONDS = 86400.0
+
+
+class _Bucket:
+    """
+    State of one limit, at most max_requests in any window of period seconds. The
+    times of the last max_requests requests are kept in a ring buffer, oldest first,
+    so a request conforms once the oldest of them has left the window: checking
+    and recording a request is O(1), however long the window.
+    """
+
+    __slots__ = ("max_requests", "period", "times", "head")
+
+    def __init__(self, max_requests: int, period: float):
+        self.max_requests = max_requests
+        self.period = period
+        self.times = [-math.inf] * max_requests
+        # index of the oldest request in times
+        self.head = 0
+
+    def wait_time(self, now: float, queued: int = 0) -> float:
+        # seconds until a request queued behind `queued` others conforms, assuming
+        # they are each made as soon as they conform
+        num_periods, offset = divmod(queued, self.max_requests)
+        oldest = self.times[(self.head + offset) % self.max_requests]
+        return max(0.0, oldest + (num_periods + 1) * self.period - now)
+
+    def consume(self, now: float):
+        self.times[self.head] = now
+        self.head = (self.head + 1) % self.max_requests
+
+    def remaining(self, now: float) -> int:
+        # the times are sorted from the head, count those out of the window
+        low, high = 0, self.max_requests
+        while low < high:
+            mid = (low + high) // 2
+            if self.times[(self.head + mid) % self.max_requests] <= now - self.period:
+                low = mid + 1
+            else:
+                high = mid
+        return low
 
 
 class RateLimiter:
     """
     Rate limiter to control API request frequency.
 
-    Ensures that no more than max_requests_per_minute requests are made per minute
-    and no more than max_requests_per_day requests are made per day.
+    Ensures that no more than max_requests_per_minute requests are made in any
+    minute and no more than max_requests_per_day requests are made in any day
+    (sliding windows, as provider quotas are counted). A limiter left idle allows
+    a burst of a full minute (day) of requests.
+
+    Waiting requests are served in FIFO order. Only the first one sleeps, until its
+    request conforms, so waiters cost no timers and can be cancelled or time out
+    at any point without holding up the others.
     """
 
     def __init__(
@@ -27,79 +81,199 @@ class RateLimiter:
         """
         self.max_requests_per_minute = max_requests_per_minute
         self.max_requests_per_day = max_requests_per_day
-        self.request_times = []
-        self.lock = asyncio.Lock()
+        self._minute_bucket = _Bucket(max_requests_per_minute, MINUTE_SECONDS) if max_requests_per_minute and max_requests_per_minute > 0 else None
+        self._day_bucket = _Bucket(max_requests_per_day, DAY_SECONDS) if max_requests_per_day and max_requests_per_day > 0 else None
+        self._buckets: List[_Bucket] = [bucket for bucket in [self._day_bucket, self._minute_bucket] if bucket is not None]
+        # futures of the waiting requests; the first one is woken and waits for its
+        # request to conform, the cancelled ones are skipped when they come first
+        self._waiters: Deque[asyncio.Future] = deque()
+        # loop of the async callers, the waiters belong to it
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _wait_time(self, now: float, queued: int = 0) -> float:
+        wait_time = 0.0
+        for bucket in self._buckets:
+            wait_time = max(wait_time, bucket.wait_time(now, queued))
+        return wait_time
+
+    def _consume(self, now: float):
+        for bucket in self._buckets:
+            bucket.consume(now)
 
-        # If per-minute rate limiting is enabled, calculate the minimum delay between requests
-        if max_requests_per_minute and max_requests_per_minute > 0:
-            self.min_delay = 60.0 / max_requests_per_minute
-        else:
-            self.min_delay = 0
+    def _wake_next(self):
+        while self._waiters and self._waiters[0].cancelled():
+            self._waiters.popleft()
+        if self._waiters and not self._waiters[0].done():
+            self._waiters[0].set_result(None)
 
-    async def acquire(self):
+    def try_acquire(self) -> bool:
+        """
+        Acquire permission to make a request if that can be done without waiting,
+        and no earlier request is waiting.
+
+        Returns:
+            Whether permission was acquired.
+        """
+        if self._waiters:
+            self._wake_next()
+            if self._waiters:
+                return False
+        now = time.monotonic()
+        if self._wait_time(now) > 0:
+            return False
+        self._consume(now)
+        return True
+
+    async def acquire(
+        self,
+        timeout: Optional[float] = None,
+    ) -> bool:
         """
         Acquire permission to make a request.
 
-        This method will block until it's safe to make a request according to the rate limits.
+        This method will block until it's safe to make a request according to the rate
+        limits, after the requests already waiting.
+
+        Args:
+            timeout: Seconds after which to give up waiting. None to wait as long as needed.
+
+        Returns:
+            Whether permission was acquired, False if the timeout expired first.
+        """
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        if self.try_acquire():
+            return True
+        if timeout is not None and timeout <= 0:
+            return False
+
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        if self._waiters[0] is waiter:
+            waiter.set_result(None)
+        try:
+            async with asyncio.timeout(timeout):
+                await waiter
+                # first in line, wait for the request to conform
+                while (wait_time := self._wait_time(time.monotonic())) > 0:
+                    if wait_time >= 1:
+                        print(f"Rate limit reached ({self._describe_limits()}). Waiting {self._describe_duration(wait_time)}...")
+                    await asyncio.sleep(wait_time)
+                self._consume(time.monotonic())
+                return True
+        except TimeoutError:
+            return False
+        finally:
+            if self._waiters and self._waiters[0] is waiter:
+                self._waiters.popleft()
+                self._wake_next()
+            else:
+                # cancelled while waiting for its turn, skipped once it comes first
+                waiter.cancel()
+
+    def acquire_sync(
+        self,
+        timeout: Optional[float] = None,
+    ) -> bool:
+        """
+        Acquire permission to make a request from synchronous code, blocking the
+        calling thread. See acquire.
+
+        From a worker thread while the async callers' loop runs, the request queues
+        on that loop behind the waiting ones. Otherwise (no loop running, or called
+        from the loop thread, which is blocked anyway) the thread sleeps until the
+        request conforms.
         """
-        if not self.max_requests_per_minute and not self.max_requests_per_day:
-            # Rate limiting is disabled
-            return
-
-        async with self.lock:
-            current_time = time.time()
-
-            # Clean up old request times (keep requests from last 24 hours for daily limit)
-            if self.max_requests_per_day:
-                self.request_times = [t for t in self.request_times if current_time - t < 86400]
-            elif self.max_requests_per_minute:
-                self.request_times = [t for t in self.request_times if current_time - t < 60]
-
-            # Check daily limit first
-            if self.max_requests_per_day and self.max_requests_per_day > 0:
-                daily_requests = [t for t in self.request_times if current_time - t < 86400]
-
-                if len(daily_requests) >= self.max_requests_per_day:
-                    oldest_request = daily_requests[0]
-                    wait_time = 86400 - (current_time - oldest_request)
-
-                    if wait_time > 0:
-                        hours = wait_time / 3600
-                        print(f"Daily rate limit reached ({self.max_requests_per_day} requests/day). Waiting {hours:.1f} hours...")
-                        await asyncio.sleep(wait_time)
-                        current_time = time.time()
-
-                        # Clean up after waiting
-                        self.request_times = [t for t in self.request_times if current_time - t < 86400]
-
-            # Check per-minute limit
-            if self.max_requests_per_minute and self.max_requests_per_minute > 0:
-                minute_requests = [t for t in self.request_times if current_time - t < 60]
-
-                if len(minute_requests) >= self.max_requests_per_minute:
-                    oldest_request = minute_requests[0]
-                    wait_time = 60 - (current_time - oldest_request)
-
-                    if wait_time > 0:
-                        print(f"Rate limit reached ({self.max_requests_per_minute} requests/min). Waiting {wait_time:.1f}s...")
-                        await asyncio.sleep(wait_time)
-                        current_time = time.time()
-
-                        # Clean up old request times again after waiting
-                        if self.max_requests_per_day:
-                            self.request_times = [t for t in self.request_times if current_time - t < 86400]
-                        else:
-                            self.request_times = [t for t in self.request_times if current_time - t < 60]
-
-                # Also ensure minimum delay between consecutive requests
-                if self.request_times and self.min_delay > 0:
-                    last_request = self.request_times[-1]
-                    time_since_last = current_time - last_request
-
-                    if time_since_last < self.min_delay:
-                        wait_time = self.min_delay - time_since_last
-                        await asyncio.sleep(wait_time)
-                        current_time = time.time()
-
-            # Record this request
-            self.request_times.append(current_time)
+        loop = self._loop
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if loop is not None and loop.is_running() and running_loop is not loop:
+            return asyncio.run_coroutine_threadsafe(self.acquire(timeout), loop).result()
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            wait_time = self._wait_time(now)
+            if wait_time <= 0:
+                self._consume(now)
+                return True
+            if deadline is not None and now + wait_time > deadline:
+                return False
+            if wait_time >= 1:
+                print(f"Rate limit reached ({self._describe_limits()}). Waiting {self._describe_duration(wait_time)}...")
+            time.sleep(wait_time)
+
+    def _describe_limits(self) -> str:
+        limits = []
+        if self._minute_bucket is not None:
+            limits.append(f"{self.max_requests_per_minute} requests/min")
+        if self._day_bucket is not None:
+            limits.append(f"{self.max_requests_per_day} requests/day")
+        return ", ".join(limits)
+
+    @staticmethod
+    def _describe_duration(seconds: float) -> str:
+        return f"{seconds / 3600:.1f} hours" if seconds >= 3600 else f"{seconds:.1f}s"
+
+    def estimated_wait(self) -> float:
+        """
+        Get the number of seconds a request made now would wait, behind the requests
+        already waiting.
+        """
+        return self._wait_time(time.monotonic(), queued=len(self._waiters))
+
+    def num_waiting(self) -> int:
+        """
+        Get the number of requests waiting for permission, including those cancelled
+        but not yet skipped.
+        """
+        return len(self._waiters)
+
+    def remaining_requests(
+        self,
+        period: Optional[Literal["minute", "day"]] = None,
+    ) -> Optional[int]:
+        """
+        Get the number of requests that can still be made without waiting.
+
+        Args:
+            period: Only count against the per-minute or the per-day limit. By default
+                    the tighter of the two applies.
+
+        Returns:
+            The number of requests left, or None if no limit applies.
+        """
+        now = time.monotonic()
+        remaining = []
+        if self._minute_bucket is not None and period in (None, "minute"):
+            remaining.append(self._minute_bucket.remaining(now))
+        if self._day_bucket is not None and period in (None, "day"):
+            remaining.append(self._day_bucket.remaining(now))
+        return min(remaining) if remaining else None
+
+
+class ChatModelRateLimiter(BaseRateLimiter):
+    """
+    Adapter letting a langchain chat model draw from a RateLimiter.
+
+    Pass it as the `rate_limiter` argument of the chat model so that every call of
+    the model, from any agent or pipeline sharing it, counts against the same limits.
+    """
+
+    def __init__(
+        self,
+        rate_limiter: RateLimiter,
+    ):
+        self.rate_limiter = rate_limiter
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        if not blocking:
+            return self.rate_limiter.try_acquire()
+        return self.rate_limiter.acquire_sync()
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        if not blocking:
+            return self.rate_limiter.try_acquire()
+        return await self.rate_limiter.acquire()
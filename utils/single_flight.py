@@ -0,0 +1,70 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesce identical calls in flight: while a call for a key is running, further
+    calls for the same key wait for its result instead of running again.
+
+    The call runs in its own task, so a caller giving up (cancelled) does not
+    cancel it for the callers still waiting.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self._num_calls = 0
+        self._num_coalesced = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    def start(
+        self,
+        key: Hashable,
+        func: Callable[[], Awaitable[Any]],
+    ) -> Awaitable[Any]:
+        """
+        Start func() unless a call for key is already running. The call is registered
+        before returning, so identical calls started right after are coalesced with it.
+
+        Args:
+            key: Key identifying identical calls.
+            func: Coroutine function making the call.
+
+        Returns:
+            An awaitable resolving to the result of the call, the same object for
+            every coalesced caller.
+        """
+        self._num_calls += 1
+        task = self._calls.get(key)
+        # a finished call stays registered until its done callback runs
+        if task is None or task.done():
+            task = asyncio.create_task(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            self._num_coalesced += 1
+        return asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        # a newer call may have been registered under the key in the meantime
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    async def do(
+        self,
+        key: Hashable,
+        func: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Run func() unless a call for key is already running, and return its result.
+        """
+        return await self.start(key, func)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls),
+            "calls": self._num_calls,
+            "coalesced": self._num_coalesced,
+        }
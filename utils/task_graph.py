@@ -0,0 +1,252 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+
+class PrioritySemaphore:
+    """
+    Semaphore that hands a freed slot to the waiter with the highest priority.
+
+    Waiters with equal priority are served in arrival order. A single instance
+    can be shared by several task graphs so that they compete for the same slots.
+    """
+
+    def __init__(
+        self,
+        value: int,
+    ):
+        """
+        Initialize the semaphore.
+
+        Args:
+            value: Maximum number of slots that can be held at the same time.
+        """
+        if value < 1:
+            raise ValueError("PrioritySemaphore value must be at least 1")
+        self.value = value
+        self._in_use = 0
+        self._waiters = []
+        self._counter = itertools.count()
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    @property
+    def num_waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, priority: float = 0.0):
+        """
+        Wait for a free slot.
+
+        Args:
+            priority: Waiters with a larger priority are served first.
+        """
+        if self._in_use < self.value and not self._waiters:
+            self._in_use += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (-priority, next(self._counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over right before the cancellation, pass it on.
+                self.release()
+            raise
+
+    def release(self):
+        self._in_use -= 1
+        while self._waiters and self._in_use < self.value:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._in_use += 1
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: float = 0.0):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class _Task:
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        deps: List[str],
+        resource: Optional[str],
+        cost: float,
+    ):
+        self.name = name
+        self.func = func
+        self.deps = deps
+        self.resource = resource
+        self.cost = cost
+
+
+class TaskGraph:
+    """
+    A DAG of coroutine tasks.
+
+    A task starts as soon as all of its dependencies have finished. Tasks bound to
+    a resource also wait for a slot of that resource, and waiting tasks are served
+    by critical-path length: the largest summed cost of any chain from the task to
+    the end of the graph. Scarce slots therefore go first to the work that unblocks
+    the most downstream work.
+    """
+
+    def __init__(
+        self,
+        resources: Optional[Dict[str, PrioritySemaphore]] = None,
+    ):
+        """
+        Initialize the task graph.
+
+        Args:
+            resources: Mapping from resource name to the semaphore guarding it.
+                       Tasks bound to a resource that is not listed here run unlimited.
+        """
+        self.resources = resources or {}
+        self._tasks: Dict[str, _Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tasks
+
+    def add_task(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        deps: Optional[Iterable[str]] = None,
+        resource: Optional[str] = None,
+        cost: float = 1.0,
+    ) -> str:
+        """
+        Add a task to the graph.
+
+        Args:
+            name: Unique name of the task.
+            func: Zero-argument callable returning the awaitable to run.
+            deps: Names of the tasks that must finish before this one starts.
+            resource: Name of the resource the task holds a slot of while running.
+            cost: Estimated duration of the task, used to compute critical paths.
+
+        Returns:
+            The name of the task, so it can be used directly as a dependency.
+        """
+        if name in self._tasks:
+            raise ValueError(f"Task {name} already exists in the graph")
+        self._tasks[name] = _Task(name, func, list(deps or []), resource, cost)
+        return name
+
+    def _topological_order(self) -> List[str]:
+        in_degree = {name: 0 for name in self._tasks}
+        dependents = {name: [] for name in self._tasks}
+        for task in self._tasks.values():
+            for dep in task.deps:
+                if dep not in self._tasks:
+                    raise ValueError(f"Task {task.name} depends on unknown task {dep}")
+                in_degree[task.name] += 1
+                dependents[dep].append(task.name)
+
+        order = [name for name, degree in in_degree.items() if degree == 0]
+        for name in order:
+            for dependent in dependents[name]:
+                in_degree[dependent] -= 1
+                if in_degree[dependent] == 0:
+                    order.append(dependent)
+
+        if len(order) != len(self._tasks):
+            cyclic = sorted(name for name, degree in in_degree.items() if degree > 0)
+            raise ValueError(f"Task graph contains a cycle involving: {cyclic}")
+        return order
+
+    def critical_path_lengths(self) -> Dict[str, float]:
+        """
+        Compute, for every task, the largest summed cost of any chain of tasks
+        starting at it (the task itself included).
+        """
+        order = self._topological_order()
+        dependents = {name: [] for name in self._tasks}
+        for task in self._tasks.values():
+            for dep in task.deps:
+                dependents[dep].append(task.name)
+
+        lengths = {}
+        for name in reversed(order):
+            downstream = max((lengths[dependent] for dependent in dependents[name]), default=0.0)
+            lengths[name] = self._tasks[name].cost + downstream
+        return lengths
+
+    async def _run_task(
+        self,
+        task: _Task,
+        priority: float,
+    ):
+        semaphore = self.resources.get(task.resource) if task.resource is not None else None
+        if semaphore is None:
+            return await task.func()
+        async with semaphore.slot(priority):
+            return await task.func()
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Run every task of the graph.
+
+        If a task fails, the tasks that are still running are cancelled and the
+        exception is re-raised.
+
+        Returns:
+            Mapping from task name to the value returned by the task.
+        """
+        order = self._topological_order()
+        priorities = self.critical_path_lengths()
+
+        remaining_deps = {name: set(self._tasks[name].deps) for name in order}
+        dependents = {name: [] for name in order}
+        for name in order:
+            for dep in self._tasks[name].deps:
+                dependents[dep].append(name)
+
+        results = {}
+        running: Dict[asyncio.Task, str] = {}
+
+        def start(name: str):
+            task = asyncio.create_task(self._run_task(self._tasks[name], priorities[name]))
+            running[task] = name
+
+        for name in order:
+            if not remaining_deps[name]:
+                start(name)
+
+        try:
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    if task.exception() is not None:
+                        logging.error(f"Task {name} failed: {task.exception()!r}")
+                    results[name] = task.result()
+                    for dependent in dependents[name]:
+                        remaining_deps[dependent].discard(name)
+                        if not remaining_deps[dependent]:
+                            start(dependent)
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        return results
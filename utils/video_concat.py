@@ -0,0 +1,364 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+from collections import Counter
+from dataclasses import dataclass, replace
+from typing import List, Optional
+
+
+# Encoders used to bring a mismatched clip to the codec of the other clips
+VIDEO_ENCODERS = {
+    "h264": "libx264",
+    "hevc": "libx265",
+    "mpeg4": "mpeg4",
+    "vp9": "libvpx-vp9",
+}
+AUDIO_ENCODERS = {
+    "aac": "aac",
+    "mp3": "libmp3lame",
+    "opus": "libopus",
+}
+# Names of the H.264 profiles reported by ffprobe, as expected by libx264
+X264_PROFILES = {
+    "Constrained Baseline": "baseline",
+    "Baseline": "baseline",
+    "Main": "main",
+    "High": "high",
+    "High 10": "high10",
+    "High 4:2:2": "high422",
+    "High 4:4:4 Predictive": "high444",
+}
+CHANNEL_COUNTS = {
+    "mono": 1,
+    "stereo": 2,
+}
+
+
+@dataclass(frozen=True)
+class ClipParams:
+    """
+    Codec parameters of a clip that must be identical across clips for the
+    concat demuxer to join them with stream copy. The profile and level decide the
+    parameter sets (SPS/PPS) of H.264 streams, which a decoder cannot switch
+    between in the middle of a copied stream.
+    """
+    video_codec: str
+    pix_fmt: str
+    width: int
+    height: int
+    fps: float
+    time_base: Optional[int]
+    profile: Optional[str] = None
+    # None when probed from the ffmpeg banner, which does not show it
+    level: Optional[int] = None
+    audio_codec: Optional[str] = None
+    sample_rate: Optional[int] = None
+    channel_layout: Optional[str] = None
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio_codec is not None
+
+    def same_video(self, other: "ClipParams") -> bool:
+        return (self.video_codec, self.pix_fmt, self.profile, self.level, self.width, self.height, self.fps, self.time_base) == \
+            (other.video_codec, other.pix_fmt, other.profile, other.level, other.width, other.height, other.fps, other.time_base)
+
+    def same_audio(self, other: "ClipParams") -> bool:
+        return (self.audio_codec, self.sample_rate, self.channel_layout) == \
+            (other.audio_codec, other.sample_rate, other.channel_layout)
+
+
+def get_ffmpeg_exe() -> str:
+    """
+    Locate the ffmpeg executable, falling back to the binary bundled with
+    imageio-ffmpeg (a dependency of moviepy) when it is not on the PATH.
+    """
+    ffmpeg_exe = shutil.which("ffmpeg")
+    if ffmpeg_exe is not None:
+        return ffmpeg_exe
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+async def _run(args: List[str]) -> str:
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    if process.returncode != 0:
+        raise RuntimeError(f"{os.path.basename(args[0])} failed with code {process.returncode}: {stderr.decode(errors='replace')[-2000:]}")
+    return stdout.decode(errors="replace")
+
+
+def _parse_fps(value: str) -> float:
+    if "/" in value:
+        numerator, denominator = value.split("/")
+        return round(float(numerator) / float(denominator), 3) if float(denominator) else 0.0
+    return round(float(value), 3)
+
+
+def _split_fields(description: str) -> List[str]:
+    # split a stream description on the commas that are not inside parentheses
+    fields, depth, current = [], 0, ""
+    for char in description:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == "," and depth == 0:
+            fields.append(current.strip())
+            current = ""
+        else:
+            current += char
+    fields.append(current.strip())
+    return fields
+
+
+def _parse_ffmpeg_banner(banner: str) -> ClipParams:
+    video_fields, audio_fields = None, None
+    for line in banner.splitlines():
+        match = re.match(r"\s*Stream #\d+:\d+.*?: (Video|Audio): (.*)", line)
+        if match is None:
+            continue
+        if match.group(1) == "Video" and video_fields is None:
+            video_fields = _split_fields(match.group(2))
+        elif match.group(1) == "Audio" and audio_fields is None:
+            audio_fields = _split_fields(match.group(2))
+    if video_fields is None:
+        raise ValueError("No video stream found")
+
+    width = height = time_base = None
+    fps = 0.0
+    for field in video_fields[2:]:
+        size = re.match(r"(\d+)x(\d+)", field)
+        if size and width is None:
+            width, height = int(size.group(1)), int(size.group(2))
+        elif field.endswith(" tbr"):
+            fps = _parse_fps(field[:-4])
+        elif field.endswith(" fps") and not fps:
+            fps = _parse_fps(field[:-4])
+        elif field.split(" ")[0].isdigit() and " tbn" in field:
+            time_base = int(field.split(" ")[0])
+
+    # e.g. "h264 (High) (avc1 / 0x31637661)", the profile is the tag without a slash
+    profile = re.match(r"\S+ \(([^)/]+)\)", video_fields[0])
+    params = dict(
+        video_codec=video_fields[0].split(" ")[0],
+        pix_fmt=re.match(r"\w+", video_fields[1]).group(0),
+        profile=profile.group(1) if profile else None,
+        width=width,
+        height=height,
+        fps=fps,
+        time_base=time_base,
+    )
+    if audio_fields is not None:
+        sample_rate = next((int(field.split(" ")[0]) for field in audio_fields if field.endswith(" Hz")), None)
+        params.update(
+            audio_codec=audio_fields[0].split(" ")[0],
+            sample_rate=sample_rate,
+            channel_layout=audio_fields[2] if len(audio_fields) > 2 else None,
+        )
+    return ClipParams(**params)
+
+
+async def probe_clip(path: str) -> ClipParams:
+    """
+    Read the codec parameters of the first video and audio stream of a clip, with
+    ffprobe when it is installed and from the stream banner of ffmpeg otherwise.
+    """
+    ffprobe_exe = shutil.which("ffprobe")
+    if ffprobe_exe is None:
+        process = await asyncio.create_subprocess_exec(
+            get_ffmpeg_exe(), "-hide_banner", "-i", path,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        # ffmpeg exits with an error without an output file, the banner is all we need
+        try:
+            _, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+        return _parse_ffmpeg_banner(stderr.decode(errors="replace"))
+
+    output = await _run([ffprobe_exe, "-v", "error", "-show_streams", "-of", "json", path])
+    streams = json.loads(output)["streams"]
+    video = next((stream for stream in streams if stream["codec_type"] == "video"), None)
+    audio = next((stream for stream in streams if stream["codec_type"] == "audio"), None)
+    if video is None:
+        raise ValueError(f"No video stream found in {path}")
+    params = dict(
+        video_codec=video["codec_name"],
+        pix_fmt=video.get("pix_fmt"),
+        profile=video.get("profile"),
+        level=video.get("level"),
+        width=int(video["width"]),
+        height=int(video["height"]),
+        fps=_parse_fps(video.get("r_frame_rate", "0/1")),
+        time_base=int(video["time_base"].split("/")[1]) if "time_base" in video else None,
+    )
+    if audio is not None:
+        params.update(
+            audio_codec=audio["codec_name"],
+            sample_rate=int(audio["sample_rate"]),
+            channel_layout=audio.get("channel_layout"),
+        )
+    return ClipParams(**params)
+
+
+def choose_target_params(clip_params: List[ClipParams]) -> ClipParams:
+    """
+    Pick the parameters of the concatenated video: those shared by most clips, so
+    that as few clips as possible are normalized. If the clips have to be encoded
+    to a codec without a known encoder, fall back to H.264 and AAC.
+    """
+    target = Counter(clip_params).most_common(1)[0][0]
+    if any(not params.same_video(target) for params in clip_params) and target.video_codec not in VIDEO_ENCODERS:
+        target = replace(target, video_codec="h264", pix_fmt="yuv420p", profile="High", level=None, time_base=None)
+    audio_params = [params for params in clip_params if params.has_audio]
+    if audio_params:
+        if not target.has_audio:
+            # keep the audio of the clips that have some, the others get a silent track
+            audio_codec, sample_rate, channel_layout = Counter(
+                (params.audio_codec, params.sample_rate, params.channel_layout) for params in audio_params
+            ).most_common(1)[0][0]
+            target = replace(target, audio_codec=audio_codec, sample_rate=sample_rate, channel_layout=channel_layout)
+        if any(params.has_audio and not params.same_audio(target) for params in clip_params) and target.audio_codec not in AUDIO_ENCODERS:
+            target = replace(target, audio_codec="aac")
+    return target
+
+
+def build_normalize_args(
+    input_path: str,
+    output_path: str,
+    params: ClipParams,
+    target: ClipParams,
+) -> List[str]:
+    """
+    Build the ffmpeg arguments bringing a clip to the target parameters. The video
+    stream is copied when it already matches, so a clip that only lacks an audio
+    track just gets a silent one.
+    """
+    args = [get_ffmpeg_exe(), "-y", "-hide_banner", "-loglevel", "error", "-i", input_path]
+    if target.has_audio and not params.has_audio:
+        layout = target.channel_layout if target.channel_layout in CHANNEL_COUNTS else "stereo"
+        args += ["-f", "lavfi", "-i", f"anullsrc=channel_layout={layout}:sample_rate={target.sample_rate or 48000}"]
+        args += ["-map", "0:v:0", "-map", "1:a:0", "-shortest"]
+    else:
+        args += ["-map", "0:v:0"]
+        if target.has_audio:
+            args += ["-map", "0:a:0"]
+
+    if params.same_video(target):
+        args += ["-c:v", "copy"]
+    else:
+        args += [
+            "-c:v", VIDEO_ENCODERS[target.video_codec],
+            "-pix_fmt", target.pix_fmt,
+            "-vf", f"scale={target.width}:{target.height}:force_original_aspect_ratio=decrease,"
+                   f"pad={target.width}:{target.height}:(ow-iw)/2:(oh-ih)/2,setsar=1",
+            "-r", f"{target.fps}",
+        ]
+        if target.video_codec == "h264":
+            args += ["-preset", "veryfast", "-crf", "18"]
+            if target.profile in X264_PROFILES:
+                args += ["-profile:v", X264_PROFILES[target.profile]]
+            if target.level and target.level > 0:
+                args += ["-level:v", f"{target.level / 10:.1f}"]
+        if target.time_base:
+            args += ["-video_track_timescale", f"{target.time_base}"]
+
+    if not target.has_audio:
+        args += ["-an"]
+    elif params.has_audio and params.same_audio(target):
+        args += ["-c:a", "copy"]
+    else:
+        args += ["-c:a", AUDIO_ENCODERS[target.audio_codec]]
+        if target.sample_rate:
+            args += ["-ar", f"{target.sample_rate}"]
+        if target.channel_layout in CHANNEL_COUNTS:
+            args += ["-ac", f"{CHANNEL_COUNTS[target.channel_layout]}"]
+
+    args += [output_path]
+    return args
+
+
+async def concatenate_videos(
+    video_paths: List[str],
+    output_path: str,
+    max_concurrent_normalizations: Optional[int] = None,
+) -> str:
+    """
+    Concatenate clips into one video without re-encoding them.
+
+    The clips are probed first. Clips whose codec parameters differ from those of
+    the majority are normalized by ffmpeg processes running in parallel, then all
+    clips are joined by the ffmpeg concat demuxer with stream copy. The output is
+    written to a temporary file and renamed, so it only exists once complete.
+
+    Args:
+        video_paths: Paths of the clips, in playback order.
+        output_path: Path of the concatenated video.
+        max_concurrent_normalizations: Maximum number of ffmpeg processes normalizing
+                                       clips at the same time. Defaults to the CPU count.
+
+    Returns:
+        The output path.
+    """
+    if not video_paths:
+        raise ValueError("No videos to concatenate")
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=output_dir, prefix=".concat_") as tmp_dir:
+        clip_params = await asyncio.gather(*[probe_clip(path) for path in video_paths])
+        target = choose_target_params(list(clip_params))
+
+        semaphore = asyncio.Semaphore(max_concurrent_normalizations or os.cpu_count() or 1)
+
+        async def normalize(idx: int, path: str, params: ClipParams) -> str:
+            if params == target:
+                return os.path.abspath(path)
+            normalized_path = os.path.join(tmp_dir, f"clip_{idx}{os.path.splitext(output_path)[1]}")
+            async with semaphore:
+                logging.info(f"Normalizing {path} to match the other clips")
+                await _run(build_normalize_args(path, normalized_path, params, target))
+            return normalized_path
+
+        clip_paths = await asyncio.gather(*[
+            normalize(idx, path, params)
+            for idx, (path, params) in enumerate(zip(video_paths, clip_params))
+        ])
+        num_normalized = sum(1 for params in clip_params if params != target)
+
+        list_path = os.path.join(tmp_dir, "clips.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for path in clip_paths:
+                escaped_path = path.replace("'", "'\\''")
+                f.write(f"file '{escaped_path}'\n")
+
+        tmp_output_path = os.path.join(tmp_dir, f"output{os.path.splitext(output_path)[1]}")
+        await _run([
+            get_ffmpeg_exe(), "-y", "-hide_banner", "-loglevel", "error",
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            "-map", "0", "-c", "copy", "-movflags", "+faststart",
+            tmp_output_path,
+        ])
+        os.replace(tmp_output_path, output_path)
+
+    logging.info(f"Concatenated {len(video_paths)} clips ({num_normalized} normalized) into {output_path}")
+    return output_path
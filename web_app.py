@@ -15,6 +15,15 @@ from pathlib import Path
 from dotenv import load_dotenv
 from pipelines.idea2video_pipeline import Idea2VideoPipeline
 from pipelines.script2video_pipeline import Script2VideoPipeline
+from pipelines.pipeline_pool import PipelinePool
+from utils.media_executor import get_media_executor, shutdown_media_executor
+from utils.loop_lag import EventLoopLagMonitor
+from utils.asset_cache import get_reference_asset_cache
+from utils.download import download_stats
+from tools.http_client import close_http_sessions
+from tools.task_poller import task_poller_stats
+from tools.generation_cache import generation_cache_stats
+from utils.single_flight import SingleFlight
 # from pipelines.novel2movie_pipeline import Novel2MoviePipeline  # Temporarily disabled for testing
 
 # Load environment variables
@@ -147,8 +156,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global pipeline instances
-pipelines = {}
+# Generated videos, one working directory per job
+VIDEOS_DIR = Path("videos")
+VIDEOS_DIR.mkdir(exist_ok=True)
+
+# Pipelines share their clients and rate limiters, every job runs in its own directory
+pipeline_pool = PipelinePool(
+    factories={
+        "idea2video": Idea2VideoPipeline.init_from_env,
+        "script2video": lambda: Script2VideoPipeline.init_from_config("configs/script2video.yaml"),
+        # "novel2video": lambda: Novel2MoviePipeline.init_from_config("configs/script2video.yaml"),  # Uses same config as script2video
+    },
+    jobs_dir=str(VIDEOS_DIR),
+    max_concurrent_jobs=int(os.getenv("MAX_CONCURRENT_JOBS", "4")),
+)
+
+# Shows how long coroutines wait for the event loop, i.e. whether something blocks it
+event_loop_lag_monitor = EventLoopLagMonitor()
 
 # Job status storage directory
 JOB_STATUS_DIR = Path("job_status")
@@ -171,6 +195,11 @@ CACHE_DIR.mkdir(exist_ok=True)
 CACHE_INDEX_FILE = CACHE_DIR / "cache_index.json"
 CACHE_EXPIRY_DAYS = 7  # Cache entries expire after 7 days
 
+# Identical jobs in flight, a duplicate job attaches to the one already running
+job_flights = SingleFlight()
+in_flight_job_ids = {}  # cache_key -> job_id of the job generating the video
+background_pipelines = set()  # pipelines of the jobs started without awaiting them
+
 # Load cache index
 def load_cache_index():
     if CACHE_INDEX_FILE.exists():
@@ -344,23 +373,10 @@ def get_system_stats():
     except:
         return {"error": "Could not retrieve system stats"}
 
-def get_pipeline(pipeline_type: str):
-    """Get or create pipeline instance"""
+def get_pipeline_type(pipeline_type: str) -> str:
+    """Map a requested pipeline type to the pipeline implementing it"""
     # Map cameo to idea2video pipeline
-    actual_pipeline_type = "idea2video" if pipeline_type == "cameo" else pipeline_type
-
-    if actual_pipeline_type not in pipelines:
-        if actual_pipeline_type == "idea2video":
-            pipelines[actual_pipeline_type] = Idea2VideoPipeline.init_from_env()
-        elif actual_pipeline_type == "script2video":
-            # For now, script2video still uses config - will update later
-            from pipelines.script2video_pipeline import Script2VideoPipeline
-            pipelines[actual_pipeline_type] = Script2VideoPipeline.init_from_config("configs/script2video.yaml")
-        # elif actual_pipeline_type == "novel2video":
-        #     pipelines[actual_pipeline_type] = Novel2MoviePipeline.init_from_config("configs/script2video.yaml")  # Uses same config as script2video
-        else:
-            raise ValueError(f"Unknown pipeline type: {pipeline_type}")
-    return pipelines[actual_pipeline_type]
+    return "idea2video" if pipeline_type == "cameo" else pipeline_type
 
 # WebSocket connection manager with enhanced reliability
 class ConnectionManager:
@@ -494,7 +510,7 @@ def add_generation_to_history(user_id: str, job_id: str, generation_data: dict):
         "style": generation_data.get("style", "Realistic"),
         "quality": generation_data.get("quality", "standard"),
         "status": "completed",
-        "video_url": f"/videos/{job_id}/output.mp4"  # Assuming standard video location
+        "video_url": f"/videos/{job_id}/final_video.mp4"
     }
 
     user_data["history"].insert(0, history_entry)  # Add to beginning
@@ -591,8 +607,16 @@ async def process_batch_jobs(batch_id: str):
                 "format": job.get("format", "mp4")
             }
 
-            # Process the job (reuse existing pipeline logic)
-            await run_pipeline(
+            cache_key = generate_cache_key({
+                key: job_data[key] for key in [
+                    "pipeline_type", "idea", "script", "user_requirement", "style",
+                    "image_generator", "video_generator", "quality", "resolution", "format",
+                ]
+            })
+
+            # Process the job (reuse existing pipeline logic), or wait for an identical one in progress
+            generating_job_id = await start_pipeline_once(
+                cache_key,
                 job_id=job_id,
                 pipeline_type=job_data["pipeline_type"],
                 idea=job_data["idea"],
@@ -612,9 +636,9 @@ async def process_batch_jobs(batch_id: str):
             batch_data["progress"]["completed"] += 1
             batch_data["results"].append({
                 "job_index": i,
-                "job_id": job_id,
+                "job_id": generating_job_id,
                 "status": "completed",
-                "video_url": f"/videos/{job_id}/output.mp4"
+                "video_url": f"/videos/{generating_job_id}/final_video.mp4"
             })
 
         except Exception as e:
@@ -653,14 +677,20 @@ def get_batch_status(batch_id: str) -> dict:
 
 @app.on_event("startup")
 async def startup_event():
-    global pipeline
+    event_loop_lag_monitor.start()
     try:
-        pipeline = Idea2VideoPipeline.init_from_env()
+        pipeline_pool.get_template("idea2video")
         print("Pipeline initialized successfully")
     except Exception as e:
         print(f"Failed to initialize pipeline: {e}")
         # Continue without pipeline for now
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await event_loop_lag_monitor.stop()
+    shutdown_media_executor()
+    await close_http_sessions()
+
 @app.post("/generate-video")
 async def generate_video(
     background_tasks: BackgroundTasks,
@@ -696,8 +726,10 @@ async def generate_video(
     )
     start_time = datetime.now()
 
-    if not pipeline:
-        log_error("PIPELINE_ERROR", "Pipeline not initialized", user_id)
+    try:
+        pipeline_pool.get_template(get_pipeline_type(pipeline_type))
+    except Exception as e:
+        log_error("PIPELINE_ERROR", f"Pipeline not initialized: {e}", user_id)
         raise HTTPException(status_code=500, detail="Pipeline not initialized")
 
     # Generate unique job ID
@@ -732,12 +764,25 @@ async def generate_video(
             "video_url": f"/cache/{cached_asset.name}"
         }
 
+    # Attach to an identical job already running instead of generating the video twice
+    running_job_id = in_flight_job_ids.get(cache_key)
+    if running_job_id and not script_file and not novel_file and not photo_file:
+        logger.info(f"Job {job_id} attached to identical job {running_job_id} in progress")
+        log_performance("job_coalesced", (datetime.now() - start_time).total_seconds(), user_id, running_job_id)
+        return {
+            "job_id": running_job_id,
+            "status": "processing",
+            "message": "Attached to an identical video generation in progress",
+            "coalesced": True
+        }
+
     # Create job directory
-    job_dir = Path(f"videos/{job_id}")
+    job_dir = VIDEOS_DIR / job_id
     job_dir.mkdir(parents=True, exist_ok=True)
 
     # Validate and save uploaded files if provided
     script_path = None
+    novel_path = None
     photo_path = None
 
     if script_file:
@@ -777,23 +822,43 @@ async def generate_video(
     save_job_status(job_id, initial_status)
 
     # Run pipeline in background
-    background_tasks.add_task(
-        run_pipeline,
-        job_id,
-        pipeline_type,
-        idea,
-        script,
-        user_requirement,
-        style,
-        image_generator,
-        video_generator,
-        quality,
-        resolution,
-        format,
-        script_path,
-        novel_path,
-        photo_path
-    )
+    if not script_path and not novel_path and not photo_path:
+        pipeline_future = start_pipeline_once(
+            cache_key,
+            job_id=job_id,
+            pipeline_type=pipeline_type,
+            idea=idea,
+            script=script,
+            user_requirement=user_requirement,
+            style=style,
+            image_generator=image_generator,
+            video_generator=video_generator,
+            quality=quality,
+            resolution=resolution,
+            format=format,
+            script_path=None,
+            novel_path=None,
+            photo_path=None
+        )
+        track_background_pipeline(job_id, pipeline_future)
+    else:
+        background_tasks.add_task(
+            run_pipeline,
+            job_id,
+            pipeline_type,
+            idea,
+            script,
+            user_requirement,
+            style,
+            image_generator,
+            video_generator,
+            quality,
+            resolution,
+            format,
+            script_path,
+            novel_path,
+            photo_path
+        )
 
     log_performance("job_queued", (datetime.now() - start_time).total_seconds(), user_id, job_id)
     return {
@@ -862,19 +927,18 @@ async def run_pipeline(
         save_job_status(job_id, current_status)
         await manager.send_status_update(job_id, current_status)
 
-        # Get the appropriate pipeline
-        pipeline = get_pipeline(pipeline_type)
-
-        # Execute based on pipeline type
-        if pipeline_type in ["idea2video", "cameo"]:
-            await pipeline(idea=idea, user_requirement=user_requirement, style=style)
-        elif pipeline_type == "script2video":
-            # Use script from form or file
-            script_content = script
-            if script_path:
-                with open(script_path, 'r', encoding='utf-8') as f:
-                    script_content = f.read()
-            await pipeline(script=script_content, user_requirement=user_requirement, style=style)
+        # Get a pipeline of the appropriate type working in the job directory
+        async with pipeline_pool.acquire(get_pipeline_type(pipeline_type), job_id) as pipeline:
+            # Execute based on pipeline type
+            if pipeline_type in ["idea2video", "cameo"]:
+                await pipeline(idea=idea, user_requirement=user_requirement, style=style)
+            elif pipeline_type == "script2video":
+                # Use script from form or file
+                script_content = script
+                if script_path:
+                    with open(script_path, 'r', encoding='utf-8') as f:
+                        script_content = f.read()
+                await pipeline(script=script_content, user_requirement=user_requirement, style=style)
         # elif pipeline_type == "novel2video":
         #     # Novel pipeline
         #     novel_content = ""
@@ -916,7 +980,7 @@ async def run_pipeline(
         if not script_path and not novel_path and not photo_path:
             try:
                 # Find the generated video file
-                job_dir = Path(f"videos/{job_id}")
+                job_dir = VIDEOS_DIR / job_id
                 video_files = list(job_dir.glob("*.mp4")) + list(job_dir.glob("*.webm"))
                 if video_files:
                     video_path = video_files[0]  # Take the first video file
@@ -971,6 +1035,45 @@ async def run_pipeline(
         log_performance("pipeline_failed", pipeline_duration, user_id, job_id, False)
         logger.error(f"Pipeline execution failed for job {job_id}: {e}")
 
+def start_pipeline_once(cache_key: str, job_id: str, **pipeline_kwargs):
+    """Start the pipeline of a job, unless an identical job is already running.
+
+    Returns an awaitable resolving to the ID of the job generating the video,
+    which is another job when this one was attached to it.
+    """
+    async def run():
+        try:
+            await run_pipeline(job_id=job_id, **pipeline_kwargs)
+        finally:
+            in_flight_job_ids.pop(cache_key, None)
+        return job_id
+
+    if not job_flights.in_flight(cache_key):
+        in_flight_job_ids[cache_key] = job_id
+    return job_flights.start(cache_key, run)
+
+def track_background_pipeline(job_id: str, pipeline_future: asyncio.Future):
+    """Keep a pipeline started without being awaited alive, and record an error
+    escaping run_pipeline (or the job it was attached to) in the job status.
+    """
+    background_pipelines.add(pipeline_future)
+
+    def on_done(future: asyncio.Future):
+        background_pipelines.discard(future)
+        if future.cancelled():
+            error = "cancelled"
+        elif future.exception() is not None:
+            error = str(future.exception())
+        else:
+            return
+        logger.error(f"Pipeline execution failed for job {job_id}: {error}")
+        current_status = load_job_status(job_id) or {}
+        current_status["status"] = "failed"
+        current_status["message"] = f"Error: {error}"
+        save_job_status(job_id, current_status)
+
+    pipeline_future.add_done_callback(on_done)
+
 @app.get("/job/{job_id}")
 async def get_job_status(job_id: str):
     status = load_job_status(job_id)
@@ -989,7 +1092,7 @@ async def download_video(job_id: str):
         raise HTTPException(status_code=400, detail="Video not ready yet")
 
     # Find the generated video file
-    job_dir = Path(f"videos/{job_id}")
+    job_dir = VIDEOS_DIR / job_id
     video_files = list(job_dir.glob("*.mp4"))
 
     if not video_files:
@@ -1142,6 +1245,19 @@ async def health_check():
         "system_stats": get_system_stats()
     }
 
+def get_generator_health():
+    """Per-backend health of the routed generators of the initialized pipelines"""
+    health = {}
+    for pipeline_type in pipeline_pool.stats()["initialized_pipelines"]:
+        pipeline = pipeline_pool.get_template(pipeline_type)
+        for generator_name in ["image_generator", "video_generator"]:
+            generator = getattr(pipeline, generator_name, None)
+            if hasattr(generator, "health"):
+                health[f"{pipeline_type}.{generator_name}"] = generator.health()
+            if getattr(generator, "hedge_percentile", None) is not None:
+                health[f"{pipeline_type}.{generator_name}.hedging"] = generator.hedge_stats()
+    return health
+
 @app.get("/metrics")
 async def get_metrics():
     """Get system metrics and statistics"""
@@ -1184,7 +1300,16 @@ async def get_metrics():
             "batches": {
                 "active": len(active_batches),
                 "queued": len(batch_queue)
-            }
+            },
+            "pipelines": pipeline_pool.stats(),
+            "job_flights": job_flights.stats(),
+            "generator_backends": get_generator_health(),
+            "media_executor": get_media_executor().stats(),
+            "task_pollers": task_poller_stats(),
+            "generation_caches": generation_cache_stats(),
+            "reference_assets": get_reference_asset_cache().stats(),
+            "downloads": download_stats(),
+            "event_loop_lag": event_loop_lag_monitor.stats()
         }
     except Exception as e:
         log_error("METRICS_ERROR", f"Failed to retrieve metrics: {str(e)}")
@@ -1195,7 +1320,7 @@ async def root():
     return FileResponse("frontend/build/index.html", media_type="text/html")
 
 # Mount static files directory for serving generated videos
-app.mount("/videos", StaticFiles(directory="videos"), name="videos")
+app.mount("/videos", StaticFiles(directory=str(VIDEOS_DIR)), name="videos")
 
 # Mount cache directory for serving cached videos
 app.mount("/cache", StaticFiles(directory="cache"), name="cache")